@@ -0,0 +1,85 @@
+"""
+Client read cache benchmark: starts the server as a subprocess, then has threads sharing
+one client read posts, most of them a few popular ones, with the read cache off and with
+several TTLs. Another client votes on random posts meanwhile, so cached posts keep going
+stale. Reports throughput, latency, the cache's hit ratio and the GetPost RPCs sent.
+
+Usage:
+    python -m benchmarks.bench_client_cache --threads 16 --ttls 0.1 1 --duration 5
+"""
+import argparse
+import random
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.bench_server_modes import percentile, wait_until_serving
+from client.reddit_client import RedditClient
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Client read cache benchmark')
+    parser.add_argument('--posts', type=int, default=1000, help='Posts to read from (default: 1000)')
+    parser.add_argument('--popular', type=int, default=10, help='Posts that get --popular_share of the reads (default: 10)')
+    parser.add_argument('--popular_share', type=float, default=0.9, help='Share of reads of the popular posts (default: 0.9)')
+    parser.add_argument('--threads', type=int, default=16, help='Threads sharing the reading client (default: 16)')
+    parser.add_argument('--ttls', type=float, nargs='+', default=[0.1, 1.0], help='Cache TTLs to compare (default: 0.1 1.0)')
+    parser.add_argument('--votes_per_second', type=float, default=50, help='Rate of votes from another client (default: 50)')
+    parser.add_argument('--duration', type=float, default=5, help='Seconds to run each configuration (default: 5)')
+    parser.add_argument('--port', type=int, default=50451, help='Port for the benchmarked server (default: 50451)')
+    return parser.parse_args()
+
+def run(args, post_ids, cache_ttl):
+    cache_size = 0 if cache_ttl is None else args.posts
+    client = RedditClient(port=args.port, shared=False, cache_size=cache_size, cache_ttl=cache_ttl or 0)
+    latencies = [[] for _ in range(args.threads)]
+    stop_at = time.monotonic() + args.duration
+
+    def read(slot):
+        rng = random.Random(slot)
+        while time.monotonic() < stop_at:
+            popular = rng.random() < args.popular_share
+            post_id = rng.choice(post_ids[:args.popular] if popular else post_ids)
+            start = time.perf_counter()
+            client.get_post(post_id)
+            latencies[slot].append(time.perf_counter() - start)
+
+    def vote():
+        with RedditClient(port=args.port, shared=False) as voter:
+            while time.monotonic() < stop_at:
+                voter.vote_post(random.choice(post_ids), True)
+                time.sleep(1 / args.votes_per_second)
+
+    workers = [threading.Thread(target=read, args=(slot,)) for slot in range(args.threads)]
+    workers.append(threading.Thread(target=vote))
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    stats = client.cache_stats() or {}
+    client.close()
+    return sorted(latency for thread in latencies for latency in thread), stats.get('GetPost')
+
+def main():
+    args = parse_arguments()
+    server = subprocess.Popen([sys.executable, '-m', 'server.reddit_server', '--port', str(args.port)],
+                              stdout=subprocess.DEVNULL)
+    try:
+        wait_until_serving(args.port)
+        with RedditClient(port=args.port) as client:
+            post_ids = [client.create_post(title="bench", text="bench", image_url="image_url").post.post_id
+                        for _ in range(args.posts)]
+
+        print(f"{'cache':>10} {'QPS':>9} {'p50 ms':>8} {'p99 ms':>8} {'hit ratio':>10} {'RPCs/s':>8}")
+        for ttl in [None, *args.ttls]:
+            latencies, stats = run(args, post_ids, ttl)
+            label = 'off' if ttl is None else f"ttl {ttl:g}s"
+            hit_ratio, rpcs = (stats['hit_ratio'], stats['misses']) if stats else (0.0, len(latencies))
+            print(f"{label:>10} {len(latencies) / args.duration:>9.0f} {percentile(latencies, 0.5) * 1000:>8.3f} "
+                  f"{percentile(latencies, 0.99) * 1000:>8.3f} {hit_ratio:>10.1%} {rpcs / args.duration:>8.0f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Client channel benchmark: starts the server as a subprocess, then measures
+  - the cost of creating a client and making its first call, with a fresh channel per
+    client (shared=False) and with channels shared across clients, and
+  - the throughput of many threads sharing one client, for several channel pool sizes.
+
+Usage:
+    python -m benchmarks.bench_client_channels --clients 200 --threads 32 --pool_sizes 1 2 4
+"""
+import argparse
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.bench_server_modes import wait_until_serving
+from client.reddit_client import RedditClient
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Client channel setup and sharing benchmark')
+    parser.add_argument('--clients', type=int, default=200, help='Clients created in the setup measurement (default: 200)')
+    parser.add_argument('--threads', type=int, default=32, help='Threads sharing one client (default: 32)')
+    parser.add_argument('--pool_sizes', type=int, nargs='+', default=[1, 2, 4], help='Channel pool sizes to compare (default: 1 2 4)')
+    parser.add_argument('--duration', type=float, default=5, help='Seconds to run each pool size (default: 5)')
+    parser.add_argument('--port', type=int, default=50351, help='Port for the benchmarked server (default: 50351)')
+    parser.add_argument('--max_workers', type=int, default=32, help='Server thread pool size (default: 32)')
+    return parser.parse_args()
+
+def measure_setup(args, post_id, shared):
+    clients = []
+    start = time.perf_counter()
+    for _ in range(args.clients):
+        client = RedditClient(port=args.port, shared=shared)
+        client.get_post(post_id)
+        clients.append(client)
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        client.close()
+    return elapsed / args.clients
+
+def measure_throughput(args, post_id, pool_size):
+    with RedditClient(port=args.port, pool_size=pool_size, shared=False) as client:
+        client.get_post(post_id)  # Connect before the clock starts
+        counts = [0] * args.threads
+        stop_at = time.monotonic() + args.duration
+
+        def loop(slot):
+            while time.monotonic() < stop_at:
+                client.get_post(post_id)
+                counts[slot] += 1
+
+        workers = [threading.Thread(target=loop, args=(slot,)) for slot in range(args.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    return sum(counts) / args.duration
+
+def main():
+    args = parse_arguments()
+    server = subprocess.Popen([sys.executable, '-m', 'server.reddit_server', '--port', str(args.port),
+                               '--max_workers', str(args.max_workers)], stdout=subprocess.DEVNULL)
+    try:
+        wait_until_serving(args.port)
+        with RedditClient(port=args.port) as client:
+            post_id = client.create_post(title="bench", text="bench", image_url="image_url").post.post_id
+
+        print(f"{'channels':>20} {'ms/client':>10}")
+        for label, shared in [('fresh per client', False), ('shared', True)]:
+            print(f"{label:>20} {measure_setup(args, post_id, shared) * 1000:>10.3f}")
+
+        print(f"\n{'pool size':>20} {'QPS':>10}")
+        for pool_size in args.pool_sizes:
+            print(f"{pool_size:>20} {measure_throughput(args, post_id, pool_size):>10.0f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Measures how long the server's bulk loader takes to warm an in-memory store from a
+reddit.db-style database.
+
+Usage:
+    python -m benchmarks.bench_cold_start --comments 1000000 --workers 1 4
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import uuid
+
+from server.loader import load_from_sqlite
+from server.sqlite_store import SQLiteStore
+from server.store import InMemoryStore
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Cold start bulk loader benchmark')
+    parser.add_argument('--comments', type=int, default=1000000, help='Comments in the database (default: 1000000)')
+    parser.add_argument('--posts', type=int, default=10000, help='Posts the comments are spread over (default: 10000)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count()],
+                        help='Worker process counts to measure (default: 1 and one per CPU)')
+    return parser.parse_args()
+
+def populate(path, args):
+    SQLiteStore(path).close()  # Creates the schema
+    connection = sqlite3.connect(path)
+    post_ids = [str(uuid.uuid4()) for _ in range(args.posts)]
+    connection.executemany("INSERT INTO posts (post_id, title, text, author, score, state, publication_date, "
+                           "subreddit_id, tags, image_url) VALUES (?, 'title', 'text', 'author', 0, 'NORMAL', "
+                           "'2024-01-01 00:00:00', 'bench', '', 'image_url')", [(post_id,) for post_id in post_ids])
+    connection.executemany("INSERT INTO comments (comment_id, text, author, score, status, publication_date, "
+                           "parent_post_id, parent_comment_id, has_replies) VALUES (?, 'comment text', ?, ?, 'NORMAL', "
+                           "'2024-01-01 00:00:00', ?, NULL, 0)",
+                           ((str(uuid.uuid4()), f"user{i % 1000}", i % 50, post_ids[i % args.posts])
+                            for i in range(args.comments)))
+    connection.commit()
+    connection.close()
+
+def main():
+    args = parse_arguments()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "reddit.db")
+        populate(path, args)
+        for workers in args.workers:
+            store = InMemoryStore()
+            elapsed = load_from_sqlite(store, path, workers=workers)
+            print(f"{workers:>3} workers: loaded {len(store.posts)} posts and {len(store.comments)} comments "
+                  f"in {elapsed:.2f}s ({len(store.comments) / elapsed:.0f} comments/s)")
+            del store
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Compares the memory used per comment by a plain dict of Comment messages (the store's
+former representation) with the CommentTable, on its own and inside a full InMemoryStore.
+Every variant is measured by RSS growth in a fresh subprocess, minus the growth caused by
+generating the comments alone.
+
+Usage:
+    python -m benchmarks.bench_comment_memory --comments 1000000
+"""
+import argparse
+import random
+import subprocess
+import sys
+import time
+import uuid
+
+import reddit_pb2
+from server.comment_table import CommentTable
+from server.store import InMemoryStore
+
+VARIANTS = {
+    'protobuf_dict': 'dict of Comment messages',
+    'comment_table': 'CommentTable',
+    'store': 'InMemoryStore (table + indexes)',
+}
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Per-comment memory benchmark')
+    parser.add_argument('--comments', type=int, default=1000000, help='Comments to store (default: 1000000)')
+    parser.add_argument('--posts', type=int, default=10000, help='Posts the threads hang off (default: 10000)')
+    parser.add_argument('--authors', type=int, default=50000, help='Distinct comment authors (default: 50000)')
+    parser.add_argument('--variant', choices=['baseline', *VARIANTS], help=argparse.SUPPRESS)  # Set for the measuring subprocesses
+    return parser.parse_args()
+
+def generate_comments(args):
+    random.seed(0)
+    post_ids = [str(uuid.uuid4()) for _ in range(args.posts)]
+    authors = [f"user_{i}" for i in range(args.authors)]
+    start = time.mktime((2024, 1, 1, 0, 0, 0, 0, 0, -1))
+    comment_ids = []
+    for i in range(args.comments):
+        comment = reddit_pb2.Comment(
+            comment_id=str(uuid.uuid4()), text=f"comment {i} " + "lorem ipsum " * random.randint(2, 10),
+            author=random.choice(authors), score=random.randint(-5, 50),
+            publication_date=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start + i)))
+        # A third of the comments are top-level; the rest reply to an earlier comment
+        if not comment_ids or random.random() < 0.3:
+            comment.parent_post_id = random.choice(post_ids)
+        else:
+            comment.parent_comment_id = random.choice(comment_ids)
+        comment_ids.append(comment.comment_id)
+        yield comment
+
+def rss_bytes():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * 4096
+
+def measure(args):
+    before = rss_bytes()
+    if args.variant == 'baseline':
+        holder = [None for _ in generate_comments(args)]
+    elif args.variant == 'protobuf_dict':
+        holder = {comment.comment_id: comment for comment in generate_comments(args)}
+    elif args.variant == 'comment_table':
+        holder = CommentTable()
+        for comment in generate_comments(args):
+            holder.add(comment, holder.parent_key(comment))
+    else:
+        holder = InMemoryStore()
+        for comment in generate_comments(args):
+            holder.add_comment(comment)
+    print((rss_bytes() - before) / args.comments)
+    return holder
+
+def run_variant(variant, args):
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_comment_memory', '--variant', variant,
+                             '--comments', str(args.comments), '--posts', str(args.posts),
+                             '--authors', str(args.authors)], capture_output=True, text=True, check=True).stdout
+    return float(output)
+
+def main():
+    args = parse_arguments()
+    if args.variant:
+        measure(args)
+        return
+    baseline = run_variant('baseline', args)
+    print(f"{'representation':>32} {'bytes/comment':>14}")
+    for variant, label in VARIANTS.items():
+        print(f"{label:>32} {run_variant(variant, args) - baseline:>14.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Hedging benchmark: starts the server as a subprocess, keeps it busy with deep
+ExpandCommentBranch calls from background threads, and measures the GetPost latency of
+other threads sharing one client, without hedging and with hedges sent after several
+latency percentiles. Reports p50/p99/p99.9 latency and the share of calls hedged.
+
+Usage:
+    python -m benchmarks.bench_hedging --readers 8 --loaders 4 --percentiles 0.9 0.95 0.99
+"""
+import argparse
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.bench_server_modes import percentile, wait_until_serving
+from client.reddit_client import RedditClient
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Hedged request benchmark')
+    parser.add_argument('--readers', type=int, default=8, help='Threads timing GetPost calls (default: 8)')
+    parser.add_argument('--loaders', type=int, default=4, help='Threads issuing slow ExpandCommentBranch calls (default: 4)')
+    parser.add_argument('--fanout', type=int, default=20, help='Replies per comment of the loaded branch (default: 20)')
+    parser.add_argument('--percentiles', type=float, nargs='+', default=[0.9, 0.95, 0.99],
+                        help='Hedging percentiles to compare (default: 0.9 0.95 0.99)')
+    parser.add_argument('--duration', type=float, default=5, help='Seconds to run each configuration (default: 5)')
+    parser.add_argument('--port', type=int, default=50551, help='Port for the benchmarked server (default: 50551)')
+    parser.add_argument('--max_workers', type=int, default=16, help='Server thread pool size (default: 16)')
+    return parser.parse_args()
+
+def populate(client, fanout):
+    post_id = client.create_post(title="bench", text="bench", image_url="image_url").post.post_id
+    root = client.create_comment("root", "a", parent_post_id=post_id).comment.comment_id
+    level = [root]
+    for _ in range(2):
+        created = client.batch_create_comments([dict(text="reply", author="a", parent_comment_id=parent)
+                                                for parent in level for _ in range(fanout)])
+        level = [result.comment.comment_id for result in created.results]
+    return post_id, root
+
+def run(args, post_id, root, hedge_percentile):
+    latencies = [[] for _ in range(args.readers)]
+    stop_at = time.monotonic() + args.duration
+    with RedditClient(port=args.port, shared=False, pool_size=2, hedge_percentile=hedge_percentile) as client, \
+            RedditClient(port=args.port, shared=False) as loader:
+
+        def read(slot):
+            while time.monotonic() < stop_at:
+                start = time.perf_counter()
+                client.get_post(post_id)
+                latencies[slot].append(time.perf_counter() - start)
+
+        def load():
+            while time.monotonic() < stop_at:
+                loader.expand_comment_branch(root, args.fanout, max_depth=3)
+
+        workers = [threading.Thread(target=read, args=(slot,)) for slot in range(args.readers)]
+        workers += [threading.Thread(target=load) for _ in range(args.loaders)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        stats = client.hedger.stats()['GetPost'] if client.hedger is not None else None
+    return sorted(latency for thread in latencies for latency in thread), stats
+
+def main():
+    args = parse_arguments()
+    server = subprocess.Popen([sys.executable, '-m', 'server.reddit_server', '--port', str(args.port),
+                               '--max_workers', str(args.max_workers), '--response_cache_size', '0'],
+                              stdout=subprocess.DEVNULL)
+    try:
+        wait_until_serving(args.port)
+        with RedditClient(port=args.port) as client:
+            post_id, root = populate(client, args.fanout)
+
+        print(f"{'hedging':>10} {'calls':>8} {'p50 ms':>8} {'p99 ms':>8} {'p99.9 ms':>9} {'hedged':>7}")
+        for hedge_percentile in [None, *args.percentiles]:
+            latencies, stats = run(args, post_id, root, hedge_percentile)
+            label = 'off' if hedge_percentile is None else f"p{hedge_percentile * 100:g}"
+            hedged = f"{stats['hedged'] / stats['calls']:.1%}" if stats else '-'
+            print(f"{label:>10} {len(latencies):>8} {percentile(latencies, 0.5) * 1000:>8.2f} "
+                  f"{percentile(latencies, 0.99) * 1000:>8.2f} {percentile(latencies, 0.999) * 1000:>9.2f} {hedged:>7}")
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""
+Load generator for RedditService: starts the server (as a subprocess, or in this process),
+populates it, then replays a workload from many client threads and reports QPS and
+p50/p95/p99 latency per RPC.
+
+Workloads:
+    votes         Zipf-distributed votes on posts and comments, a few reads
+    deep_threads  expanding and replying inside deep comment trees
+    thread_views  read-heavy thread views of Zipf-distributed posts, a few writes
+
+Results can be written as JSON (--output) and compared with an earlier run, which exits
+with status 1 when any RPC got slower or lost throughput beyond --tolerance.
+
+Usage:
+    python -m benchmarks.bench_load --workload thread_views --threads 16 --duration 30 --output new.json
+    python -m benchmarks.bench_load --workload thread_views --baseline old.json
+    python -m benchmarks.bench_load --compare old.json new.json
+    python -m benchmarks.bench_load --server inprocess --server_args="--vote_buffer --response_cache_size 0"
+"""
+import argparse
+import bisect
+import itertools
+import json
+import random
+import shlex
+import subprocess
+import sys
+import threading
+import time
+
+import grpc
+
+from benchmarks.bench_server_modes import percentile, wait_until_serving
+from client.reddit_client import RedditClient
+
+# RPC name -> weight of each workload's operations
+WORKLOADS = {
+    'votes': {'VotePost': 40, 'VoteComment': 40, 'GetPost': 10, 'GetTopCommentsUnderPost': 10},
+    'deep_threads': {'ExpandCommentBranch': 60, 'GetTopCommentsUnderPost': 20, 'CreateComment': 20},
+    'thread_views': {'GetPostThread': 40, 'GetPost': 20, 'GetTopCommentsUnderPost': 20, 'ExpandCommentBranch': 10,
+                     'VoteComment': 5, 'CreateComment': 5},
+}
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='RedditService load generator')
+    parser.add_argument('--workload', choices=list(WORKLOADS), default='thread_views', help='Workload to replay (default: thread_views)')
+    parser.add_argument('--threads', type=int, default=16, help='Client threads (default: 16)')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to measure for (default: 30)')
+    parser.add_argument('--warmup', type=float, default=3, help='Seconds to run before measuring (default: 3)')
+    parser.add_argument('--posts', type=int, default=500, help='Posts to create (default: 500)')
+    parser.add_argument('--comments', type=int, default=20, help='Top-level comments per post (default: 20)')
+    parser.add_argument('--depth', type=int, default=8, help='Depth of the reply tree under each post\'s first comment (default: 8)')
+    parser.add_argument('--fanout', type=int, default=3, help='Replies per comment in that tree (default: 3)')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Exponent of the Zipf distribution of popularity (default: 1.1)')
+    parser.add_argument('--pool_size', type=int, default=1, help='Connections the client threads share (default: 1)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('--server', choices=['subprocess', 'inprocess'], default='subprocess',
+                        help='Run the server as a subprocess or on threads of this process (default: subprocess)')
+    parser.add_argument('--server_args', default='', help='Extra arguments for the server, e.g. "--mode async" (default: none)')
+    parser.add_argument('--port', type=int, default=50551, help='Port for the benchmarked server (default: 50551)')
+    parser.add_argument('--output', help='Write the results to this JSON file (default: none)')
+    parser.add_argument('--baseline', help='Compare the results with this earlier JSON result file (default: none)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Only compare two JSON result files')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='Relative QPS drop or p99 increase that counts as a regression (default: 0.10)')
+    return parser.parse_args()
+
+
+class Zipf:
+    """Samples items so that the k-th most popular one is picked with probability proportional to 1 / k**s."""
+
+    def __init__(self, items, s, rng):
+        self.items = list(items)
+        self.cumulative = list(itertools.accumulate(1 / rank ** s for rank in range(1, len(self.items) + 1)))
+        self.rng = rng
+
+    def sample(self):
+        point = self.rng.random() * self.cumulative[-1]
+        return self.items[bisect.bisect_left(self.cumulative, point)]
+
+
+def start_server(args):
+    server_args = ['--port', str(args.port), *shlex.split(args.server_args)]
+    if args.server == 'subprocess':
+        process = subprocess.Popen([sys.executable, '-m', 'server.reddit_server', *server_args], stdout=subprocess.DEVNULL)
+        wait_until_serving(args.port)
+        return process
+
+    # Shares the GIL with the load generator, so it is slower, but can be profiled in one process
+    from server import reddit_server
+    parser = reddit_server.build_parser()
+    server_config = parser.parse_args(server_args)
+    reddit_server.validate_arguments(parser, server_config)
+    service = reddit_server.build_service(server_config)
+    threading.Thread(target=reddit_server.serve, daemon=True,
+                     args=(server_config.port, server_config.max_workers, service.store,
+                           reddit_server.build_warm_up(server_config)), kwargs={'servicer': service}).start()
+    wait_until_serving(args.port)
+    return None
+
+def populate(client, args):
+    """Creates the posts with their comment trees; returns the post IDs, comment IDs and the comments with replies."""
+    post_ids, comment_ids, parents = [], [], []
+    for _ in range(args.posts):
+        post_id = client.create_post(title="load", text="load", image_url="image_url", author="load",
+                                     subreddit_id=f"load{len(post_ids) % 10}").post.post_id
+        post_ids.append(post_id)
+        level = [result.comment.comment_id for result in client.batch_create_comments(
+            [{"text": "comment", "author": "load", "parent_post_id": post_id} for _ in range(args.comments)]).results]
+        comment_ids.extend(level)
+        # A tree under the first comment: every level replies to the first comment of the level above
+        parent = level[0]
+        for _ in range(args.depth):
+            level = [result.comment.comment_id for result in client.batch_create_comments(
+                [{"text": "reply", "author": "load", "parent_comment_id": parent} for _ in range(args.fanout)]).results]
+            comment_ids.extend(level)
+            parents.append(parent)
+            parent = level[0]
+    return post_ids, comment_ids, parents
+
+def operations(client, args, posts, comments, parents):
+    """Returns RPC name -> callable issuing that RPC against a sampled entity."""
+    return {
+        'GetPost': lambda: client.get_post(posts.sample()),
+        'VotePost': lambda: client.vote_post(posts.sample(), posts.rng.random() < 0.8),
+        'VoteComment': lambda: client.vote_comment(comments.sample(), comments.rng.random() < 0.8),
+        'GetTopCommentsUnderPost': lambda: client.get_top_comments_under_post(posts.sample(), 10),
+        'GetPostThread': lambda: client.get_post_thread(posts.sample(), 10),
+        'ExpandCommentBranch': lambda: client.expand_comment_branch(parents.sample(), args.fanout, max_depth=args.depth),
+        'CreateComment': lambda: client.create_comment("load reply", "load", parent_comment_id=comments.sample()),
+    }
+
+def run_load(client, args, population):
+    weights = WORKLOADS[args.workload]
+    start_at = time.monotonic() + args.warmup
+    stop_at = start_at + args.duration
+    per_thread = []
+
+    def loop(seed):
+        rng = random.Random(seed)
+        post_ids, comment_ids, parents = population
+        ops = operations(client, args, Zipf(post_ids, args.zipf, rng), Zipf(comment_ids, args.zipf, rng),
+                         Zipf(parents, args.zipf, rng))
+        names = list(weights)
+        cumulative = list(itertools.accumulate(weights.values()))
+        latencies = {name: [] for name in names}
+        errors = dict.fromkeys(names, 0)
+        per_thread.append((latencies, errors))
+        while (now := time.monotonic()) < stop_at:
+            name = rng.choices(names, cum_weights=cumulative)[0]
+            start = time.perf_counter()
+            try:
+                ops[name]()
+            except grpc.RpcError:
+                errors[name] += now >= start_at
+                continue
+            if now >= start_at:
+                latencies[name].append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=loop, args=(args.seed + slot,)) for slot in range(args.threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    rpcs = {}
+    for name in weights:
+        latencies = sorted(itertools.chain.from_iterable(thread[0][name] for thread in per_thread))
+        errors = sum(thread[1][name] for thread in per_thread)
+        rpcs[name] = {'count': len(latencies), 'errors': errors, 'qps': len(latencies) / args.duration,
+                      'p50_ms': percentile(latencies, 0.50) * 1000 if latencies else None,
+                      'p95_ms': percentile(latencies, 0.95) * 1000 if latencies else None,
+                      'p99_ms': percentile(latencies, 0.99) * 1000 if latencies else None}
+    return rpcs
+
+def print_results(results):
+    print(f"{results['workload']}: {results['qps']:.0f} QPS over {results['config']['duration']}s "
+          f"with {results['config']['threads']} threads")
+    print(f"{'rpc':>24} {'QPS':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, rpc in results['rpcs'].items():
+        if rpc['count']:
+            print(f"{name:>24} {rpc['qps']:>9.0f} {rpc['p50_ms']:>8.2f} {rpc['p95_ms']:>8.2f} {rpc['p99_ms']:>8.2f} {rpc['errors']:>7}")
+
+def compare(old, new, tolerance):
+    """Prints the change of every RPC's QPS and p99 from old to new; returns whether any regressed."""
+    if old['workload'] != new['workload']:
+        print(f"warning: comparing workload {new['workload']} with {old['workload']}")
+    regressed = False
+    print(f"{'rpc':>24} {'QPS':>9} {'change':>8} {'p99 ms':>8} {'change':>8}")
+    for name, rpc in new['rpcs'].items():
+        before = old['rpcs'].get(name)
+        if not before or not before['count'] or not rpc['count']:
+            continue
+        qps_change = rpc['qps'] / before['qps'] - 1
+        p99_change = rpc['p99_ms'] / before['p99_ms'] - 1
+        flag = ''
+        if qps_change < -tolerance or p99_change > tolerance:
+            regressed = True
+            flag = '  REGRESSION'
+        print(f"{name:>24} {rpc['qps']:>9.0f} {qps_change:>+8.1%} {rpc['p99_ms']:>8.2f} {p99_change:>+8.1%}{flag}")
+    return regressed
+
+def load_results(path):
+    with open(path) as file:
+        return json.load(file)
+
+def main():
+    args = parse_arguments()
+    if args.compare:
+        sys.exit(1 if compare(load_results(args.compare[0]), load_results(args.compare[1]), args.tolerance) else 0)
+
+    server = start_server(args)
+    try:
+        with RedditClient(port=args.port, pool_size=args.pool_size, shared=False) as client:
+            population = populate(client, args)
+            rpcs = run_load(client, args, population)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    config = {key: value for key, value in vars(args).items() if key not in ('output', 'baseline', 'compare')}
+    results = {'workload': args.workload, 'config': config, 'time': time.strftime("%Y-%m-%d %H:%M:%S"),
+               'qps': sum(rpc['qps'] for rpc in rpcs.values()), 'rpcs': rpcs}
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        print()
+        sys.exit(1 if compare(load_results(args.baseline), results, args.tolerance) else 0)
+
+if __name__ == '__main__':
+    main()
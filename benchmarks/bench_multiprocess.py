@@ -0,0 +1,80 @@
+"""
+Throughput benchmark for the multi-process launcher: starts `server.launcher` with each
+process count and drives it from several client processes, each with its own connection
+so that SO_REUSEPORT spreads them over the workers.
+
+Usage:
+    python -m benchmarks.bench_multiprocess --processes 1 2 4 --clients 8 --duration 10
+"""
+import argparse
+import multiprocessing
+import random
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.bench_server_modes import wait_until_serving
+from client.reddit_client import RedditClient
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Multi-process server throughput benchmark')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4], help='Worker counts to compare (default: 1 2 4)')
+    parser.add_argument('--clients', type=int, default=8, help='Client processes generating load (default: 8)')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per client process (default: 4)')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to run each configuration (default: 10)')
+    parser.add_argument('--port', type=int, default=50251, help='Public port of the benchmarked server (default: 50251)')
+    return parser.parse_args()
+
+def run_client(port, threads, duration, results):
+    client = RedditClient(port=port)
+    # Threads spread over a few subreddits so that the posts land on every shard
+    posts = [client.create_post(title="bench", text="bench", image_url="image_url",
+                                subreddit_id=f"bench{i}").post.post_id for i in range(16)]
+    counts = [0] * threads
+    stop_at = time.monotonic() + duration
+
+    def loop(slot):
+        while time.monotonic() < stop_at:
+            post_id = random.choice(posts)
+            if random.random() < 0.2:
+                client.vote_post(post_id, True)
+            else:
+                client.get_post(post_id)
+            counts[slot] += 1
+
+    workers = [threading.Thread(target=loop, args=(slot,)) for slot in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results.put(sum(counts))
+
+def main():
+    args = parse_arguments()
+    spawn = multiprocessing.get_context("spawn")
+    print(f"{'processes':>9} {'QPS':>9}")
+    for processes in args.processes:
+        server = subprocess.Popen([sys.executable, '-m', 'server.launcher', '--port', str(args.port),
+                                   '--processes', str(processes), '--internal_port_base', str(args.port + 1)],
+                                  stdout=subprocess.DEVNULL)
+        try:
+            wait_until_serving(args.port)
+            time.sleep(1)  # The health check answers as soon as the first worker is up
+            results = spawn.Queue()
+            clients = [spawn.Process(target=run_client, args=(args.port, args.threads, args.duration, results))
+                       for _ in range(args.clients)]
+            start = time.monotonic()
+            for client in clients:
+                client.start()
+            total = sum(results.get() for _ in clients)
+            elapsed = time.monotonic() - start
+            for client in clients:
+                client.join()
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{processes:>9} {total / elapsed:>9.0f}")
+
+if __name__ == '__main__':
+    main()
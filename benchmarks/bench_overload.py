@@ -0,0 +1,103 @@
+"""
+Overload benchmark for admission control: many threads flood the server with expensive
+deep ExpandCommentBranch calls while a few threads issue cheap GetPost calls. Runs the
+server once without limits and once with the given admission flags, and reports GetPost
+latency and how many expensive calls were admitted or rejected.
+
+Usage:
+    python -m benchmarks.bench_overload --flood_threads 32 --limits="--method_concurrency ExpandCommentBranch=2"
+"""
+import argparse
+import shlex
+import subprocess
+import sys
+import threading
+import time
+
+import grpc
+
+from benchmarks.bench_server_modes import percentile, wait_until_serving
+from client.reddit_client import RedditClient
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Admission control overload benchmark')
+    parser.add_argument('--flood_threads', type=int, default=32, help='Threads issuing ExpandCommentBranch (default: 32)')
+    parser.add_argument('--probe_threads', type=int, default=2, help='Threads issuing GetPost (default: 2)')
+    parser.add_argument('--depth', type=int, default=6, help='Depth of the expanded tree (default: 6)')
+    parser.add_argument('--fanout', type=int, default=4, help='Replies per comment in the tree (default: 4)')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to run each configuration (default: 10)')
+    parser.add_argument('--max_workers', type=int, default=10, help='Server thread pool size (default: 10)')
+    parser.add_argument('--limits', default='--method_concurrency ExpandCommentBranch=2',
+                        help='Admission flags of the limited run (default: "--method_concurrency ExpandCommentBranch=2")')
+    parser.add_argument('--port', type=int, default=50651, help='Port for the benchmarked server (default: 50651)')
+    return parser.parse_args()
+
+def populate(client, args):
+    post_id = client.create_post(title="overload", text="overload", image_url="image_url").post.post_id
+    root = client.create_comment("root", "overload", parent_post_id=post_id).comment.comment_id
+    level = [root]
+    for _ in range(args.depth):
+        results = client.batch_create_comments([{"text": "reply", "author": "overload", "parent_comment_id": parent}
+                                                for parent in level for _ in range(args.fanout)]).results
+        level = [result.comment.comment_id for result in results][:64]  # Keep the tree from exploding
+    return post_id, root
+
+def run(args, server_args):
+    server = subprocess.Popen([sys.executable, '-m', 'server.reddit_server', '--port', str(args.port),
+                               '--max_workers', str(args.max_workers), '--response_cache_size', '0',
+                               *shlex.split(server_args)], stdout=subprocess.DEVNULL)
+    try:
+        wait_until_serving(args.port)
+        with RedditClient(port=args.port, shared=False) as client:
+            post_id, root = populate(client, args)
+            stop_at = time.monotonic() + args.duration
+            latencies, counts = [], {'admitted': 0, 'rejected': 0, 'probes rejected': 0}
+
+            def flood():
+                while time.monotonic() < stop_at:
+                    try:
+                        client.expand_comment_branch(root, args.fanout, max_depth=args.depth)
+                        counts['admitted'] += 1
+                    except grpc.RpcError as error:
+                        if error.code() != grpc.StatusCode.RESOURCE_EXHAUSTED:
+                            raise
+                        counts['rejected'] += 1
+                        time.sleep(0.01)
+
+            def probe():
+                while time.monotonic() < stop_at:
+                    start = time.perf_counter()
+                    try:
+                        client.get_post(post_id)
+                    except grpc.RpcError as error:
+                        # A per-client --rate_limit covers these calls too
+                        if error.code() != grpc.StatusCode.RESOURCE_EXHAUSTED:
+                            raise
+                        counts['probes rejected'] += 1
+                        time.sleep(0.01)
+                        continue
+                    latencies.append(time.perf_counter() - start)
+
+            workers = [threading.Thread(target=flood) for _ in range(args.flood_threads)]
+            workers += [threading.Thread(target=probe) for _ in range(args.probe_threads)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+    finally:
+        server.terminate()
+        server.wait()
+    latencies.sort()
+    return latencies, counts
+
+def main():
+    args = parse_arguments()
+    print(f"{'server':>12} {'GetPost p50 ms':>15} {'p99 ms':>8} {'rejected/s':>11} {'expand ok/s':>12} {'rejected/s':>11}")
+    for label, server_args in [('unlimited', ''), ('limited', args.limits)]:
+        latencies, counts = run(args, server_args)
+        print(f"{label:>12} {percentile(latencies, 0.5) * 1000:>15.2f} {percentile(latencies, 0.99) * 1000:>8.2f} "
+              f"{counts['probes rejected'] / args.duration:>11.0f} "
+              f"{counts['admitted'] / args.duration:>12.0f} {counts['rejected'] / args.duration:>11.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Measures how long the server takes to recover its in-memory store from a snapshot plus
+a log tail.
+
+Usage:
+    python -m benchmarks.bench_recovery --comments 5000000
+"""
+import argparse
+import os
+import tempfile
+import time
+import uuid
+
+import reddit_pb2
+from server import wal
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Write-ahead log recovery benchmark')
+    parser.add_argument('--comments', type=int, default=5000000, help='Comments in the snapshot (default: 5000000)')
+    parser.add_argument('--posts', type=int, default=50000, help='Posts the comments are spread over (default: 50000)')
+    parser.add_argument('--tail', type=int, default=100000, help='Vote records in the log tail (default: 100000)')
+    return parser.parse_args()
+
+def write_frames(path, mutations):
+    with open(path, "wb", buffering=1 << 20) as file:
+        for mutation in mutations:
+            file.write(wal.frame(mutation))
+
+def main():
+    args = parse_arguments()
+    with tempfile.TemporaryDirectory() as directory:
+        post_ids = [str(uuid.uuid4()) for _ in range(args.posts)]
+        comment_ids = [str(uuid.uuid4()) for _ in range(args.comments)]
+
+        def snapshot_records():
+            for post_id in post_ids:
+                yield reddit_pb2.StoreMutation(post=reddit_pb2.Post(
+                    post_id=post_id, title="title", text="text", author="author", subreddit_id="bench",
+                    image_url="image_url", publication_date="2024-01-01 00:00:00"))
+            for i, comment_id in enumerate(comment_ids):
+                yield reddit_pb2.StoreMutation(comment=reddit_pb2.Comment(
+                    comment_id=comment_id, text="comment text", author=f"user{i % 1000}", score=i % 50,
+                    publication_date="2024-01-01 00:00:00", parent_post_id=post_ids[i % args.posts]))
+
+        def tail_records():
+            for i in range(args.tail):
+                yield reddit_pb2.StoreMutation(comment_score=reddit_pb2.ScoreUpdate(
+                    id=comment_ids[(i * 7919) % args.comments], score=i % 100))
+
+        write_frames(os.path.join(directory, "snapshot-0000000001.bin"), snapshot_records())
+        write_frames(os.path.join(directory, "log-0000000001.bin"), tail_records())
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        del comment_ids
+
+        start = time.perf_counter()
+        store = wal.recover(directory)
+        elapsed = time.perf_counter() - start
+        store.log.close()
+
+        print(f"recovered {len(store.posts)} posts, {len(store.comments)} comments "
+              f"and {args.tail} log records ({size / 1e6:.0f} MB) in {elapsed:.1f}s "
+              f"({len(store.comments) / elapsed:.0f} comments/s)")
+
+if __name__ == '__main__':
+    main()
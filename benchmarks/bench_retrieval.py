@@ -0,0 +1,84 @@
+"""
+Compares three ways of running retrieve_and_expand_comments over many posts against a
+server subprocess: the sequential blocking version (three round trips per post), the
+concurrent async version (two round trips, many posts in flight) and the composite
+GetPostThread RPC (one round trip). Reports single-post latency and many-post throughput.
+
+Usage:
+    python -m benchmarks.bench_retrieval --posts 1000 --max_in_flight 64
+"""
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_server_modes import percentile, wait_until_serving
+from client.reddit_client import AsyncRedditClient, RedditClient
+from retrieval import (retrieve_and_expand_comments, retrieve_and_expand_comments_async, retrieve_and_expand_many,
+                       retrieve_thread_reply_async)
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Sequential vs concurrent vs composite retrieval benchmark')
+    parser.add_argument('--posts', type=int, default=1000, help='Posts to retrieve (default: 1000)')
+    parser.add_argument('--comments', type=int, default=10, help='Top-level comments per post, each with as many replies (default: 10)')
+    parser.add_argument('--max_in_flight', type=int, default=64, help='Posts retrieved concurrently (default: 64)')
+    parser.add_argument('--port', type=int, default=50451, help='Port for the benchmarked server (default: 50451)')
+    parser.add_argument('--mode', choices=['thread', 'async'], default='thread', help='Server mode (default: thread)')
+    return parser.parse_args()
+
+def populate(client, args):
+    post_ids = []
+    for _ in range(args.posts):
+        post_id = client.create_post(title="bench", text="bench", image_url="image_url").post.post_id
+        comments = client.batch_create_comments([{"text": "comment", "author": "bench", "parent_post_id": post_id}
+                                                 for _ in range(args.comments)])
+        client.batch_create_comments([{"text": "reply", "author": "bench", "parent_comment_id": result.comment.comment_id}
+                                      for result in comments.results for _ in range(args.comments)])
+        post_ids.append(post_id)
+    return post_ids
+
+async def measure_async(args, post_ids):
+    async with AsyncRedditClient(port=args.port) as client:
+        results = {}
+        for label, retrieve, composite in [('concurrent', retrieve_and_expand_comments_async, False),
+                                           ('composite', retrieve_thread_reply_async, True)]:
+            latencies = []
+            for post_id in post_ids[:200]:
+                start = time.perf_counter()
+                await retrieve(client, post_id)
+                latencies.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            await retrieve_and_expand_many(client, post_ids, args.max_in_flight, composite=composite)
+            results[label] = (sorted(latencies), time.perf_counter() - start)
+        return results
+
+def main():
+    args = parse_arguments()
+    server = subprocess.Popen([sys.executable, '-m', 'server.reddit_server', '--port', str(args.port),
+                               '--mode', args.mode], stdout=subprocess.DEVNULL)
+    try:
+        wait_until_serving(args.port)
+        with RedditClient(port=args.port) as client:
+            post_ids = populate(client, args)
+            latencies = []
+            for post_id in post_ids[:200]:
+                start = time.perf_counter()
+                retrieve_and_expand_comments(client, post_id)
+                latencies.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            for post_id in post_ids:
+                retrieve_and_expand_comments(client, post_id)
+            results = {'sequential': (sorted(latencies), time.perf_counter() - start)}
+        results.update(asyncio.run(measure_async(args, post_ids)))
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"{'retrieval':>12} {'p50 ms':>8} {'p99 ms':>8} {'posts/s':>9}")
+    for label, (latencies, elapsed) in results.items():
+        print(f"{label:>12} {percentile(latencies, 0.5) * 1000:>8.2f} {percentile(latencies, 0.99) * 1000:>8.2f} "
+              f"{len(post_ids) / elapsed:>9.0f}")
+
+if __name__ == '__main__':
+    main()
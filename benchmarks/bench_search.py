@@ -0,0 +1,145 @@
+"""
+Search benchmark: indexes generated posts with the in-memory SearchIndex and with SQLite's
+FTS5 (the index of --storage sqlite), then reports indexing rate, index memory and p50/p99
+latency of several kinds of top-10 queries on both.
+
+Post text is drawn from a Zipf-distributed vocabulary, so a few words are in most posts and
+most words are rare, as in real text.
+
+Usage:
+    python -m benchmarks.bench_search --documents 3000000 --queries 200
+"""
+import argparse
+import bisect
+import itertools
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import uuid
+
+from benchmarks.bench_comment_memory import rss_bytes
+from benchmarks.bench_server_modes import percentile
+from server.search_index import SearchIndex
+from server.sqlite_store import SQLiteStore
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Full-text search benchmark')
+    parser.add_argument('--documents', type=int, default=1000000, help='Posts to index (default: 1000000)')
+    parser.add_argument('--words', type=int, default=20, help='Words of title and text per post (default: 20)')
+    parser.add_argument('--vocabulary', type=int, default=100000, help='Distinct words (default: 100000)')
+    parser.add_argument('--tags', type=int, default=1000, help='Distinct tags; every post has two (default: 1000)')
+    parser.add_argument('--subreddits', type=int, default=1000, help='Subreddits the posts are spread over (default: 1000)')
+    parser.add_argument('--queries', type=int, default=200, help='Queries of each kind (default: 200)')
+    parser.add_argument('--skip_fts', action='store_true', help='Only measure the in-memory index')
+    return parser.parse_args()
+
+class Vocabulary:
+    """Words w0, w1, ... where the k-th word is drawn with probability proportional to 1 / (k + 1)."""
+
+    def __init__(self, size, rng):
+        self.cumulative = list(itertools.accumulate(1 / rank for rank in range(1, size + 1)))
+        self.rng = rng
+
+    def words(self, count):
+        total = self.cumulative[-1]
+        return [f"w{bisect.bisect_left(self.cumulative, self.rng.random() * total)}" for _ in range(count)]
+
+def generate_posts(args):
+    rng = random.Random(0)
+    vocabulary = Vocabulary(args.vocabulary, rng)
+    for _ in range(args.documents):
+        words = vocabulary.words(args.words)
+        yield (str(uuid.uuid4()), " ".join(words[:4]), " ".join(words[4:]),
+               [f"tag{rng.randrange(args.tags)}" for _ in range(2)], f"sub{rng.randrange(args.subreddits)}")
+
+def query_kinds(args):
+    """Returns kind -> list of (query, tags, subreddit_id) arguments."""
+    rng = random.Random(1)
+
+    def word(low, high):
+        return f"w{rng.randrange(low, min(high, args.vocabulary))}"
+
+    def tag():
+        return [f"tag{rng.randrange(args.tags)}"]
+
+    def subreddit():
+        return f"sub{rng.randrange(args.subreddits)}"
+    count = args.queries
+    return {
+        'rare word': [(word(10000, args.vocabulary), (), None) for _ in range(count)],
+        'medium word': [(word(100, 10000), (), None) for _ in range(count)],
+        'common word': [(word(0, 100), (), None) for _ in range(count)],
+        'three words': [(f"{word(0, 100)} {word(100, 10000)} {word(10000, args.vocabulary)}", (), None)
+                        for _ in range(count)],
+        'common + tag': [(word(0, 100), tag(), None) for _ in range(count)],
+        'common + subreddit': [(word(0, 100), (), subreddit()) for _ in range(count)],
+        'tag only': [("", tag(), None) for _ in range(count)],
+    }
+
+def time_queries(search, queries):
+    latencies = []
+    for query, tags, subreddit_id in queries:
+        start = time.perf_counter()
+        search(query, 10, tags, subreddit_id)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000
+
+def build_memory_index(args):
+    posts = list(generate_posts(args))
+    before = rss_bytes()
+    start = time.perf_counter()
+    index = SearchIndex()
+    for post_id, title, text, tags, subreddit_id in posts:
+        index.add(post_id, f"{title}\n{text}", tags, subreddit_id)
+    elapsed = time.perf_counter() - start
+    return index, elapsed, rss_bytes() - before
+
+def build_fts_index(args, path):
+    SQLiteStore(path).close()  # Creates the schema, the FTS5 table and its trigger
+    connection = sqlite3.connect(path)
+    start = time.perf_counter()
+    connection.executemany("INSERT INTO posts (post_id, title, text, author, score, state, publication_date, "
+                           "subreddit_id, tags, image_url) VALUES (?, ?, ?, 'author', 0, 'NORMAL', "
+                           "'2024-01-01 00:00:00', ?, ?, 'image_url')",
+                           ((post_id, title, text, subreddit_id, ",".join(tags))
+                            for post_id, title, text, tags, subreddit_id in generate_posts(args)))
+    connection.commit()
+    elapsed = time.perf_counter() - start
+    try:
+        # The index shares the database file with the posts table; dbstat, when compiled in, sizes its shadow tables
+        index_bytes = connection.execute("SELECT SUM(pgsize) FROM dbstat WHERE name LIKE 'posts_fts%'").fetchone()[0]
+    except sqlite3.OperationalError:
+        index_bytes = None
+    connection.close()
+    return SQLiteStore(path), elapsed, index_bytes
+
+def main():
+    args = parse_arguments()
+    kinds = query_kinds(args)
+
+    index, elapsed, memory = build_memory_index(args)
+    print(f"in-memory: indexed {args.documents} posts in {elapsed:.1f}s ({args.documents / elapsed:.0f}/s), "
+          f"{memory / args.documents:.0f} bytes per post")
+    results = {kind: time_queries(lambda query, count, tags, scope: index.search(query, count, tags, scope), queries)
+               for kind, queries in kinds.items()}
+    del index
+
+    fts_results = {}
+    if not args.skip_fts:
+        with tempfile.TemporaryDirectory() as directory:
+            store, elapsed, index_bytes = build_fts_index(args, os.path.join(directory, "reddit.db"))
+            size_text = f"{index_bytes / args.documents:.0f} bytes per post on disk" if index_bytes else "index size unknown"
+            print(f"FTS5:      indexed {args.documents} posts in {elapsed:.1f}s ({args.documents / elapsed:.0f}/s), {size_text}")
+            fts_results = {kind: time_queries(store.search_posts, queries) for kind, queries in kinds.items()}
+            store.close()
+
+    print(f"\n{'top-10 query':>20} {'memory p50 ms':>14} {'p99 ms':>8} {'FTS5 p50 ms':>12} {'p99 ms':>8}")
+    for kind, (p50, p99) in results.items():
+        fts = f"{fts_results[kind][0]:>12.2f} {fts_results[kind][1]:>8.2f}" if kind in fts_results else ''
+        print(f"{kind:>20} {p50:>14.2f} {p99:>8.2f} {fts}")
+
+if __name__ == '__main__':
+    main()
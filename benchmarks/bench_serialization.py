@@ -0,0 +1,99 @@
+"""
+Serialization benchmark: CPU time per call of GetPost, GetTopCommentsUnderPost and
+ExpandCommentBranch, from the store read to the serialized response, with responses built
+as messages and serialized by gRPC's serializer, and with responses assembled from the
+EntityEncoder's cached encodings (--entity_cache_size). The response cache is off, and
+a vote lands on the read entities every --vote_every calls, so scores keep changing.
+
+Usage:
+    python -m benchmarks.bench_serialization --calls 20000 --fanout 10 --depth 3
+"""
+import argparse
+import random
+import time
+from unittest.mock import MagicMock
+
+import reddit_pb2
+from benchmarks.bench_server_modes import percentile
+from server.handlers import serialize_response
+from server.reddit_server import RedditService
+from server.store import InMemoryStore
+from server.wire import EntityEncoder
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Pre-serialized response benchmark')
+    parser.add_argument('--posts', type=int, default=1000, help='Posts to read from (default: 1000)')
+    parser.add_argument('--fanout', type=int, default=10, help='Comments per post and replies per comment (default: 10)')
+    parser.add_argument('--depth', type=int, default=3, help='Depth of the comment tree under each post (default: 3)')
+    parser.add_argument('--threads', type=int, default=20, help='Posts that get a comment tree (default: 20)')
+    parser.add_argument('--calls', type=int, default=20000, help='Timed calls per RPC and configuration (default: 20000)')
+    parser.add_argument('--vote_every', type=int, default=10, help='Calls between votes on the read entities (default: 10)')
+    return parser.parse_args()
+
+def populate(args, store):
+    service = RedditService(store)
+    context = MagicMock()
+    post_ids = [service.CreatePost(reddit_pb2.CreatePostRequest(
+        title=f"post {i} " * 5, text="some post text " * 40, author=f"user{i % 100}", image_url="https://example.com/i.png",
+        subreddit_id=f"sub{i % 10}", tags=["tag1", "tag2"]), context).post.post_id for i in range(args.posts)]
+    roots = []
+    for post_id in post_ids[:args.threads]:
+        level = [result.comment for result in service.BatchCreateComments(reddit_pb2.BatchCreateCommentsRequest(comments=[
+            reddit_pb2.CreateCommentRequest(text="a top-level comment " * 5, author="commenter", parent_post_id=post_id)
+            for _ in range(args.fanout)]), context).results]
+        roots.append(level[0].comment_id)
+        for _ in range(args.depth):
+            level = [result.comment for result in service.BatchCreateComments(reddit_pb2.BatchCreateCommentsRequest(comments=[
+                reddit_pb2.CreateCommentRequest(text="a reply " * 10, author="replier", parent_comment_id=parent.comment_id)
+                for parent in level[:args.fanout] for _ in range(args.fanout)]), context).results]
+    return post_ids, roots
+
+def workloads(args, post_ids, roots):
+    """Returns RPC -> factory of its requests."""
+    thread_ids = post_ids[:args.threads]
+    return {
+        'GetPost': lambda: reddit_pb2.GetPostRequest(post_id=random.choice(post_ids)),
+        'GetTopCommentsUnderPost': lambda: reddit_pb2.GetTopCommentsUnderPostRequest(
+            post_id=random.choice(thread_ids), count=args.fanout),
+        'ExpandCommentBranch': lambda: reddit_pb2.ExpandCommentBranchRequest(
+            comment_id=random.choice(roots), count=args.fanout, max_depth=args.depth),
+    }
+
+def time_calls(service, method, make_request, args, store, roots):
+    context = MagicMock()
+    handler = getattr(service, method)
+    latencies = []
+    for call in range(args.calls):
+        if call % args.vote_every == 0:
+            # Keep the cached encodings honest: the served scores change under them
+            if method == 'GetPost':
+                store.vote_posts([(post_id, 1, 0) for post_id in random.sample(list(store.posts), 10)])
+            else:
+                store.vote_comments([(random.choice(roots), 1, 0)])
+        request = make_request()
+        start = time.process_time_ns()
+        serialize_response(handler(request, context))
+        latencies.append(time.process_time_ns() - start)
+    latencies.sort()
+    return sum(latencies) / len(latencies) / 1000, percentile(latencies, 0.99) / 1000
+
+def main():
+    args = parse_arguments()
+    random.seed(0)
+    store = InMemoryStore()
+    post_ids, roots = populate(args, store)
+    # The same store, read once as messages and once through the encoder
+    services = {'messages': RedditService(store)}
+    store.encoder = EntityEncoder()
+    services['pre-encoded'] = RedditService(store)
+    print(f"{'rpc':>24} {'responses':>12} {'mean us CPU':>12} {'p99 us':>8}")
+    for method, make_request in workloads(args, post_ids, roots).items():
+        baseline = None
+        for label, service in services.items():
+            mean, p99 = time_calls(service, method, make_request, args, store, roots)
+            saved = '' if baseline is None else f"  ({1 - mean / baseline:.0%} less CPU)"
+            baseline = baseline or mean
+            print(f"{method:>24} {label:>12} {mean:>12.1f} {p99:>8.1f}{saved}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Load benchmark comparing the thread-pool and grpc.aio server modes: each mode is started
+as a subprocess and driven by a fixed number of concurrent streams issuing read RPCs.
+
+Usage:
+    python -m benchmarks.bench_server_modes --streams 1000 --duration 10
+"""
+import argparse
+import asyncio
+import random
+import subprocess
+import sys
+import time
+
+import grpc
+from grpc_health.v1 import health_pb2, health_pb2_grpc
+
+from client.reddit_client import AsyncRedditClient
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Thread-pool vs grpc.aio server load benchmark')
+    parser.add_argument('--streams', type=int, default=1000, help='Concurrent in-flight RPCs (default: 1000)')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to run each mode (default: 10)')
+    parser.add_argument('--port', type=int, default=50151, help='Port for the benchmarked server (default: 50151)')
+    parser.add_argument('--max_workers', type=int, default=64, help='Thread pool size for thread mode (default: 64)')
+    parser.add_argument('--modes', nargs='+', default=['thread', 'async'], help='Modes to compare (default: thread async)')
+    return parser.parse_args()
+
+def wait_until_serving(port, timeout=30):
+    channel = grpc.insecure_channel(f"localhost:{port}")
+    stub = health_pb2_grpc.HealthStub(channel)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if stub.Check(health_pb2.HealthCheckRequest(), timeout=1).status == health_pb2.HealthCheckResponse.SERVING:
+                return
+        except grpc.RpcError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not become ready")
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+async def drive(port, args):
+    client = AsyncRedditClient(port=port)
+    post = (await client.create_post(title="bench", text="bench", image_url="image_url", subreddit_id="bench")).post
+    comments = [(await client.create_comment(text="c", author="a", parent_post_id=post.post_id)).comment
+                for _ in range(50)]
+    await client.batch_vote_comments([(random.choice(comments).comment_id, True) for _ in range(500)])
+
+    latencies = []
+    stop_at = time.monotonic() + args.duration
+
+    async def stream():
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            if random.random() < 0.5:
+                await client.get_post(post.post_id)
+            else:
+                await client.get_top_comments_under_post(post.post_id, count=10)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.monotonic()
+    await asyncio.gather(*(stream() for _ in range(args.streams)))
+    elapsed = time.monotonic() - start
+    await client.close()
+    return latencies, elapsed
+
+def main():
+    args = parse_arguments()
+    print(f"{'mode':>8} {'QPS':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode in args.modes:
+        server = subprocess.Popen([sys.executable, '-m', 'server.reddit_server', '--port', str(args.port),
+                                   '--mode', mode, '--max_workers', str(args.max_workers)], stdout=subprocess.DEVNULL)
+        try:
+            wait_until_serving(args.port)
+            latencies, elapsed = asyncio.run(drive(args.port, args))
+        finally:
+            server.terminate()
+            server.wait()
+        latencies.sort()
+        print(f"{mode:>8} {len(latencies) / elapsed:>9.0f} {percentile(latencies, 0.5) * 1e3:>8.2f} "
+              f"{percentile(latencies, 0.99) * 1e3:>8.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Measures sustained write throughput (comment creation and votes) of each storage backend.
+
+Usage:
+    python -m benchmarks.bench_storage --threads 8 --ops 5000
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from unittest.mock import MagicMock
+
+import reddit_pb2
+from server.reddit_server import RedditService
+from server.sqlite_store import SQLiteStore
+from server.store import InMemoryStore
+from server.vote_buffer import VoteBuffer
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Storage backend write throughput benchmark')
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent writer threads (default: 8)')
+    parser.add_argument('--ops', type=int, default=5000, help='Writes per thread (default: 5000)')
+    parser.add_argument('--vote_ratio', type=float, default=0.8, help='Fraction of writes that are votes (default: 0.8)')
+    return parser.parse_args()
+
+def run(store, args):
+    service = RedditService(store)
+    context = MagicMock()
+    create = reddit_pb2.CreatePostRequest(title="t", text="t", image_url="i", subreddit_id="bench")
+    post_id = service.CreatePost(create, context).post.post_id
+    seed_request = reddit_pb2.CreateCommentRequest(text="seed", author="bench", parent_post_id=post_id)
+    seed_ids = [service.CreateComment(seed_request, context).comment.comment_id for _ in range(100)]
+
+    def write(thread_number):
+        rng = random.Random(thread_number)
+        comment_request = reddit_pb2.CreateCommentRequest(text="bench", author="bench", parent_post_id=post_id)
+        for _ in range(args.ops):
+            if rng.random() < args.vote_ratio:
+                vote = reddit_pb2.VoteCommentRequest(comment_id=rng.choice(seed_ids), upvote=rng.random() < 0.7)
+                service.VoteComment(vote, context)
+            else:
+                service.CreateComment(comment_request, context)
+
+    workers = [threading.Thread(target=write, args=(n,)) for n in range(args.threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if hasattr(store, "close"):
+        store.close()  # Includes the final vote buffer flush
+    return args.threads * args.ops / (time.perf_counter() - start)
+
+def main():
+    args = parse_arguments()
+    with tempfile.TemporaryDirectory() as directory:
+        backends = [
+            ("memory", lambda: InMemoryStore()),
+            ("sqlite", lambda: SQLiteStore(os.path.join(directory, "sqlite.db"))),
+            ("sqlite + vote buffer", lambda: VoteBuffer(SQLiteStore(os.path.join(directory, "buffered.db")))),
+        ]
+        for name, make_store in backends:
+            print(f"{name:>22}: {run(make_store(), args):>10.0f} writes/s")
+
+if __name__ == '__main__':
+    main()
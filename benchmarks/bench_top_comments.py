@@ -0,0 +1,72 @@
+"""
+Measures GetTopCommentsUnderPost latency on a fixed-size thread while the total number
+of comments held by the server grows.
+
+With --sort, measures that comment order instead of TOP; the first call builds the order's
+index for the post and later ones read it.
+
+Usage:
+    python -m benchmarks.bench_top_comments --sizes 10000 100000 1000000 10000000
+    python -m benchmarks.bench_top_comments --sort BEST
+"""
+import argparse
+import random
+import time
+from unittest.mock import MagicMock
+
+import reddit_pb2
+from server import reddit_server
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='GetTopCommentsUnderPost scaling benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help='Total comment counts to measure at (default: 10000 100000 1000000)')
+    parser.add_argument('--thread_size', type=int, default=500, help='Comments under the measured post (default: 500)')
+    parser.add_argument('--count', type=int, default=10, help='Top N comments to request (default: 10)')
+    parser.add_argument('--iterations', type=int, default=2000, help='Timed calls per size (default: 2000)')
+    parser.add_argument('--sort', choices=reddit_pb2.SortOrder.keys(), default='TOP',
+                        help='Order of the requested comments (default: TOP)')
+    return parser.parse_args()
+
+def create_comment(service, context, post_id):
+    request = reddit_pb2.CreateCommentRequest(text="benchmark comment", author="bench", parent_post_id=post_id)
+    return service.CreateComment(request, context).comment
+
+def vote_randomly(service, context, comment_ids, votes):
+    for _ in range(votes):
+        request = reddit_pb2.VoteCommentRequest(comment_id=random.choice(comment_ids), upvote=random.random() < 0.7)
+        service.VoteComment(request, context)
+
+def main():
+    args = parse_arguments()
+    service = reddit_server.RedditService()
+    context = MagicMock()
+    random.seed(0)
+
+    # The measured thread stays the same size; only the rest of the store grows
+    hot_post_id = "hot_post"
+    hot_ids = [create_comment(service, context, hot_post_id).comment_id for _ in range(args.thread_size)]
+    vote_randomly(service, context, hot_ids, args.thread_size * 5)
+    total = args.thread_size
+
+    request = reddit_pb2.GetTopCommentsUnderPostRequest(post_id=hot_post_id, count=args.count,
+                                                        sort=reddit_pb2.SortOrder.Value(args.sort))
+    print(f"{'total comments':>15} {'mean us/call':>13} {'p99 us/call':>12}")
+    for size in sorted(args.sizes):
+        # Spread the filler comments over many other posts
+        while total < size:
+            create_comment(service, context, f"post_{total % 10000}")
+            total += 1
+
+        timings = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            service.GetTopCommentsUnderPost(request, context)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        mean_us = sum(timings) / len(timings) * 1e6
+        p99_us = timings[int(len(timings) * 0.99)] * 1e6
+        print(f"{total:>15} {mean_us:>13.1f} {p99_us:>12.1f}")
+
+if __name__ == '__main__':
+    main()
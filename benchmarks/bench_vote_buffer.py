@@ -0,0 +1,57 @@
+"""
+Compares VotePost throughput on a handful of hot posts with and without the vote buffer.
+
+Usage:
+    python -m benchmarks.bench_vote_buffer --threads 8 --votes 20000
+"""
+import argparse
+import threading
+import time
+from unittest.mock import MagicMock
+
+import reddit_pb2
+from server.reddit_server import RedditService
+from server.store import InMemoryStore
+from server.vote_buffer import VoteBuffer
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Vote buffer throughput benchmark')
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent voting threads (default: 8)')
+    parser.add_argument('--votes', type=int, default=20000, help='Votes per thread (default: 20000)')
+    parser.add_argument('--hot_posts', type=int, default=4, help='Number of posts receiving the votes (default: 4)')
+    return parser.parse_args()
+
+def run(store, args):
+    service = RedditService(store)
+    context = MagicMock()
+    create = reddit_pb2.CreatePostRequest(title="Hot", text="text", image_url="image_url", subreddit_id="sub")
+    requests = [reddit_pb2.VotePostRequest(post_id=service.CreatePost(create, context).post.post_id, upvote=True)
+                for _ in range(args.hot_posts)]
+
+    def vote(offset):
+        for i in range(args.votes):
+            service.VotePost(requests[(i + offset) % len(requests)], context)
+
+    workers = [threading.Thread(target=vote, args=(n,)) for n in range(args.threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    if isinstance(store, VoteBuffer):
+        store.close()
+    total = sum(store.get_post(request.post_id).score for request in requests)
+    assert total == args.threads * args.votes, "votes were lost"
+    return args.threads * args.votes / elapsed
+
+def main():
+    args = parse_arguments()
+    direct = run(InMemoryStore(), args)
+    buffered = run(VoteBuffer(InMemoryStore()), args)
+    print(f"direct:   {direct:>10.0f} votes/s")
+    print(f"buffered: {buffered:>10.0f} votes/s ({buffered / direct:.2f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+import grpc
+import reddit_pb2
+
+SERVICE_NAME = reddit_pb2.DESCRIPTOR.services_by_name['RedditService'].full_name
+
+# Calls that can be repeated without changing anything: retried, and hedged when hedging is on
+READ_METHODS = ("GetPost", "GetTopCommentsUnderPost", "ExpandCommentBranch")
+# Creates whose requests carry idempotency keys, so a repeat returns what the first attempt created
+KEYED_WRITE_METHODS = ("CreatePost", "CreateComment", "BatchCreateComments")
+
+# UNAVAILABLE: the call never reached a server; RESOURCE_EXHAUSTED: admission control turned it
+# down, with a grpc-retry-pushback-ms trailer that gRPC waits for before the next attempt
+RETRYABLE_CODES = ("UNAVAILABLE", "RESOURCE_EXHAUSTED")
+
+
+def _duration(seconds):
+    return f"{seconds:.3f}s"
+
+
+def retry_service_config(max_attempts=3, initial_backoff=0.05, max_backoff=1.0, methods=READ_METHODS + KEYED_WRITE_METHODS):
+    """
+    Returns the grpc.service_config channel argument of a policy retrying the methods up to
+    max_attempts times in all (gRPC caps it at 5), with exponential backoff between attempts.
+    Retries stay within the call's deadline, and are throttled once more than about one call
+    in ten fails, so they can't multiply the load of a server that is already failing.
+    """
+    return json.dumps({
+        "methodConfig": [{
+            "name": [{"service": SERVICE_NAME, "method": method} for method in methods],
+            "retryPolicy": {"maxAttempts": max_attempts, "initialBackoff": _duration(initial_backoff),
+                            "maxBackoff": _duration(max_backoff), "backoffMultiplier": 2,
+                            "retryableStatusCodes": list(RETRYABLE_CODES)},
+        }],
+        "retryThrottling": {"maxTokens": 10, "tokenRatio": 0.1},
+    })
+
+
+class _Latencies:
+    """The latest latencies of one method, and the hedging delay derived from them."""
+
+    __slots__ = ("samples", "delay", "calls", "hedged", "hedge_wins")
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.delay = None
+        self.calls = self.hedged = self.hedge_wins = 0
+
+
+class Hedger:
+    """
+    Sends a second copy of a read whose response hasn't come back within the given percentile
+    of the method's recent latencies, and returns whichever response arrives first; the other
+    call is cancelled. The copy goes out on the pool's next channel, and gets what is left of
+    the call's deadline.
+
+    Until min_samples latencies of a method are known, its calls aren't hedged. Hedges are
+    limited to max_ratio of the calls, so that a server slowing down across the board doesn't
+    get its load doubled. A call that may be hedged is made as a future, which costs a few
+    hundred microseconds more than a blocking call, so hedging only pays off when the tail
+    is well above that, and a hedge can reach a less loaded server or connection.
+    """
+
+    def __init__(self, percentile=0.95, window=1000, min_samples=100, max_ratio=0.1):
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self._lock = threading.Lock()
+        self._methods = {}
+
+    def _latencies(self, method):
+        latencies = self._methods.get(method)
+        if latencies is None:
+            with self._lock:
+                latencies = self._methods.setdefault(method, _Latencies(self.window))
+        return latencies
+
+    def _record(self, latencies, seconds):
+        with self._lock:
+            latencies.samples.append(seconds)
+            # Sorting the window every call would cost more than the call; every 10% of it is enough
+            if len(latencies.samples) >= self.min_samples and latencies.calls % max(self.window // 10, 1) == 0:
+                ordered = sorted(latencies.samples)
+                latencies.delay = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+
+    def call(self, method, next_stub, request, timeout=None):
+        """Calls method with request on next_stub() and returns its response, hedging it if it is slow."""
+        latencies = self._latencies(method)
+        with self._lock:
+            latencies.calls += 1
+            delay = latencies.delay
+        start = time.perf_counter()
+        if delay is None:
+            # A future costs a hand-off to gRPC's thread, so only calls that may be hedged use one
+            response = getattr(next_stub(), method)(request, timeout=timeout)
+        else:
+            first = getattr(next_stub(), method).future(request, timeout=timeout)
+            try:
+                response = first.result(timeout=delay)
+            except grpc.FutureTimeoutError:
+                response = self._hedge(latencies, method, next_stub, request, timeout, start, first)
+        self._record(latencies, time.perf_counter() - start)
+        return response
+
+    def _hedge(self, latencies, method, next_stub, request, timeout, start, first):
+        with self._lock:
+            over_budget = latencies.hedged >= self.max_ratio * latencies.calls
+            if not over_budget:
+                latencies.hedged += 1
+        if over_budget:
+            return first.result()
+        remaining = None if timeout is None else max(timeout - (time.perf_counter() - start), 0.0)
+        second = getattr(next_stub(), method).future(request, timeout=remaining)
+        finished = queue.SimpleQueue()
+        first.add_done_callback(finished.put)
+        second.add_done_callback(finished.put)
+        winner = finished.get()
+        if winner.code().name in RETRYABLE_CODES:
+            winner = finished.get()  # The other call may still succeed
+        (second if winner is first else first).cancel()
+        if winner is second:
+            with self._lock:
+                latencies.hedge_wins += 1
+        return winner.result()
+
+    def stats(self):
+        """Returns method -> calls, hedged calls, hedges that answered first and the current hedging delay in ms."""
+        with self._lock:
+            return {method: {"calls": latencies.calls, "hedged": latencies.hedged, "hedge_wins": latencies.hedge_wins,
+                             "delay_ms": None if latencies.delay is None else latencies.delay * 1000}
+                    for method, latencies in self._methods.items()}
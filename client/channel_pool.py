@@ -0,0 +1,75 @@
+import itertools
+import threading
+
+import grpc
+import reddit_pb2_grpc
+
+
+def channel_options(keepalive_time_ms=None, keepalive_timeout_ms=20000, max_message_size=None, service_config=None):
+    """Returns the channel arguments for the given keepalive, message size and service config settings."""
+    options = []
+    if keepalive_time_ms is not None:
+        # Ping idle connections too, so that dead ones are noticed before the next call fails on them.
+        # The server only accepts pings every 10s or more (see server.handlers.SERVER_OPTIONS).
+        options += [("grpc.keepalive_time_ms", keepalive_time_ms),
+                    ("grpc.keepalive_timeout_ms", keepalive_timeout_ms),
+                    ("grpc.keepalive_permit_without_calls", 1),
+                    ("grpc.http2.max_pings_without_data", 0)]
+    if max_message_size is not None:
+        options += [("grpc.max_send_message_length", max_message_size),
+                    ("grpc.max_receive_message_length", max_message_size)]
+    if service_config is not None:
+        # Applies to every call on the channel, unlike a config served by the name resolver
+        options += [("grpc.service_config", service_config),
+                    ("grpc.enable_retries", 1)]
+    return options
+
+
+class ChannelPool:
+    """
+    A fixed set of channels to one target, whose stubs are handed out round-robin.
+
+    gRPC Python lets channels created with identical arguments share their connection, so
+    when there is more than one channel, each gets its own subchannel pool and with it its
+    own HTTP/2 connection.
+    """
+
+    def __init__(self, target, size=1, options=(), channel_factory=grpc.insecure_channel):
+        self.target = target
+        self.key = (target, size, tuple(options))
+        if size > 1:
+            options = [*options, ("grpc.use_local_subchannel_pool", 1)]
+        self.channels = [channel_factory(target, options=list(options)) for _ in range(size)]
+        self.stubs = [reddit_pb2_grpc.RedditServiceStub(channel) for channel in self.channels]
+        self.next_stub = itertools.cycle(self.stubs).__next__  # Atomic under the GIL
+        self._references = 0
+
+    def close(self):
+        for channel in self.channels:
+            channel.close()
+
+
+# Pools shared by every RedditClient in the process, by (target, size, options)
+_shared_lock = threading.Lock()
+_shared_pools = {}
+
+
+def acquire_pool(target, size=1, options=()):
+    """Returns the shared pool for these settings, creating it on first use. Hand it back with release_pool()."""
+    key = (target, size, tuple(options))
+    with _shared_lock:
+        pool = _shared_pools.get(key)
+        if pool is None:
+            pool = _shared_pools[key] = ChannelPool(target, size, options)
+        pool._references += 1
+    return pool
+
+
+def release_pool(pool):
+    """Drops a reference to a shared pool, and closes its channels once nobody uses them anymore."""
+    with _shared_lock:
+        pool._references -= 1
+        if pool._references > 0:
+            return
+        del _shared_pools[pool.key]
+    pool.close()
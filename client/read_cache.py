@@ -0,0 +1,189 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+
+def post_entities(response):
+    """Yields (ID, version) of the entities of a GetPostResponse."""
+    yield response.post.post_id, response.post.version
+
+
+def comment_entities(response):
+    """Likewise for a GetTopCommentsUnderPostResponse."""
+    for comment in response.comments:
+        yield comment.comment_id, comment.version
+
+
+def branch_entities(response):
+    """Likewise for an ExpandCommentBranchResponse, at every depth of the branch."""
+    nodes = list(response.comment_nodes)
+    while nodes:
+        node = nodes.pop()
+        yield node.comment.comment_id, node.comment.version
+        for child in node.children:
+            yield child.comment_id, child.version
+        nodes.extend(node.replies)
+
+
+class _Flight:
+    """A fetch in progress, which concurrent misses of the same key wait for instead of fetching again."""
+
+    __slots__ = ("done", "response", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class _MethodStats:
+    __slots__ = ("hits", "misses", "coalesced", "hit_seconds", "miss_seconds")
+
+    def __init__(self):
+        self.hits = self.misses = self.coalesced = 0
+        self.hit_seconds = self.miss_seconds = 0.0
+
+    def summary(self):
+        calls = self.hits + self.misses + self.coalesced
+        waits = self.misses + self.coalesced
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced,
+                "hit_ratio": self.hits / calls if calls else 0.0,
+                "mean_hit_ms": self.hit_seconds / self.hits * 1000 if self.hits else 0.0,
+                "mean_miss_ms": self.miss_seconds / waits * 1000 if waits else 0.0}
+
+
+class ReadCache:
+    """
+    Bounded cache of read responses, each kept for at most ttl seconds.
+
+    A response is cached under its method and arguments, together with the IDs of the posts
+    and comments it holds and their versions, which the server bumps whenever an entity
+    changes (a vote, a first reply). Seeing a newer version of an entity in any response
+    evicts every cached response holding an older one, and a response holding an entity
+    older than one already seen isn't cached. Writes made through the same client
+    invalidate the entities they change right away.
+
+    Concurrent misses of the same key are coalesced into one fetch, whose response (or
+    error) every caller gets. Errors aren't cached. Cached responses are shared between
+    callers, so they must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=1000, ttl=1.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # Key -> (expiry, response, entity IDs), least recently used first
+        self._entities = {}  # Entity ID -> [newest version seen, keys of the entries holding it]
+        self._keyed = {}  # First argument -> keys of the entries whose call had it, such as a post's top comments
+        self._flights = {}  # Key -> _Flight
+        self._invalidations = 0  # Bumped by invalidate(), so fetches that started before it don't cache
+        self._stats = defaultdict(_MethodStats)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, method, args, fetch, entities):
+        """
+        Returns the cached response of method(*args), or fetch()'s, which is cached unless it
+        is already stale. entities(response) yields the (ID, version) pairs of the response.
+        """
+        start = time.perf_counter()
+        key = (method, args)
+        with self._lock:
+            stats = self._stats[method]
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self.clock():
+                self._entries.move_to_end(key)
+                stats.hits += 1
+                stats.hit_seconds += time.perf_counter() - start
+                return entry[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                ticket = self._invalidations
+
+        if not leader:
+            flight.done.wait()
+            with self._lock:
+                stats.coalesced += 1
+                stats.miss_seconds += time.perf_counter() - start
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+
+        try:
+            flight.response = fetch()
+        except Exception as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if flight.error is None and ticket == self._invalidations:
+                    self._put(key, flight.response, list(entities(flight.response)))
+                stats.misses += 1
+                stats.miss_seconds += time.perf_counter() - start
+            flight.done.set()
+        return flight.response
+
+    def _put(self, key, response, versions):
+        for entity_id, version in versions:
+            known = self._entities.get(entity_id)
+            if known is not None and version < known[0]:
+                return  # Already outdated
+        for entity_id, version in versions:
+            known = self._entities.get(entity_id)
+            if known is not None and version > known[0]:
+                self._evict_holders(entity_id)
+        self._remove(key)
+        for entity_id, version in versions:
+            self._entities.setdefault(entity_id, [version, set()])[1].add(key)
+        self._keyed.setdefault(key[1][0], set()).add(key)
+        self._entries[key] = (self.clock() + self.ttl, response, [entity_id for entity_id, _ in versions])
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _evict_holders(self, entity_id):
+        # The entity's record goes with its last holder
+        for key in list(self._entities[entity_id][1]):
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keyed = self._keyed[key[1][0]]
+        keyed.discard(key)
+        if not keyed:
+            del self._keyed[key[1][0]]
+        for entity_id in entry[2]:
+            known = self._entities.get(entity_id)
+            if known is not None:
+                known[1].discard(key)
+                if not known[1]:
+                    del self._entities[entity_id]
+
+    def invalidate(self, *entity_ids):
+        """Evicts the responses holding any of the entities, and those keyed by them, such as a post's top comments."""
+        with self._lock:
+            self._invalidations += 1
+            for entity_id in entity_ids:
+                if entity_id in self._entities:
+                    self._evict_holders(entity_id)
+            for entity_id in entity_ids:
+                for key in list(self._keyed.get(entity_id, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._invalidations += 1
+            self._entries.clear()
+            self._entities.clear()
+            self._keyed.clear()
+
+    def stats(self):
+        """Returns method -> hits, misses, coalesced misses, hit ratio and mean hit and miss latency in ms."""
+        with self._lock:
+            return {method: stats.summary() for method, stats in self._stats.items()}
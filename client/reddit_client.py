@@ -1,48 +1,242 @@
+import asyncio
+import uuid
+
 import grpc
 import reddit_pb2
-import reddit_pb2_grpc
+
+from client.call_policy import READ_METHODS, SERVICE_NAME, Hedger, retry_service_config
+from client.channel_pool import ChannelPool, acquire_pool, channel_options, release_pool
+from client.read_cache import ReadCache, branch_entities, comment_entities, post_entities
+
+SERVICE = reddit_pb2.DESCRIPTOR.services_by_name['RedditService']
+
+
+def method_timeouts(timeout=None, timeouts=None):
+    """
+    Returns method name -> deadline in seconds or None: timeouts' entry for the method, or else
+    timeout for the unary methods. Streams (StreamSubredditFeed, WatchPost) may last as long as
+    the caller wants, so they only get a deadline of their own.
+    """
+    timeouts = dict(timeouts or {})
+    unknown = set(timeouts) - set(SERVICE.methods_by_name)
+    if unknown:
+        raise ValueError(f"No such {SERVICE_NAME} methods: {', '.join(sorted(unknown))}")
+    return {method.name: timeouts.get(method.name, None if method.server_streaming else timeout)
+            for method in SERVICE.methods}
+
 
 class RedditClient:
-    def __init__(self, host='localhost', port=50051):
-        self.channel = grpc.insecure_channel(f"{host}:{port}")
-        self.stub = reddit_pb2_grpc.RedditServiceStub(self.channel)
+    """
+    Client of the Reddit service.
+
+    Clients to the same host and port with the same settings share their channels, so
+    creating many of them is cheap; close() hands a client's channels back. pool_size > 1
+    spreads calls round-robin over that many connections.
+
+    cache_size > 0 caches up to that many responses of get_post, get_top_comments_under_post
+    and expand_comment_branch for cache_ttl seconds (see client.read_cache.ReadCache); cached
+    responses are shared between callers and must not be modified.
+
+    Calls get a deadline of timeout seconds, or of timeouts[method name] (see method_timeouts).
+    max_attempts > 1 retries the reads and the creates that fail with UNAVAILABLE or
+    RESOURCE_EXHAUSTED (see client.call_policy.retry_service_config); creates carry an
+    idempotency key, so a retried create can't make a second post or comment.
+    hedge_percentile sends a second copy of a read still unanswered after that percentile of
+    its recent latencies (see client.call_policy.Hedger).
+    """
+    def __init__(self, host='localhost', port=50051, pool_size=1, keepalive_time_ms=None, max_message_size=None,
+                 shared=True, cache_size=0, cache_ttl=1.0, timeout=None, timeouts=None, max_attempts=1,
+                 hedge_percentile=None):
+        service_config = retry_service_config(max_attempts) if max_attempts > 1 else None
+        options = channel_options(keepalive_time_ms=keepalive_time_ms, max_message_size=max_message_size,
+                                  service_config=service_config)
+        target = f"{host}:{port}"
+        self.timeouts = method_timeouts(timeout, timeouts)
+        self.shared = shared
+        self.pool = acquire_pool(target, pool_size, options) if shared else ChannelPool(target, pool_size, options)
+        self.channel = self.pool.channels[0]
+        self.cache = ReadCache(cache_size, cache_ttl) if cache_size > 0 else None
+        self.hedger = Hedger(hedge_percentile) if hedge_percentile is not None else None
 
-    def create_post(self, title, text, image_url=None, video_url=None, author=None, subreddit_id=None, tags=None):
-        # Create the request and set image_url or video_url based on input
-        request = reddit_pb2.CreatePostRequest(title=title, text=text, author=author, subreddit_id=subreddit_id, tags=tags)
+    @property
+    def stub(self):
+        return self.pool.next_stub()
+
+    def close(self):
+        if self.pool is None:
+            return
+        if self.shared:
+            release_pool(self.pool)
+        else:
+            self.pool.close()
+        self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _call(self, method, request):
+        # Calls the RPC with its deadline, hedged if it is a read and hedging is on
+        timeout = self.timeouts[method]
+        if self.hedger is not None and method in READ_METHODS:
+            return self.hedger.call(method, self.pool.next_stub, request, timeout)
+        return getattr(self.stub, method)(request, timeout=timeout)
+
+    def create_post(self, title, text, image_url=None, video_url=None, author=None, subreddit_id=None, tags=None,
+                    idempotency_key=None):
+        # Create the request and set image_url or video_url based on input. Pass the same
+        # idempotency_key to retry a create_post() whose outcome is unknown.
+        request = reddit_pb2.CreatePostRequest(title=title, text=text, author=author, subreddit_id=subreddit_id, tags=tags,
+                                               idempotency_key=idempotency_key or str(uuid.uuid4()))
         if image_url:
             request.image_url = image_url
         elif video_url:
             request.video_url = video_url
         
-        return self.stub.CreatePost(request)
+        return self._call('CreatePost', request)
+
+    def _invalidate(self, *entity_ids):
+        if self.cache is not None:
+            self.cache.invalidate(*entity_ids)
+
+    def _cached(self, method, args, request, entities):
+        # Calls the RPC through the read cache when there is one
+        fetch = lambda: self._call(method, request)
+        if self.cache is None:
+            return fetch()
+        return self.cache.get(method, args, fetch, entities)
+
+    def cache_stats(self):
+        """Returns the read cache's per-method hit ratio and latency, or None without a cache."""
+        return None if self.cache is None else self.cache.stats()
 
     def vote_post(self, post_id, upvote):
         request = reddit_pb2.VotePostRequest(post_id=post_id, upvote=upvote)
-        return self.stub.VotePost(request)
+        try:
+            return self._call('VotePost', request)
+        finally:
+            self._invalidate(post_id)
 
     def get_post(self, post_id):
         request = reddit_pb2.GetPostRequest(post_id=post_id)
-        return self.stub.GetPost(request)
+        return self._cached('GetPost', (post_id,), request, post_entities)
 
-    def create_comment(self, text, author, parent_post_id=None, parent_comment_id=None):
+    def create_comment(self, text, author, parent_post_id=None, parent_comment_id=None, idempotency_key=None):
+        request = self._create_comment_request(text, author, parent_post_id, parent_comment_id, idempotency_key)
+        try:
+            return self._call('CreateComment', request)
+        finally:
+            self._invalidate(parent_post_id or parent_comment_id)
+
+    @staticmethod
+    def _create_comment_request(text, author, parent_post_id=None, parent_comment_id=None, idempotency_key=None):
         # Create the request and set the parent based on input
-        request = reddit_pb2.CreateCommentRequest(text=text, author=author)
+        request = reddit_pb2.CreateCommentRequest(text=text, author=author,
+                                                  idempotency_key=idempotency_key or str(uuid.uuid4()))
         if parent_post_id:
             request.parent_post_id = parent_post_id
         elif parent_comment_id:
             request.parent_comment_id = parent_comment_id
-
-        return self.stub.CreateComment(request)
+        return request
 
     def vote_comment(self, comment_id, upvote):
         request = reddit_pb2.VoteCommentRequest(comment_id=comment_id, upvote=upvote)
-        return self.stub.VoteComment(request)
+        try:
+            return self._call('VoteComment', request)
+        finally:
+            self._invalidate(comment_id)
+
+    def get_top_comments_under_post(self, post_id, count, sort=reddit_pb2.TOP):
+        request = reddit_pb2.GetTopCommentsUnderPostRequest(post_id=post_id, count=count, sort=sort)
+        return self._cached('GetTopCommentsUnderPost', (post_id, count, sort), request, comment_entities)
+
+    def expand_comment_branch(self, comment_id, count, max_depth=0):
+        request = reddit_pb2.ExpandCommentBranchRequest(comment_id=comment_id, count=count, max_depth=max_depth)
+        return self._cached('ExpandCommentBranch', (comment_id, count, max_depth), request, branch_entities)
+
+    def get_post_thread(self, post_id, count, max_depth=0):
+        # The post, its top comments and its top comment's branch in one round trip
+        request = reddit_pb2.GetPostThreadRequest(post_id=post_id, count=count, max_depth=max_depth)
+        return self._call('GetPostThread', request)
+
+    def search_posts(self, query, count=10, tags=None, subreddit_id=None):
+        request = reddit_pb2.SearchPostsRequest(query=query, count=count, tags=tags, subreddit_id=subreddit_id)
+        return self._call('SearchPosts', request)
+
+    def search_comments(self, query, count=10):
+        request = reddit_pb2.SearchCommentsRequest(query=query, count=count)
+        return self._call('SearchComments', request)
+
+    def batch_get_posts(self, post_ids):
+        request = reddit_pb2.BatchGetPostsRequest(post_ids=post_ids)
+        return self._call('BatchGetPosts', request)
+
+    def batch_vote_posts(self, votes):
+        # votes: iterable of (post_id, upvote) pairs
+        request = reddit_pb2.BatchVotePostsRequest(
+            votes=[reddit_pb2.VotePostRequest(post_id=post_id, upvote=upvote) for post_id, upvote in votes])
+        try:
+            return self._call('BatchVotePosts', request)
+        finally:
+            self._invalidate(*(vote.post_id for vote in request.votes))
+
+    def batch_vote_comments(self, votes):
+        # votes: iterable of (comment_id, upvote) pairs
+        request = reddit_pb2.BatchVoteCommentsRequest(
+            votes=[reddit_pb2.VoteCommentRequest(comment_id=comment_id, upvote=upvote) for comment_id, upvote in votes])
+        try:
+            return self._call('BatchVoteComments', request)
+        finally:
+            self._invalidate(*(vote.comment_id for vote in request.votes))
+
+    def batch_create_comments(self, comments):
+        # comments: iterable of dicts with the keyword arguments of create_comment()
+        request = reddit_pb2.BatchCreateCommentsRequest(
+            comments=[self._create_comment_request(**comment) for comment in comments])
+        try:
+            return self._call('BatchCreateComments', request)
+        finally:
+            self._invalidate(*(comment.parent_post_id or comment.parent_comment_id for comment in request.comments))
+
+    def stream_subreddit_feed(self, subreddit_id, sort=reddit_pb2.TOP, limit=0, cursor=""):
+        # Returns an iterator of FeedItems; pass the last item's cursor to fetch the next page
+        request = reddit_pb2.StreamSubredditFeedRequest(subreddit_id=subreddit_id, sort=sort, limit=limit, cursor=cursor)
+        return self._call('StreamSubredditFeed', request)
+
+    def watch_post(self, post_id):
+        # Returns an iterator of PostEvents; cancel() it to stop watching
+        request = reddit_pb2.WatchPostRequest(post_id=post_id)
+        return self._call('WatchPost', request)
+
+
+class AsyncRedditClient(RedditClient):
+    """
+    RedditClient over grpc.aio channels: every method returns an awaitable call.
+    Create it from inside a running event loop. Its channels belong to that loop, so
+    they are never shared with other clients. Deadlines and retries work as in
+    RedditClient; there is no read cache or hedging.
+    """
+    def __init__(self, host='localhost', port=50051, pool_size=1, keepalive_time_ms=None, max_message_size=None,
+                 timeout=None, timeouts=None, max_attempts=1):
+        service_config = retry_service_config(max_attempts) if max_attempts > 1 else None
+        options = channel_options(keepalive_time_ms=keepalive_time_ms, max_message_size=max_message_size,
+                                  service_config=service_config)
+        self.timeouts = method_timeouts(timeout, timeouts)
+        self.shared = False
+        self.pool = ChannelPool(f"{host}:{port}", pool_size, options, channel_factory=grpc.aio.insecure_channel)
+        self.channel = self.pool.channels[0]
+        self.cache = None  # The read cache blocks on coalesced fetches, which an event loop can't
+        self.hedger = None  # Likewise the hedger, while it waits for the first response
+
+    async def close(self):
+        if self.pool is not None:
+            await asyncio.gather(*(channel.close() for channel in self.pool.channels))
+            self.pool = None
 
-    def get_top_comments_under_post(self, post_id, count):
-        request = reddit_pb2.GetTopCommentsUnderPostRequest(post_id=post_id, count=count)
-        return self.stub.GetTopCommentsUnderPost(request)
+    async def __aenter__(self):
+        return self
 
-    def expand_comment_branch(self, comment_id, count):
-        request = reddit_pb2.ExpandCommentBranchRequest(comment_id=comment_id, count=count)
-        return self.stub.ExpandCommentBranch(request)
\ No newline at end of file
+    async def __aexit__(self, *exc_info):
+        await self.close()
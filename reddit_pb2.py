@@ -1,11 +1,22 @@
 # -*- coding: utf-8 -*-
 # Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
 # source: reddit.proto
+# Protobuf Python Version: 7.35.1
 """Generated protocol buffer code."""
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
 from google.protobuf import symbol_database as _symbol_database
 from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    7,
+    35,
+    1,
+    '',
+    'reddit.proto'
+)
 # @@protoc_insertion_point(imports)
 
 _sym_db = _symbol_database.Default()
@@ -13,57 +24,113 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0creddit.proto\x12\x06reddit\"\x97\x01\n\x11\x43reatePostRequest\x12\r\n\x05title\x18\x01 \x01(\t\x12\x0c\n\x04text\x18\x02 \x01(\t\x12\x13\n\timage_url\x18\x03 \x01(\tH\x00\x12\x13\n\tvideo_url\x18\x04 \x01(\tH\x00\x12\x0e\n\x06\x61uthor\x18\x05 \x01(\t\x12\x14\n\x0csubreddit_id\x18\x06 \x01(\t\x12\x0c\n\x04tags\x18\x07 \x03(\tB\x07\n\x05media\"0\n\x12\x43reatePostResponse\x12\x1a\n\x04post\x18\x01 \x01(\x0b\x32\x0c.reddit.Post\"2\n\x0fVotePostRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\t\x12\x0e\n\x06upvote\x18\x02 \x01(\x08\"#\n\x10VotePostResponse\x12\x0f\n\x07message\x18\x01 \x01(\t\"!\n\x0eGetPostRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\t\"-\n\x0fGetPostResponse\x12\x1a\n\x04post\x18\x01 \x01(\x0b\x32\x0c.reddit.Post\"u\n\x14\x43reateCommentRequest\x12\x0c\n\x04text\x18\x01 \x01(\t\x12\x0e\n\x06\x61uthor\x18\x02 \x01(\t\x12\x18\n\x0eparent_post_id\x18\x03 \x01(\tH\x00\x12\x1b\n\x11parent_comment_id\x18\x04 \x01(\tH\x00\x42\x08\n\x06parent\"9\n\x15\x43reateCommentResponse\x12 \n\x07\x63omment\x18\x01 \x01(\x0b\x32\x0f.reddit.Comment\"8\n\x12VoteCommentRequest\x12\x12\n\ncomment_id\x18\x01 \x01(\t\x12\x0e\n\x06upvote\x18\x02 \x01(\x08\"&\n\x13VoteCommentResponse\x12\x0f\n\x07message\x18\x01 \x01(\t\"@\n\x1eGetTopCommentsUnderPostRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\t\x12\r\n\x05\x63ount\x18\x02 \x01(\x05\"D\n\x1fGetTopCommentsUnderPostResponse\x12!\n\x08\x63omments\x18\x01 \x03(\x0b\x32\x0f.reddit.Comment\"?\n\x1a\x45xpandCommentBranchRequest\x12\x12\n\ncomment_id\x18\x01 \x01(\t\x12\r\n\x05\x63ount\x18\x02 \x01(\x05\"I\n\x1b\x45xpandCommentBranchResponse\x12*\n\rcomment_nodes\x18\x01 \x03(\x0b\x32\x13.reddit.CommentNode\"\x17\n\x04User\x12\x0f\n\x07user_id\x18\x01 \x01(\t\"\x94\x02\n\x04Post\x12\x0f\n\x07post_id\x18\x01 \x01(\t\x12\r\n\x05title\x18\x02 \x01(\t\x12\x0c\n\x04text\x18\x03 \x01(\t\x12\x13\n\timage_url\x18\x04 \x01(\tH\x00\x12\x13\n\tvideo_url\x18\x05 \x01(\tH\x00\x12\x0e\n\x06\x61uthor\x18\x06 \x01(\t\x12\r\n\x05score\x18\x07 \x01(\x05\x12!\n\x05state\x18\x08 \x01(\x0e\x32\x12.reddit.Post.State\x12\x18\n\x10publication_date\x18\t \x01(\t\x12\x14\n\x0csubreddit_id\x18\n \x01(\t\x12\x0c\n\x04tags\x18\x0b \x03(\t\"+\n\x05State\x12\n\n\x06NORMAL\x10\x00\x12\n\n\x06LOCKED\x10\x01\x12\n\n\x06HIDDEN\x10\x02\x42\x07\n\x05media\"\x84\x02\n\x07\x43omment\x12\x12\n\ncomment_id\x18\x01 \x01(\t\x12\x0c\n\x04text\x18\x02 \x01(\t\x12\x0e\n\x06\x61uthor\x18\x03 \x01(\t\x12\r\n\x05score\x18\x04 \x01(\x05\x12&\n\x06status\x18\x05 \x01(\x0e\x32\x16.reddit.Comment.Status\x12\x18\n\x10publication_date\x18\x06 \x01(\t\x12\x18\n\x0eparent_post_id\x18\x07 \x01(\tH\x00\x12\x1b\n\x11parent_comment_id\x18\x08 \x01(\tH\x00\x12\x13\n\x0bhas_replies\x18\t \x01(\x08\" \n\x06Status\x12\n\n\x06NORMAL\x10\x00\x12\n\n\x06HIDDEN\x10\x01\x42\x08\n\x06parent\"R\n\x0b\x43ommentNode\x12 \n\x07\x63omment\x18\x01 \x01(\x0b\x32\x0f.reddit.Comment\x12!\n\x08\x63hildren\x18\x02 \x03(\x0b\x32\x0f.reddit.Comment\"\xb4\x01\n\tSubreddit\x12\x14\n\x0csubreddit_id\x18\x01 \x01(\t\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\x30\n\nvisibility\x18\x03 \x01(\x0e\x32\x1c.reddit.Subreddit.Visibility\x12\x0c\n\x04tags\x18\x04 \x03(\t\x12\x10\n\x08post_ids\x18\x05 \x03(\t\"1\n\nVisibility\x12\n\n\x06PUBLIC\x10\x00\x12\x0b\n\x07PRIVATE\x10\x01\x12\n\n\x06HIDDEN\x10\x02\x32\xb1\x04\n\rRedditService\x12\x43\n\nCreatePost\x12\x19.reddit.CreatePostRequest\x1a\x1a.reddit.CreatePostResponse\x12=\n\x08VotePost\x12\x17.reddit.VotePostRequest\x1a\x18.reddit.VotePostResponse\x12:\n\x07GetPost\x12\x16.reddit.GetPostRequest\x1a\x17.reddit.GetPostResponse\x12L\n\rCreateComment\x12\x1c.reddit.CreateCommentRequest\x1a\x1d.reddit.CreateCommentResponse\x12\x46\n\x0bVoteComment\x12\x1a.reddit.VoteCommentRequest\x1a\x1b.reddit.VoteCommentResponse\x12j\n\x17GetTopCommentsUnderPost\x12&.reddit.GetTopCommentsUnderPostRequest\x1a\'.reddit.GetTopCommentsUnderPostResponse\x12^\n\x13\x45xpandCommentBranch\x12\".reddit.ExpandCommentBranchRequest\x1a#.reddit.ExpandCommentBranchResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0creddit.proto\x12\x06reddit\"\xb0\x01\n\x11\x43reatePostRequest\x12\r\n\x05title\x18\x01 \x01(\t\x12\x0c\n\x04text\x18\x02 \x01(\t\x12\x13\n\timage_url\x18\x03 \x01(\tH\x00\x12\x13\n\tvideo_url\x18\x04 \x01(\tH\x00\x12\x0e\n\x06\x61uthor\x18\x05 \x01(\t\x12\x14\n\x0csubreddit_id\x18\x06 \x01(\t\x12\x0c\n\x04tags\x18\x07 \x03(\t\x12\x17\n\x0fidempotency_key\x18\x08 \x01(\tB\x07\n\x05media\"0\n\x12\x43reatePostResponse\x12\x1a\n\x04post\x18\x01 \x01(\x0b\x32\x0c.reddit.Post\"2\n\x0fVotePostRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\t\x12\x0e\n\x06upvote\x18\x02 \x01(\x08\"#\n\x10VotePostResponse\x12\x0f\n\x07message\x18\x01 \x01(\t\"!\n\x0eGetPostRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\t\"-\n\x0fGetPostResponse\x12\x1a\n\x04post\x18\x01 \x01(\x0b\x32\x0c.reddit.Post\"\x8e\x01\n\x14\x43reateCommentRequest\x12\x0c\n\x04text\x18\x01 \x01(\t\x12\x0e\n\x06\x61uthor\x18\x02 \x01(\t\x12\x18\n\x0eparent_post_id\x18\x03 \x01(\tH\x00\x12\x1b\n\x11parent_comment_id\x18\x04 \x01(\tH\x00\x12\x17\n\x0fidempotency_key\x18\x05 \x01(\tB\x08\n\x06parent\"9\n\x15\x43reateCommentResponse\x12 \n\x07\x63omment\x18\x01 \x01(\x0b\x32\x0f.reddit.Comment\"8\n\x12VoteCommentRequest\x12\x12\n\ncomment_id\x18\x01 \x01(\t\x12\x0e\n\x06upvote\x18\x02 \x01(\x08\"&\n\x13VoteCommentResponse\x12\x0f\n\x07message\x18\x01 \x01(\t\"a\n\x1eGetTopCommentsUnderPostRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\t\x12\r\n\x05\x63ount\x18\x02 \x01(\x05\x12\x1f\n\x04sort\x18\x03 \x01(\x0e\x32\x11.reddit.SortOrder\"D\n\x1fGetTopCommentsUnderPostResponse\x12!\n\x08\x63omments\x18\x01 \x03(\x0b\x32\x0f.reddit.Comment\"R\n\x1a\x45xpandCommentBranchRequest\x12\x12\n\ncomment_id\x18\x01 \x01(\t\x12\r\n\x05\x63ount\x18\x02 \x01(\x05\x12\x11\n\tmax_depth\x18\x03 \x01(\x05\"I\n\x1b\x45xpandCommentBranchResponse\x12*\n\rcomment_nodes\x18\x01 \x03(\x0b\x32\x13.reddit.CommentNode\"0\n\x0f\x42\x61tchItemStatus\x12\x0c\n\x04\x63ode\x18\x01 \x01(\x05\x12\x0f\n\x07message\x18\x02 \x01(\t\"(\n\x14\x42\x61tchGetPostsRequest\x12\x10\n\x08post_ids\x18\x01 \x03(\t\"T\n\rGetPostResult\x12\'\n\x06status\x18\x01 \x01(\x0b\x32\x17.reddit.BatchItemStatus\x12\x1a\n\x04post\x18\x02 \x01(\x0b\x32\x0c.reddit.Post\"?\n\x15\x42\x61tchGetPostsResponse\x12&\n\x07results\x18\x01 \x03(\x0b\x32\x15.reddit.GetPostResult\"?\n\x15\x42\x61tchVotePostsRequest\x12&\n\x05votes\x18\x01 \x03(\x0b\x32\x17.reddit.VotePostRequest\"C\n\x16\x42\x61tchVotePostsResponse\x12)\n\x08statuses\x18\x01 \x03(\x0b\x32\x17.reddit.BatchItemStatus\"E\n\x18\x42\x61tchVoteCommentsRequest\x12)\n\x05votes\x18\x01 \x03(\x0b\x32\x1a.reddit.VoteCommentRequest\"F\n\x19\x42\x61tchVoteCommentsResponse\x12)\n\x08statuses\x18\x01 \x03(\x0b\x32\x17.reddit.BatchItemStatus\"L\n\x1a\x42\x61tchCreateCommentsRequest\x12.\n\x08\x63omments\x18\x01 \x03(\x0b\x32\x1c.reddit.CreateCommentRequest\"`\n\x13\x43reateCommentResult\x12\'\n\x06status\x18\x01 \x01(\x0b\x32\x17.reddit.BatchItemStatus\x12 \n\x07\x63omment\x18\x02 \x01(\x0b\x32\x0f.reddit.Comment\"K\n\x1b\x42\x61tchCreateCommentsResponse\x12,\n\x07results\x18\x01 \x03(\x0b\x32\x1b.reddit.CreateCommentResult\"r\n\x1aStreamSubredditFeedRequest\x12\x14\n\x0csubreddit_id\x18\x01 \x01(\t\x12\x1f\n\x04sort\x18\x02 \x01(\x0e\x32\x11.reddit.SortOrder\x12\r\n\x05limit\x18\x03 \x01(\x05\x12\x0e\n\x06\x63ursor\x18\x04 \x01(\t\"6\n\x08\x46\x65\x65\x64Item\x12\x1a\n\x04post\x18\x01 \x01(\x0b\x32\x0c.reddit.Post\x12\x0e\n\x06\x63ursor\x18\x02 \x01(\t\"#\n\x10WatchPostRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\t\"\xa8\x01\n\tPostEvent\x12)\n\npost_score\x18\x01 \x01(\x0b\x32\x13.reddit.ScoreUpdateH\x00\x12\"\n\x07\x63omment\x18\x02 \x01(\x0b\x32\x0f.reddit.CommentH\x00\x12,\n\rcomment_score\x18\x03 \x01(\x0b\x32\x13.reddit.ScoreUpdateH\x00\x12\x15\n\x0bhas_replies\x18\x04 \x01(\tH\x00\x42\x07\n\x05\x65vent\"H\n\nFeedCursor\x12\x1f\n\x04sort\x18\x01 \x01(\x0e\x32\x11.reddit.SortOrder\x12\x0c\n\x04rank\x18\x02 \x01(\x01\x12\x0b\n\x03seq\x18\x03 \x01(\x03\"\x17\n\x04User\x12\x0f\n\x07user_id\x18\x01 \x01(\t\"\xdd\x02\n\x04Post\x12\x0f\n\x07post_id\x18\x01 \x01(\t\x12\r\n\x05title\x18\x02 \x01(\t\x12\x0c\n\x04text\x18\x03 \x01(\t\x12\x13\n\timage_url\x18\x04 \x01(\tH\x00\x12\x13\n\tvideo_url\x18\x05 \x01(\tH\x00\x12\x0e\n\x06\x61uthor\x18\x06 \x01(\t\x12\r\n\x05score\x18\x07 \x01(\x05\x12!\n\x05state\x18\x08 \x01(\x0e\x32\x12.reddit.Post.State\x12\x18\n\x10publication_date\x18\t \x01(\t\x12\x14\n\x0csubreddit_id\x18\n \x01(\t\x12\x0c\n\x04tags\x18\x0b \x03(\t\x12\x0f\n\x07upvotes\x18\x0c \x01(\x05\x12\x11\n\tdownvotes\x18\r \x01(\x05\x12\x12\n\ncreated_at\x18\x0e \x01(\x03\x12\x0f\n\x07version\x18\x0f \x01(\x03\"+\n\x05State\x12\n\n\x06NORMAL\x10\x00\x12\n\n\x06LOCKED\x10\x01\x12\n\n\x06HIDDEN\x10\x02\x42\x07\n\x05media\"\xcd\x02\n\x07\x43omment\x12\x12\n\ncomment_id\x18\x01 \x01(\t\x12\x0c\n\x04text\x18\x02 \x01(\t\x12\x0e\n\x06\x61uthor\x18\x03 \x01(\t\x12\r\n\x05score\x18\x04 \x01(\x05\x12&\n\x06status\x18\x05 \x01(\x0e\x32\x16.reddit.Comment.Status\x12\x18\n\x10publication_date\x18\x06 \x01(\t\x12\x18\n\x0eparent_post_id\x18\x07 \x01(\tH\x00\x12\x1b\n\x11parent_comment_id\x18\x08 \x01(\tH\x00\x12\x13\n\x0bhas_replies\x18\t \x01(\x08\x12\x0f\n\x07upvotes\x18\n \x01(\x05\x12\x11\n\tdownvotes\x18\x0b \x01(\x05\x12\x12\n\ncreated_at\x18\x0c \x01(\x03\x12\x0f\n\x07version\x18\r \x01(\x03\" \n\x06Status\x12\n\n\x06NORMAL\x10\x00\x12\n\n\x06HIDDEN\x10\x01\x42\x08\n\x06parent\"I\n\x14GetPostThreadRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\t\x12\r\n\x05\x63ount\x18\x02 \x01(\x05\x12\x11\n\tmax_depth\x18\x03 \x01(\x05\"\x7f\n\x15GetPostThreadResponse\x12\x1a\n\x04post\x18\x01 \x01(\x0b\x32\x0c.reddit.Post\x12!\n\x08\x63omments\x18\x02 \x03(\x0b\x32\x0f.reddit.Comment\x12\'\n\ntop_branch\x18\x03 \x03(\x0b\x32\x13.reddit.CommentNode\"V\n\x12SearchPostsRequest\x12\r\n\x05query\x18\x01 \x01(\t\x12\r\n\x05\x63ount\x18\x02 \x01(\x05\x12\x0c\n\x04tags\x18\x03 \x03(\t\x12\x14\n\x0csubreddit_id\x18\x04 \x01(\t\"@\n\x13SearchPostsResponse\x12)\n\x07results\x18\x01 \x03(\x0b\x32\x18.reddit.PostSearchResult\"=\n\x10PostSearchResult\x12\x1a\n\x04post\x18\x01 \x01(\x0b\x32\x0c.reddit.Post\x12\r\n\x05score\x18\x02 \x01(\x01\"5\n\x15SearchCommentsRequest\x12\r\n\x05query\x18\x01 \x01(\t\x12\r\n\x05\x63ount\x18\x02 \x01(\x05\"F\n\x16SearchCommentsResponse\x12,\n\x07results\x18\x01 \x03(\x0b\x32\x1b.reddit.CommentSearchResult\"F\n\x13\x43ommentSearchResult\x12 \n\x07\x63omment\x18\x01 \x01(\x0b\x32\x0f.reddit.Comment\x12\r\n\x05score\x18\x02 \x01(\x01\"x\n\x0b\x43ommentNode\x12 \n\x07\x63omment\x18\x01 \x01(\x0b\x32\x0f.reddit.Comment\x12!\n\x08\x63hildren\x18\x02 \x03(\x0b\x32\x0f.reddit.Comment\x12$\n\x07replies\x18\x03 \x03(\x0b\x32\x13.reddit.CommentNode\"\xb4\x01\n\tSubreddit\x12\x14\n\x0csubreddit_id\x18\x01 \x01(\t\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\x30\n\nvisibility\x18\x03 \x01(\x0e\x32\x1c.reddit.Subreddit.Visibility\x12\x0c\n\x04tags\x18\x04 \x03(\t\x12\x10\n\x08post_ids\x18\x05 \x03(\t\"1\n\nVisibility\x12\n\n\x06PUBLIC\x10\x00\x12\x0b\n\x07PRIVATE\x10\x01\x12\n\n\x06HIDDEN\x10\x02\"\xb6\x01\n\rStoreMutation\x12\x1c\n\x04post\x18\x01 \x01(\x0b\x32\x0c.reddit.PostH\x00\x12\"\n\x07\x63omment\x18\x02 \x01(\x0b\x32\x0f.reddit.CommentH\x00\x12)\n\npost_score\x18\x03 \x01(\x0b\x32\x13.reddit.ScoreUpdateH\x00\x12,\n\rcomment_score\x18\x04 \x01(\x0b\x32\x13.reddit.ScoreUpdateH\x00\x42\n\n\x08mutation\"]\n\x0bScoreUpdate\x12\n\n\x02id\x18\x01 \x01(\t\x12\r\n\x05score\x18\x02 \x01(\x05\x12\x0f\n\x07upvotes\x18\x03 \x01(\x05\x12\x11\n\tdownvotes\x18\x04 \x01(\x05\x12\x0f\n\x07version\x18\x05 \x01(\x03\"L\n\nStoreChunk\x12\x1b\n\x05posts\x18\x01 \x03(\x0b\x32\x0c.reddit.Post\x12!\n\x08\x63omments\x18\x02 \x03(\x0b\x32\x0f.reddit.Comment*C\n\tSortOrder\x12\x07\n\x03TOP\x10\x00\x12\x07\n\x03HOT\x10\x01\x12\x07\n\x03NEW\x10\x02\x12\x11\n\rCONTROVERSIAL\x10\x03\x12\x08\n\x04\x42\x45ST\x10\x04\x32\xfc\t\n\rRedditService\x12\x43\n\nCreatePost\x12\x19.reddit.CreatePostRequest\x1a\x1a.reddit.CreatePostResponse\x12=\n\x08VotePost\x12\x17.reddit.VotePostRequest\x1a\x18.reddit.VotePostResponse\x12:\n\x07GetPost\x12\x16.reddit.GetPostRequest\x1a\x17.reddit.GetPostResponse\x12L\n\rCreateComment\x12\x1c.reddit.CreateCommentRequest\x1a\x1d.reddit.CreateCommentResponse\x12\x46\n\x0bVoteComment\x12\x1a.reddit.VoteCommentRequest\x1a\x1b.reddit.VoteCommentResponse\x12j\n\x17GetTopCommentsUnderPost\x12&.reddit.GetTopCommentsUnderPostRequest\x1a\'.reddit.GetTopCommentsUnderPostResponse\x12^\n\x13\x45xpandCommentBranch\x12\".reddit.ExpandCommentBranchRequest\x1a#.reddit.ExpandCommentBranchResponse\x12L\n\rBatchGetPosts\x12\x1c.reddit.BatchGetPostsRequest\x1a\x1d.reddit.BatchGetPostsResponse\x12O\n\x0e\x42\x61tchVotePosts\x12\x1d.reddit.BatchVotePostsRequest\x1a\x1e.reddit.BatchVotePostsResponse\x12X\n\x11\x42\x61tchVoteComments\x12 .reddit.BatchVoteCommentsRequest\x1a!.reddit.BatchVoteCommentsResponse\x12^\n\x13\x42\x61tchCreateComments\x12\".reddit.BatchCreateCommentsRequest\x1a#.reddit.BatchCreateCommentsResponse\x12M\n\x13StreamSubredditFeed\x12\".reddit.StreamSubredditFeedRequest\x1a\x10.reddit.FeedItem0\x01\x12:\n\tWatchPost\x12\x18.reddit.WatchPostRequest\x1a\x11.reddit.PostEvent0\x01\x12L\n\rGetPostThread\x12\x1c.reddit.GetPostThreadRequest\x1a\x1d.reddit.GetPostThreadResponse\x12\x46\n\x0bSearchPosts\x12\x1a.reddit.SearchPostsRequest\x1a\x1b.reddit.SearchPostsResponse\x12O\n\x0eSearchComments\x12\x1d.reddit.SearchCommentsRequest\x1a\x1e.reddit.SearchCommentsResponseb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'reddit_pb2', _globals)
-if _descriptor._USE_C_DESCRIPTORS == False:
-  DESCRIPTOR._options = None
+if not _descriptor._USE_C_DESCRIPTORS:
+  DESCRIPTOR._loaded_options = None
+  _globals['_SORTORDER']._serialized_start=4277
+  _globals['_SORTORDER']._serialized_end=4344
   _globals['_CREATEPOSTREQUEST']._serialized_start=25
-  _globals['_CREATEPOSTREQUEST']._serialized_end=176
-  _globals['_CREATEPOSTRESPONSE']._serialized_start=178
-  _globals['_CREATEPOSTRESPONSE']._serialized_end=226
-  _globals['_VOTEPOSTREQUEST']._serialized_start=228
-  _globals['_VOTEPOSTREQUEST']._serialized_end=278
-  _globals['_VOTEPOSTRESPONSE']._serialized_start=280
-  _globals['_VOTEPOSTRESPONSE']._serialized_end=315
-  _globals['_GETPOSTREQUEST']._serialized_start=317
-  _globals['_GETPOSTREQUEST']._serialized_end=350
-  _globals['_GETPOSTRESPONSE']._serialized_start=352
-  _globals['_GETPOSTRESPONSE']._serialized_end=397
-  _globals['_CREATECOMMENTREQUEST']._serialized_start=399
-  _globals['_CREATECOMMENTREQUEST']._serialized_end=516
-  _globals['_CREATECOMMENTRESPONSE']._serialized_start=518
-  _globals['_CREATECOMMENTRESPONSE']._serialized_end=575
-  _globals['_VOTECOMMENTREQUEST']._serialized_start=577
-  _globals['_VOTECOMMENTREQUEST']._serialized_end=633
-  _globals['_VOTECOMMENTRESPONSE']._serialized_start=635
-  _globals['_VOTECOMMENTRESPONSE']._serialized_end=673
-  _globals['_GETTOPCOMMENTSUNDERPOSTREQUEST']._serialized_start=675
-  _globals['_GETTOPCOMMENTSUNDERPOSTREQUEST']._serialized_end=739
-  _globals['_GETTOPCOMMENTSUNDERPOSTRESPONSE']._serialized_start=741
-  _globals['_GETTOPCOMMENTSUNDERPOSTRESPONSE']._serialized_end=809
-  _globals['_EXPANDCOMMENTBRANCHREQUEST']._serialized_start=811
-  _globals['_EXPANDCOMMENTBRANCHREQUEST']._serialized_end=874
-  _globals['_EXPANDCOMMENTBRANCHRESPONSE']._serialized_start=876
-  _globals['_EXPANDCOMMENTBRANCHRESPONSE']._serialized_end=949
-  _globals['_USER']._serialized_start=951
-  _globals['_USER']._serialized_end=974
-  _globals['_POST']._serialized_start=977
-  _globals['_POST']._serialized_end=1253
-  _globals['_POST_STATE']._serialized_start=1201
-  _globals['_POST_STATE']._serialized_end=1244
-  _globals['_COMMENT']._serialized_start=1256
-  _globals['_COMMENT']._serialized_end=1516
-  _globals['_COMMENT_STATUS']._serialized_start=1474
-  _globals['_COMMENT_STATUS']._serialized_end=1506
-  _globals['_COMMENTNODE']._serialized_start=1518
-  _globals['_COMMENTNODE']._serialized_end=1600
-  _globals['_SUBREDDIT']._serialized_start=1603
-  _globals['_SUBREDDIT']._serialized_end=1783
-  _globals['_SUBREDDIT_VISIBILITY']._serialized_start=1734
-  _globals['_SUBREDDIT_VISIBILITY']._serialized_end=1783
-  _globals['_REDDITSERVICE']._serialized_start=1786
-  _globals['_REDDITSERVICE']._serialized_end=2347
+  _globals['_CREATEPOSTREQUEST']._serialized_end=201
+  _globals['_CREATEPOSTRESPONSE']._serialized_start=203
+  _globals['_CREATEPOSTRESPONSE']._serialized_end=251
+  _globals['_VOTEPOSTREQUEST']._serialized_start=253
+  _globals['_VOTEPOSTREQUEST']._serialized_end=303
+  _globals['_VOTEPOSTRESPONSE']._serialized_start=305
+  _globals['_VOTEPOSTRESPONSE']._serialized_end=340
+  _globals['_GETPOSTREQUEST']._serialized_start=342
+  _globals['_GETPOSTREQUEST']._serialized_end=375
+  _globals['_GETPOSTRESPONSE']._serialized_start=377
+  _globals['_GETPOSTRESPONSE']._serialized_end=422
+  _globals['_CREATECOMMENTREQUEST']._serialized_start=425
+  _globals['_CREATECOMMENTREQUEST']._serialized_end=567
+  _globals['_CREATECOMMENTRESPONSE']._serialized_start=569
+  _globals['_CREATECOMMENTRESPONSE']._serialized_end=626
+  _globals['_VOTECOMMENTREQUEST']._serialized_start=628
+  _globals['_VOTECOMMENTREQUEST']._serialized_end=684
+  _globals['_VOTECOMMENTRESPONSE']._serialized_start=686
+  _globals['_VOTECOMMENTRESPONSE']._serialized_end=724
+  _globals['_GETTOPCOMMENTSUNDERPOSTREQUEST']._serialized_start=726
+  _globals['_GETTOPCOMMENTSUNDERPOSTREQUEST']._serialized_end=823
+  _globals['_GETTOPCOMMENTSUNDERPOSTRESPONSE']._serialized_start=825
+  _globals['_GETTOPCOMMENTSUNDERPOSTRESPONSE']._serialized_end=893
+  _globals['_EXPANDCOMMENTBRANCHREQUEST']._serialized_start=895
+  _globals['_EXPANDCOMMENTBRANCHREQUEST']._serialized_end=977
+  _globals['_EXPANDCOMMENTBRANCHRESPONSE']._serialized_start=979
+  _globals['_EXPANDCOMMENTBRANCHRESPONSE']._serialized_end=1052
+  _globals['_BATCHITEMSTATUS']._serialized_start=1054
+  _globals['_BATCHITEMSTATUS']._serialized_end=1102
+  _globals['_BATCHGETPOSTSREQUEST']._serialized_start=1104
+  _globals['_BATCHGETPOSTSREQUEST']._serialized_end=1144
+  _globals['_GETPOSTRESULT']._serialized_start=1146
+  _globals['_GETPOSTRESULT']._serialized_end=1230
+  _globals['_BATCHGETPOSTSRESPONSE']._serialized_start=1232
+  _globals['_BATCHGETPOSTSRESPONSE']._serialized_end=1295
+  _globals['_BATCHVOTEPOSTSREQUEST']._serialized_start=1297
+  _globals['_BATCHVOTEPOSTSREQUEST']._serialized_end=1360
+  _globals['_BATCHVOTEPOSTSRESPONSE']._serialized_start=1362
+  _globals['_BATCHVOTEPOSTSRESPONSE']._serialized_end=1429
+  _globals['_BATCHVOTECOMMENTSREQUEST']._serialized_start=1431
+  _globals['_BATCHVOTECOMMENTSREQUEST']._serialized_end=1500
+  _globals['_BATCHVOTECOMMENTSRESPONSE']._serialized_start=1502
+  _globals['_BATCHVOTECOMMENTSRESPONSE']._serialized_end=1572
+  _globals['_BATCHCREATECOMMENTSREQUEST']._serialized_start=1574
+  _globals['_BATCHCREATECOMMENTSREQUEST']._serialized_end=1650
+  _globals['_CREATECOMMENTRESULT']._serialized_start=1652
+  _globals['_CREATECOMMENTRESULT']._serialized_end=1748
+  _globals['_BATCHCREATECOMMENTSRESPONSE']._serialized_start=1750
+  _globals['_BATCHCREATECOMMENTSRESPONSE']._serialized_end=1825
+  _globals['_STREAMSUBREDDITFEEDREQUEST']._serialized_start=1827
+  _globals['_STREAMSUBREDDITFEEDREQUEST']._serialized_end=1941
+  _globals['_FEEDITEM']._serialized_start=1943
+  _globals['_FEEDITEM']._serialized_end=1997
+  _globals['_WATCHPOSTREQUEST']._serialized_start=1999
+  _globals['_WATCHPOSTREQUEST']._serialized_end=2034
+  _globals['_POSTEVENT']._serialized_start=2037
+  _globals['_POSTEVENT']._serialized_end=2205
+  _globals['_FEEDCURSOR']._serialized_start=2207
+  _globals['_FEEDCURSOR']._serialized_end=2279
+  _globals['_USER']._serialized_start=2281
+  _globals['_USER']._serialized_end=2304
+  _globals['_POST']._serialized_start=2307
+  _globals['_POST']._serialized_end=2656
+  _globals['_POST_STATE']._serialized_start=2604
+  _globals['_POST_STATE']._serialized_end=2647
+  _globals['_COMMENT']._serialized_start=2659
+  _globals['_COMMENT']._serialized_end=2992
+  _globals['_COMMENT_STATUS']._serialized_start=2950
+  _globals['_COMMENT_STATUS']._serialized_end=2982
+  _globals['_GETPOSTTHREADREQUEST']._serialized_start=2994
+  _globals['_GETPOSTTHREADREQUEST']._serialized_end=3067
+  _globals['_GETPOSTTHREADRESPONSE']._serialized_start=3069
+  _globals['_GETPOSTTHREADRESPONSE']._serialized_end=3196
+  _globals['_SEARCHPOSTSREQUEST']._serialized_start=3198
+  _globals['_SEARCHPOSTSREQUEST']._serialized_end=3284
+  _globals['_SEARCHPOSTSRESPONSE']._serialized_start=3286
+  _globals['_SEARCHPOSTSRESPONSE']._serialized_end=3350
+  _globals['_POSTSEARCHRESULT']._serialized_start=3352
+  _globals['_POSTSEARCHRESULT']._serialized_end=3413
+  _globals['_SEARCHCOMMENTSREQUEST']._serialized_start=3415
+  _globals['_SEARCHCOMMENTSREQUEST']._serialized_end=3468
+  _globals['_SEARCHCOMMENTSRESPONSE']._serialized_start=3470
+  _globals['_SEARCHCOMMENTSRESPONSE']._serialized_end=3540
+  _globals['_COMMENTSEARCHRESULT']._serialized_start=3542
+  _globals['_COMMENTSEARCHRESULT']._serialized_end=3612
+  _globals['_COMMENTNODE']._serialized_start=3614
+  _globals['_COMMENTNODE']._serialized_end=3734
+  _globals['_SUBREDDIT']._serialized_start=3737
+  _globals['_SUBREDDIT']._serialized_end=3917
+  _globals['_SUBREDDIT_VISIBILITY']._serialized_start=3868
+  _globals['_SUBREDDIT_VISIBILITY']._serialized_end=3917
+  _globals['_STOREMUTATION']._serialized_start=3920
+  _globals['_STOREMUTATION']._serialized_end=4102
+  _globals['_SCOREUPDATE']._serialized_start=4104
+  _globals['_SCOREUPDATE']._serialized_end=4197
+  _globals['_STORECHUNK']._serialized_start=4199
+  _globals['_STORECHUNK']._serialized_end=4275
+  _globals['_REDDITSERVICE']._serialized_start=4347
+  _globals['_REDDITSERVICE']._serialized_end=5623
 # @@protoc_insertion_point(module_scope)
@@ -1,11 +1,31 @@
 # Generated by the gRPC Python protocol compiler plugin. DO NOT EDIT!
 """Client and server classes corresponding to protobuf-defined services."""
 import grpc
+import warnings
 
 import reddit_pb2 as reddit__pb2
 
+GRPC_GENERATED_VERSION = '1.84.0'
+GRPC_VERSION = grpc.__version__
+_version_not_supported = False
 
-class RedditServiceStub(object):
+try:
+    from grpc._utilities import first_version_is_lower
+    _version_not_supported = first_version_is_lower(GRPC_VERSION, GRPC_GENERATED_VERSION)
+except ImportError:
+    _version_not_supported = True
+
+if _version_not_supported:
+    raise RuntimeError(
+        f'The grpc package installed is at version {GRPC_VERSION},'
+        + ' but the generated code in reddit_pb2_grpc.py depends on'
+        + f' grpcio>={GRPC_GENERATED_VERSION}.'
+        + f' Please upgrade your grpc module to grpcio>={GRPC_GENERATED_VERSION}'
+        + f' or downgrade your generated code using grpcio-tools<={GRPC_VERSION}.'
+    )
+
+
+class RedditServiceStub:
     """Missing associated documentation comment in .proto file."""
 
     def __init__(self, channel):
@@ -18,40 +38,85 @@ class RedditServiceStub(object):
                 '/reddit.RedditService/CreatePost',
                 request_serializer=reddit__pb2.CreatePostRequest.SerializeToString,
                 response_deserializer=reddit__pb2.CreatePostResponse.FromString,
-                )
+                _registered_method=True)
         self.VotePost = channel.unary_unary(
                 '/reddit.RedditService/VotePost',
                 request_serializer=reddit__pb2.VotePostRequest.SerializeToString,
                 response_deserializer=reddit__pb2.VotePostResponse.FromString,
-                )
+                _registered_method=True)
         self.GetPost = channel.unary_unary(
                 '/reddit.RedditService/GetPost',
                 request_serializer=reddit__pb2.GetPostRequest.SerializeToString,
                 response_deserializer=reddit__pb2.GetPostResponse.FromString,
-                )
+                _registered_method=True)
         self.CreateComment = channel.unary_unary(
                 '/reddit.RedditService/CreateComment',
                 request_serializer=reddit__pb2.CreateCommentRequest.SerializeToString,
                 response_deserializer=reddit__pb2.CreateCommentResponse.FromString,
-                )
+                _registered_method=True)
         self.VoteComment = channel.unary_unary(
                 '/reddit.RedditService/VoteComment',
                 request_serializer=reddit__pb2.VoteCommentRequest.SerializeToString,
                 response_deserializer=reddit__pb2.VoteCommentResponse.FromString,
-                )
+                _registered_method=True)
         self.GetTopCommentsUnderPost = channel.unary_unary(
                 '/reddit.RedditService/GetTopCommentsUnderPost',
                 request_serializer=reddit__pb2.GetTopCommentsUnderPostRequest.SerializeToString,
                 response_deserializer=reddit__pb2.GetTopCommentsUnderPostResponse.FromString,
-                )
+                _registered_method=True)
         self.ExpandCommentBranch = channel.unary_unary(
                 '/reddit.RedditService/ExpandCommentBranch',
                 request_serializer=reddit__pb2.ExpandCommentBranchRequest.SerializeToString,
                 response_deserializer=reddit__pb2.ExpandCommentBranchResponse.FromString,
-                )
+                _registered_method=True)
+        self.BatchGetPosts = channel.unary_unary(
+                '/reddit.RedditService/BatchGetPosts',
+                request_serializer=reddit__pb2.BatchGetPostsRequest.SerializeToString,
+                response_deserializer=reddit__pb2.BatchGetPostsResponse.FromString,
+                _registered_method=True)
+        self.BatchVotePosts = channel.unary_unary(
+                '/reddit.RedditService/BatchVotePosts',
+                request_serializer=reddit__pb2.BatchVotePostsRequest.SerializeToString,
+                response_deserializer=reddit__pb2.BatchVotePostsResponse.FromString,
+                _registered_method=True)
+        self.BatchVoteComments = channel.unary_unary(
+                '/reddit.RedditService/BatchVoteComments',
+                request_serializer=reddit__pb2.BatchVoteCommentsRequest.SerializeToString,
+                response_deserializer=reddit__pb2.BatchVoteCommentsResponse.FromString,
+                _registered_method=True)
+        self.BatchCreateComments = channel.unary_unary(
+                '/reddit.RedditService/BatchCreateComments',
+                request_serializer=reddit__pb2.BatchCreateCommentsRequest.SerializeToString,
+                response_deserializer=reddit__pb2.BatchCreateCommentsResponse.FromString,
+                _registered_method=True)
+        self.StreamSubredditFeed = channel.unary_stream(
+                '/reddit.RedditService/StreamSubredditFeed',
+                request_serializer=reddit__pb2.StreamSubredditFeedRequest.SerializeToString,
+                response_deserializer=reddit__pb2.FeedItem.FromString,
+                _registered_method=True)
+        self.WatchPost = channel.unary_stream(
+                '/reddit.RedditService/WatchPost',
+                request_serializer=reddit__pb2.WatchPostRequest.SerializeToString,
+                response_deserializer=reddit__pb2.PostEvent.FromString,
+                _registered_method=True)
+        self.GetPostThread = channel.unary_unary(
+                '/reddit.RedditService/GetPostThread',
+                request_serializer=reddit__pb2.GetPostThreadRequest.SerializeToString,
+                response_deserializer=reddit__pb2.GetPostThreadResponse.FromString,
+                _registered_method=True)
+        self.SearchPosts = channel.unary_unary(
+                '/reddit.RedditService/SearchPosts',
+                request_serializer=reddit__pb2.SearchPostsRequest.SerializeToString,
+                response_deserializer=reddit__pb2.SearchPostsResponse.FromString,
+                _registered_method=True)
+        self.SearchComments = channel.unary_unary(
+                '/reddit.RedditService/SearchComments',
+                request_serializer=reddit__pb2.SearchCommentsRequest.SerializeToString,
+                response_deserializer=reddit__pb2.SearchCommentsResponse.FromString,
+                _registered_method=True)
 
 
-class RedditServiceServicer(object):
+class RedditServiceServicer:
     """Missing associated documentation comment in .proto file."""
 
     def CreatePost(self, request, context):
@@ -97,7 +162,70 @@ class RedditServiceServicer(object):
         raise NotImplementedError('Method not implemented!')
 
     def ExpandCommentBranch(self, request, context):
-        """RPC to expand a comment branch to a depth of 2
+        """RPC to expand a comment branch to a depth of 2, or to max_depth levels when set
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchGetPosts(self, request, context):
+        """Retrieve several Posts in one call
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchVotePosts(self, request, context):
+        """Upvote or downvote several Posts in one call
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchVoteComments(self, request, context):
+        """Upvote or downvote several Comments in one call
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchCreateComments(self, request, context):
+        """Create several Comments in one call
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def StreamSubredditFeed(self, request, context):
+        """Stream the posts of a subreddit in ranked order, resumable from any item's cursor
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def WatchPost(self, request, context):
+        """Stream the changes to a post and its comment thread as they happen
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetPostThread(self, request, context):
+        """Retrieve a post, its top comments and the expanded branch of its top comment in one call
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SearchPosts(self, request, context):
+        """Search posts by title, text and tags, best match first
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SearchComments(self, request, context):
+        """Search comments by text, best match first (only on servers that index comments)
         """
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
@@ -141,14 +269,60 @@ def add_RedditServiceServicer_to_server(servicer, server):
                     request_deserializer=reddit__pb2.ExpandCommentBranchRequest.FromString,
                     response_serializer=reddit__pb2.ExpandCommentBranchResponse.SerializeToString,
             ),
+            'BatchGetPosts': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchGetPosts,
+                    request_deserializer=reddit__pb2.BatchGetPostsRequest.FromString,
+                    response_serializer=reddit__pb2.BatchGetPostsResponse.SerializeToString,
+            ),
+            'BatchVotePosts': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchVotePosts,
+                    request_deserializer=reddit__pb2.BatchVotePostsRequest.FromString,
+                    response_serializer=reddit__pb2.BatchVotePostsResponse.SerializeToString,
+            ),
+            'BatchVoteComments': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchVoteComments,
+                    request_deserializer=reddit__pb2.BatchVoteCommentsRequest.FromString,
+                    response_serializer=reddit__pb2.BatchVoteCommentsResponse.SerializeToString,
+            ),
+            'BatchCreateComments': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchCreateComments,
+                    request_deserializer=reddit__pb2.BatchCreateCommentsRequest.FromString,
+                    response_serializer=reddit__pb2.BatchCreateCommentsResponse.SerializeToString,
+            ),
+            'StreamSubredditFeed': grpc.unary_stream_rpc_method_handler(
+                    servicer.StreamSubredditFeed,
+                    request_deserializer=reddit__pb2.StreamSubredditFeedRequest.FromString,
+                    response_serializer=reddit__pb2.FeedItem.SerializeToString,
+            ),
+            'WatchPost': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchPost,
+                    request_deserializer=reddit__pb2.WatchPostRequest.FromString,
+                    response_serializer=reddit__pb2.PostEvent.SerializeToString,
+            ),
+            'GetPostThread': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetPostThread,
+                    request_deserializer=reddit__pb2.GetPostThreadRequest.FromString,
+                    response_serializer=reddit__pb2.GetPostThreadResponse.SerializeToString,
+            ),
+            'SearchPosts': grpc.unary_unary_rpc_method_handler(
+                    servicer.SearchPosts,
+                    request_deserializer=reddit__pb2.SearchPostsRequest.FromString,
+                    response_serializer=reddit__pb2.SearchPostsResponse.SerializeToString,
+            ),
+            'SearchComments': grpc.unary_unary_rpc_method_handler(
+                    servicer.SearchComments,
+                    request_deserializer=reddit__pb2.SearchCommentsRequest.FromString,
+                    response_serializer=reddit__pb2.SearchCommentsResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'reddit.RedditService', rpc_method_handlers)
     server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers('reddit.RedditService', rpc_method_handlers)
 
 
  # This class is part of an EXPERIMENTAL API.
-class RedditService(object):
+class RedditService:
     """Missing associated documentation comment in .proto file."""
 
     @staticmethod
@@ -162,11 +336,21 @@ class RedditService(object):
             wait_for_ready=None,
             timeout=None,
             metadata=None):
-        return grpc.experimental.unary_unary(request, target, '/reddit.RedditService/CreatePost',
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/reddit.RedditService/CreatePost',
             reddit__pb2.CreatePostRequest.SerializeToString,
             reddit__pb2.CreatePostResponse.FromString,
-            options, channel_credentials,
-            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
 
     @staticmethod
     def VotePost(request,
@@ -179,11 +363,21 @@ class RedditService(object):
             wait_for_ready=None,
             timeout=None,
             metadata=None):
-        return grpc.experimental.unary_unary(request, target, '/reddit.RedditService/VotePost',
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/reddit.RedditService/VotePost',
             reddit__pb2.VotePostRequest.SerializeToString,
             reddit__pb2.VotePostResponse.FromString,
-            options, channel_credentials,
-            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
 
     @staticmethod
     def GetPost(request,
@@ -196,11 +390,21 @@ class RedditService(object):
             wait_for_ready=None,
             timeout=None,
             metadata=None):
-        return grpc.experimental.unary_unary(request, target, '/reddit.RedditService/GetPost',
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/reddit.RedditService/GetPost',
             reddit__pb2.GetPostRequest.SerializeToString,
             reddit__pb2.GetPostResponse.FromString,
-            options, channel_credentials,
-            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
 
     @staticmethod
     def CreateComment(request,
@@ -213,11 +417,21 @@ class RedditService(object):
             wait_for_ready=None,
             timeout=None,
             metadata=None):
-        return grpc.experimental.unary_unary(request, target, '/reddit.RedditService/CreateComment',
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/reddit.RedditService/CreateComment',
             reddit__pb2.CreateCommentRequest.SerializeToString,
             reddit__pb2.CreateCommentResponse.FromString,
-            options, channel_credentials,
-            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
 
     @staticmethod
     def VoteComment(request,
@@ -230,11 +444,21 @@ class RedditService(object):
             wait_for_ready=None,
             timeout=None,
             metadata=None):
-        return grpc.experimental.unary_unary(request, target, '/reddit.RedditService/VoteComment',
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/reddit.RedditService/VoteComment',
             reddit__pb2.VoteCommentRequest.SerializeToString,
             reddit__pb2.VoteCommentResponse.FromString,
-            options, channel_credentials,
-            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
 
     @staticmethod
     def GetTopCommentsUnderPost(request,
@@ -247,11 +471,21 @@ class RedditService(object):
             wait_for_ready=None,
             timeout=None,
             metadata=None):
-        return grpc.experimental.unary_unary(request, target, '/reddit.RedditService/GetTopCommentsUnderPost',
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/reddit.RedditService/GetTopCommentsUnderPost',
             reddit__pb2.GetTopCommentsUnderPostRequest.SerializeToString,
             reddit__pb2.GetTopCommentsUnderPostResponse.FromString,
-            options, channel_credentials,
-            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
 
     @staticmethod
     def ExpandCommentBranch(request,
@@ -264,8 +498,261 @@ class RedditService(object):
             wait_for_ready=None,
             timeout=None,
             metadata=None):
-        return grpc.experimental.unary_unary(request, target, '/reddit.RedditService/ExpandCommentBranch',
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/reddit.RedditService/ExpandCommentBranch',
             reddit__pb2.ExpandCommentBranchRequest.SerializeToString,
             reddit__pb2.ExpandCommentBranchResponse.FromString,
-            options, channel_credentials,
-            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchGetPosts(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/reddit.RedditService/BatchGetPosts',
+            reddit__pb2.BatchGetPostsRequest.SerializeToString,
+            reddit__pb2.BatchGetPostsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchVotePosts(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/reddit.RedditService/BatchVotePosts',
+            reddit__pb2.BatchVotePostsRequest.SerializeToString,
+            reddit__pb2.BatchVotePostsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchVoteComments(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/reddit.RedditService/BatchVoteComments',
+            reddit__pb2.BatchVoteCommentsRequest.SerializeToString,
+            reddit__pb2.BatchVoteCommentsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchCreateComments(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/reddit.RedditService/BatchCreateComments',
+            reddit__pb2.BatchCreateCommentsRequest.SerializeToString,
+            reddit__pb2.BatchCreateCommentsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def StreamSubredditFeed(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/reddit.RedditService/StreamSubredditFeed',
+            reddit__pb2.StreamSubredditFeedRequest.SerializeToString,
+            reddit__pb2.FeedItem.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def WatchPost(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/reddit.RedditService/WatchPost',
+            reddit__pb2.WatchPostRequest.SerializeToString,
+            reddit__pb2.PostEvent.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetPostThread(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/reddit.RedditService/GetPostThread',
+            reddit__pb2.GetPostThreadRequest.SerializeToString,
+            reddit__pb2.GetPostThreadResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SearchPosts(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/reddit.RedditService/SearchPosts',
+            reddit__pb2.SearchPostsRequest.SerializeToString,
+            reddit__pb2.SearchPostsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SearchComments(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/reddit.RedditService/SearchComments',
+            reddit__pb2.SearchCommentsRequest.SerializeToString,
+            reddit__pb2.SearchCommentsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
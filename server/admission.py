@@ -0,0 +1,141 @@
+import inspect
+import threading
+import time
+from collections import OrderedDict
+
+import grpc
+
+from server.metrics import Rejected, method_name, observed_async_handler, observed_handler
+
+# Trailing metadata telling the client how long to back off; gRPC's own retry policy honors it
+RETRY_PUSHBACK_KEY = "grpc-retry-pushback-ms"
+
+
+class TokenBucket:
+    """Allows `rate` calls per second on average, and bursts of up to `burst` calls."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    def take(self, now):
+        """Takes a token and returns 0, or returns the seconds until one is available. Callers serialize calls."""
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.rate
+
+
+class Admission:
+    """
+    Decides whether to start a call: every client (by the key_header metadata value, or by
+    its address when the header is missing) has a token bucket, and every method in
+    method_limits may only run that many calls at once.
+
+    admit() returns None when the call may start, and must then be paired with release(),
+    or else (seconds to wait, reason) for a call that should be rejected.
+    """
+
+    def __init__(self, rate=None, burst=None, key_header="x-client-id", method_limits=None, max_clients=10000):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.key_header = key_header
+        self.max_clients = max_clients
+        self.method_limits = dict(method_limits or {})
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # Client key -> TokenBucket, least recently seen first
+        self._running = dict.fromkeys(self.method_limits, 0)
+        self.rejected = 0
+
+    def client_key(self, context):
+        for key, value in context.invocation_metadata():
+            if key == self.key_header:
+                return value
+        # "ipv4:127.0.0.1:54321" -> "ipv4:127.0.0.1", so a client's connections share one bucket
+        return context.peer().rsplit(":", 1)[0]
+
+    def admit(self, method, context):
+        limit = self.method_limits.get(method)
+        key = self.client_key(context) if self.rate is not None else None
+        with self._lock:
+            if limit is not None and self._running[method] >= limit:
+                self.rejected += 1
+                # No way to know when a slot frees up; a short pause spreads the retries out
+                return 0.05, f"too many concurrent {method} calls"
+            if key is not None:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+                    if len(self._buckets) > self.max_clients:
+                        self._buckets.popitem(last=False)
+                else:
+                    self._buckets.move_to_end(key)
+                wait = bucket.take(time.monotonic())
+                if wait:
+                    self.rejected += 1
+                    return wait, "rate limit exceeded"
+            if limit is not None:
+                self._running[method] += 1
+        return None
+
+    def release(self, method):
+        if method in self._running:
+            with self._lock:
+                self._running[method] -= 1
+
+
+def _admitter(admission, method):
+    def observe(request, context):
+        rejection = admission.admit(method, context)
+        if rejection is not None:
+            wait, reason = rejection
+            context.set_trailing_metadata(((RETRY_PUSHBACK_KEY, str(max(1, round(wait * 1000)))),))
+            raise Rejected(grpc.StatusCode.RESOURCE_EXHAUSTED, f"{reason}, retry after {wait:.3f}s")
+        return lambda code: admission.release(method)
+    return observe
+
+
+class AdmissionInterceptor(grpc.ServerInterceptor):
+    """
+    Rejects calls that Admission turns down with RESOURCE_EXHAUSTED and a
+    grpc-retry-pushback-ms trailer, before they reach the servicer.
+    """
+
+    def __init__(self, admission):
+        self.admission = admission
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None or not (handler.unary_unary or handler.unary_stream):
+            return handler
+        return observed_handler(handler, _admitter(self.admission, method_name(handler_call_details)))
+
+
+class AsyncAdmissionInterceptor(grpc.aio.ServerInterceptor):
+    """AdmissionInterceptor for grpc.aio servers, whose handlers are coroutines and async generators."""
+
+    def __init__(self, admission):
+        self.admission = admission
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None or not (handler.unary_unary or handler.unary_stream):
+            return handler
+        if not (inspect.iscoroutinefunction(handler.unary_unary) or inspect.isasyncgenfunction(handler.unary_stream)):
+            return handler
+        return observed_async_handler(handler, _admitter(self.admission, method_name(handler_call_details)))
+
+
+def parse_method_limits(value):
+    """Parses "Method=limit,Method=limit" into a dict, for argparse."""
+    limits = {}
+    for item in filter(None, value.split(",")):
+        method, _, limit = item.partition("=")
+        if not limit.isdigit() or int(limit) < 1:
+            raise ValueError(f"invalid method limit {item!r}")
+        limits[method.strip()] = int(limit)
+    return limits
@@ -0,0 +1,100 @@
+import asyncio
+import signal
+
+import grpc
+from grpc_health.v1 import health, health_pb2, health_pb2_grpc
+
+import reddit_pb2
+import reddit_pb2_grpc
+from server.admission import AsyncAdmissionInterceptor
+from server.handlers import SERVER_OPTIONS, add_servicer_to_server
+from server.metrics import AsyncMetricsInterceptor
+
+SERVICE = reddit_pb2.DESCRIPTOR.services_by_name['RedditService']
+
+
+class AsyncRedditService(reddit_pb2_grpc.RedditServiceServicer):
+    """
+    Hosts the handlers of a RedditService on a grpc.aio server.
+
+    In-memory handlers never block, so by default they run directly on the event loop. With
+    offload=True (stores that wait on disk) each call runs in the default thread pool instead.
+    """
+
+    def __init__(self, service, offload=False):
+        self.service = service
+        self.offload = offload
+
+    async def WatchPost(self, request, context):
+        # A watcher waits on its subscription with async for, so idle watchers cost no thread
+        if self.offload:
+            subscription = await asyncio.to_thread(self.service.watch_post, request, context)
+        else:
+            subscription = self.service.watch_post(request, context)
+        if subscription is None:
+            return
+        try:
+            async for event in subscription:
+                yield event
+        finally:
+            subscription.close()
+        self.service.end_watch(subscription, context)
+
+
+def _async_handler(name):
+    async def handler(self, request, context):
+        method = getattr(self.service, name)
+        if self.offload:
+            return await asyncio.to_thread(method, request, context)
+        return method(request, context)
+    handler.__name__ = name
+    return handler
+
+
+def _async_stream_handler(name):
+    async def handler(self, request, context):
+        items = getattr(self.service, name)(request, context)
+        if not self.offload:
+            for item in items:
+                yield item
+            return
+        # Produce each item in the thread pool, since producing it may read from disk
+        done = object()
+        while (item := await asyncio.to_thread(next, items, done)) is not done:
+            yield item
+    handler.__name__ = name
+    return handler
+
+
+for _method in SERVICE.methods:
+    if _method.name in vars(AsyncRedditService):
+        continue
+    _factory = _async_stream_handler if _method.server_streaming else _async_handler
+    setattr(AsyncRedditService, _method.name, _factory(_method.name))
+
+
+async def serve_async(port, service, warm_up=None, offload=False, metrics=None, admission=None, max_concurrent_rpcs=None,
+                      grace=5):
+    # SIGTERM stops the server from within the event loop, giving calls in flight grace seconds to finish
+    terminated = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, terminated.set)
+    interceptors = [AsyncMetricsInterceptor(metrics)] if metrics is not None else []
+    if admission is not None:
+        interceptors.append(AsyncAdmissionInterceptor(admission))
+    server = grpc.aio.server(options=SERVER_OPTIONS, interceptors=interceptors, maximum_concurrent_rpcs=max_concurrent_rpcs)
+    add_servicer_to_server(AsyncRedditService(service, offload), server)
+
+    # Report readiness through the standard gRPC health service
+    health_servicer = health.aio.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
+
+    server.add_insecure_port(f"[::]:{port}")
+    # Warm the store before the port opens, so no call ever sees it half loaded
+    if warm_up is not None:
+        await asyncio.to_thread(warm_up, service.store)
+    await server.start()
+    print(f"Server started in async mode, listening on {port}")
+    for name in ("", SERVICE.full_name):
+        await health_servicer.set(name, health_pb2.HealthCheckResponse.SERVING)
+    await terminated.wait()
+    await server.stop(grace)
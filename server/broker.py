@@ -0,0 +1,127 @@
+import asyncio
+import threading
+from collections import deque
+
+
+class Subscription:
+    """
+    A subscriber's bounded queue of events, consumed by iterating over it (or with async for
+    on an event loop). Iteration ends once the subscription is closed or dropped.
+
+    If order is given, order(event) returns a (key, version) pair, or None for events that
+    aren't ordered, and an event whose version isn't above the last one queued for its key
+    is dropped, so publishers racing each other can't put a key's events out of order.
+    """
+
+    def __init__(self, broker, topic, max_queue, order=None):
+        self.topic = topic
+        self.max_queue = max_queue
+        self.dropped = False  # Set when the subscriber fell max_queue events behind
+        self._broker = broker
+        self._order = order
+        self._versions = {}  # Key -> version of the last ordered event queued
+        self._events = deque()
+        self._ended = False
+        self._condition = threading.Condition()
+        self._async_waiter = None  # (loop, asyncio.Event) of an async consumer waiting for events
+
+    def offer(self, event):
+        """Queues an event, or drops the subscription if max_queue events are already waiting."""
+        with self._condition:
+            if self._ended:
+                return
+            if self._order is not None:
+                ordered = self._order(event)
+                if ordered is not None:
+                    key, version = ordered
+                    if self._versions.get(key, -1) >= version:
+                        return  # Superseded by an event already queued
+                    self._versions[key] = version
+            if len(self._events) >= self.max_queue:
+                # A slow consumer must never hold up publishers, so it loses its stream instead
+                self.dropped = self._ended = True
+                self._events.clear()
+            else:
+                self._events.append(event)
+            self._condition.notify_all()
+            waiter = self._async_waiter
+        if waiter is not None:
+            waiter[0].call_soon_threadsafe(waiter[1].set)
+        if self.dropped:
+            self._broker._remove(self)
+
+    def close(self):
+        with self._condition:
+            self._ended = True
+            self._condition.notify_all()
+            waiter = self._async_waiter
+        if waiter is not None:
+            waiter[0].call_soon_threadsafe(waiter[1].set)
+        self._broker._remove(self)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self._condition:
+            self._condition.wait_for(lambda: self._events or self._ended)
+            if self._events:
+                return self._events.popleft()
+            raise StopIteration
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        ready = asyncio.Event()
+        while True:
+            with self._condition:
+                if self._events:
+                    self._async_waiter = None
+                    return self._events.popleft()
+                if self._ended:
+                    raise StopAsyncIteration
+                ready.clear()
+                self._async_waiter = (asyncio.get_running_loop(), ready)
+            await ready.wait()
+
+
+class Broker:
+    """
+    In-process fan-out of events to the subscribers of a topic.
+
+    publish() never blocks: each subscriber has its own queue of at most max_queue events,
+    and a subscriber that falls that far behind is dropped rather than slowing everyone down.
+    """
+
+    def __init__(self, max_queue=256):
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._topics = {}  # topic -> set of Subscriptions
+
+    def __len__(self):
+        # Number of topics with at least one subscriber, so a broker nobody listens to is falsy
+        return len(self._topics)
+
+    def subscribe(self, topic, order=None):
+        subscription = Subscription(self, topic, self.max_queue, order)
+        with self._lock:
+            self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def has_subscribers(self, topic):
+        return topic in self._topics
+
+    def publish(self, topic, event):
+        with self._lock:
+            subscribers = list(self._topics.get(topic, ()))
+        for subscription in subscribers:
+            subscription.offer(event)
+
+    def _remove(self, subscription):
+        with self._lock:
+            subscribers = self._topics.get(subscription.topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[subscription.topic]
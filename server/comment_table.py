@@ -0,0 +1,201 @@
+import functools
+import threading
+import time
+from array import array
+
+import reddit_pb2
+from server.ranking import DATE_FORMAT, created_seconds, vote_counts
+
+# Bits of CommentTable._flags
+PARENT_IS_POST = 1
+HAS_REPLIES = 2
+NO_PARENT = 4
+NO_CREATED_AT = 8  # The comment came without created_at; the column holds its parsed publication_date
+
+
+def pack_id(entity_id):
+    """Returns a canonical (lowercase, hyphenated) UUID string as its 128-bit integer, and any other ID unchanged."""
+    if len(entity_id) == 36 and entity_id[8] == entity_id[13] == entity_id[18] == entity_id[23] == "-":
+        digits = entity_id.replace("-", "")
+        # isalnum() keeps out the signs, underscores and spaces int() would accept
+        if len(digits) == 32 and digits.isalnum() and digits == digits.lower():
+            try:
+                return int(digits, 16)
+            except ValueError:
+                pass
+    return entity_id
+
+
+@functools.lru_cache(maxsize=65536)  # Hot threads are materialized over and over
+def unpack_id(packed):
+    if not isinstance(packed, int):
+        return packed
+    digits = packed.to_bytes(16, "big").hex()
+    return f"{digits[:8]}-{digits[8:12]}-{digits[12:16]}-{digits[16:20]}-{digits[20:]}"
+
+
+@functools.lru_cache(maxsize=4096)
+def format_date(seconds):
+    return time.strftime(DATE_FORMAT, time.localtime(seconds))
+
+
+@functools.lru_cache(maxsize=4096)
+def encode_date(publication_date):
+    """Returns the date as epoch seconds, and whether formatting those gives the same string back."""
+    seconds = int(created_seconds(publication_date))
+    return seconds, format_date(seconds) == publication_date
+
+
+class CommentTable:
+    """
+    Column-oriented storage for comments, one row per comment.
+
+    Instead of one Comment message per comment, the fields live in parallel columns: IDs as
+    128-bit integers, authors interned, creation times as epoch seconds and score, vote
+    counts, status and flags in typed arrays. Siblings share their parent's ID object.
+    Comment messages are only built on the way out (materialize), so callers get copies and
+    every update goes through the table.
+    """
+
+    def __init__(self):
+        self._append_lock = threading.Lock()  # Rows are appended to every column together
+        self._rows = {}  # packed comment ID -> row
+        self._ids = []
+        self._parents = []  # Parent post ID (interned) or packed parent comment ID
+        self._texts = []
+        self._authors = []
+        self._author_names = {}  # Interning table for authors
+        self._post_ids = {}  # Interning table for parent post IDs, which posts' comments share
+        self._scores = array("i")
+        self._upvotes = array("I")
+        self._downvotes = array("I")
+        self._versions = array("I")
+        self._statuses = array("B")
+        self._flags = array("B")
+        self._created = array("q")
+        self._raw_dates = {}  # row -> publication_date that doesn't round-trip through epoch seconds
+        self._size = 0  # Rows that are complete in every column
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, comment_id):
+        return pack_id(comment_id) in self._rows
+
+    def row(self, comment_id):
+        return self._rows.get(pack_id(comment_id))
+
+    def packed_row(self, packed):
+        return self._rows.get(packed)
+
+    def parent_key(self, comment):
+        """Returns the parent ID object the table files a new comment under, shared with its siblings."""
+        if comment.HasField("parent_post_id"):
+            return self._post_ids.setdefault(comment.parent_post_id, comment.parent_post_id)
+        parent = pack_id(comment.parent_comment_id)
+        parent_row = self._rows.get(parent)
+        return parent if parent_row is None else self._ids[parent_row]
+
+    def add(self, comment, parent):
+        """Appends a comment filed under `parent` (from parent_key) and returns its row."""
+        comment_id = pack_id(comment.comment_id)
+        kind = comment.WhichOneof("parent")
+        flags = (PARENT_IS_POST if kind == "parent_post_id" else NO_PARENT if kind is None else 0) | \
+            (HAS_REPLIES if comment.has_replies else 0) | (0 if comment.created_at else NO_CREATED_AT)
+        publication_date = comment.publication_date
+        if comment.created_at:
+            seconds = comment.created_at
+            exact_date = format_date(seconds) == publication_date
+        else:
+            seconds, exact_date = encode_date(publication_date)
+        with self._append_lock:
+            row = len(self._ids)
+            self._ids.append(comment_id)
+            self._parents.append(parent)
+            self._texts.append(comment.text)
+            self._authors.append(self._author_names.setdefault(comment.author, comment.author))
+            self._scores.append(comment.score)
+            self._upvotes.append(comment.upvotes)
+            self._downvotes.append(comment.downvotes)
+            self._versions.append(comment.version)
+            self._statuses.append(comment.status)
+            self._flags.append(flags)
+            self._created.append(seconds)
+            if not exact_date:
+                self._raw_dates[row] = publication_date
+            self._rows[comment_id] = row
+            self._size = row + 1
+        return row
+
+    def materialize(self, row):
+        flags = self._flags[row]
+        comment = reddit_pb2.Comment(
+            comment_id=unpack_id(self._ids[row]),
+            text=self._texts[row],
+            author=self._authors[row],
+            score=self._scores[row],
+            upvotes=self._upvotes[row],
+            downvotes=self._downvotes[row],
+            status=self._statuses[row],
+            publication_date=self._raw_dates.get(row) or format_date(self._created[row]),
+            created_at=0 if flags & NO_CREATED_AT else self._created[row],
+            has_replies=bool(flags & HAS_REPLIES),
+            version=self._versions[row],
+        )
+        if flags & PARENT_IS_POST:
+            comment.parent_post_id = self._parents[row]
+        elif not flags & NO_PARENT:
+            comment.parent_comment_id = unpack_id(self._parents[row])
+        return comment
+
+    def get(self, comment_id):
+        row = self.row(comment_id)
+        return None if row is None else self.materialize(row)
+
+    def values(self):
+        for row in range(self._size):
+            yield self.materialize(row)
+
+    def comment_id(self, row):
+        return unpack_id(self._ids[row])
+
+    def parent(self, row):
+        return self._parents[row]
+
+    def parent_is_post(self, row):
+        return bool(self._flags[row] & PARENT_IS_POST)
+
+    def score(self, row):
+        return self._scores[row]
+
+    def created(self, row):
+        return self._created[row]
+
+    def votes(self, row):
+        return self._upvotes[row], self._downvotes[row]
+
+    def version(self, row):
+        return self._versions[row]
+
+    def changing_fields(self, row):
+        """Returns the row's score, upvotes, downvotes, has_replies and version: the fields that change after a comment is added."""
+        return (self._scores[row], self._upvotes[row], self._downvotes[row], bool(self._flags[row] & HAS_REPLIES),
+                self._versions[row])
+
+    def vote_counts(self, row):
+        """Returns the row's (upvotes, downvotes), reconciled with its score; see ranking.vote_counts."""
+        return vote_counts(self._scores[row], self._upvotes[row], self._downvotes[row])
+
+    def vote(self, row, upvotes, downvotes):
+        """Adds votes to a row and returns its new score. Callers serialize updates to a row (by its parent's lock stripe)."""
+        self._upvotes[row] += upvotes
+        self._downvotes[row] += downvotes
+        self._scores[row] += upvotes - downvotes
+        self._versions[row] += upvotes + downvotes
+        return self._scores[row]
+
+    def set_has_replies(self, row):
+        """Flags a row as having replies. Callers serialize it with the row's votes, as for vote."""
+        if not self._flags[row] & HAS_REPLIES:
+            self._flags[row] |= HAS_REPLIES
+            self._versions[row] += 1
@@ -0,0 +1,33 @@
+import grpc
+
+import reddit_pb2
+
+SERVICE = reddit_pb2.DESCRIPTOR.services_by_name['RedditService']
+
+# Let clients keep idle connections alive with pings, as long as they ping every 10s or less often
+SERVER_OPTIONS = [
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.min_ping_interval_without_data_ms", 10000),
+]
+
+
+def serialize_response(response):
+    # Handlers may return an already-serialized response, e.g. one served from the response cache
+    return response if isinstance(response, bytes) else response.SerializeToString()
+
+
+def add_servicer_to_server(servicer, server):
+    """
+    Registers a RedditService servicer like reddit_pb2_grpc.add_RedditServiceServicer_to_server,
+    except that its handlers may return serialized response bytes instead of messages.
+    """
+    rpc_method_handlers = {}
+    for method in SERVICE.methods:
+        handler = grpc.unary_stream_rpc_method_handler if method.server_streaming else grpc.unary_unary_rpc_method_handler
+        rpc_method_handlers[method.name] = handler(
+            getattr(servicer, method.name),
+            request_deserializer=getattr(reddit_pb2, method.input_type.name).FromString,
+            response_serializer=serialize_response,
+        )
+    server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler(SERVICE.full_name, rpc_method_handlers),))
+    server.add_registered_method_handlers(SERVICE.full_name, rpc_method_handlers)
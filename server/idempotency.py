@@ -0,0 +1,50 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class IdempotencyKeys:
+    """
+    Remembers the entity created by each call that carried an idempotency key, so that a
+    retry of the call returns that entity instead of creating another one.
+
+    claim(key) returns the entity already created under key, or None, in which case the
+    caller creates it and must then call finish(key, entity), with None if nothing was
+    created. A claim of a key whose creation is still running waits for it to finish. Keys
+    are remembered for ttl seconds, and at most max_entries of them, oldest dropped first.
+    """
+
+    def __init__(self, max_entries=100000, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._created = OrderedDict()  # key -> (expiry, entity), oldest first
+        self._running = {}  # key -> Event set when its creation finishes
+        self.replays = 0
+
+    def __len__(self):
+        return len(self._created)
+
+    def claim(self, key):
+        while True:
+            with self._lock:
+                entry = self._created.get(key)
+                if entry is not None:
+                    if entry[0] > time.monotonic():
+                        self.replays += 1
+                        return entry[1]
+                    del self._created[key]  # Expired
+                running = self._running.get(key)
+                if running is None:
+                    self._running[key] = threading.Event()
+                    return None
+            running.wait()  # Then take the created entity, or the key if the creation failed
+
+    def finish(self, key, entity):
+        with self._lock:
+            running = self._running.pop(key)
+            if entity is not None:
+                self._created[key] = (time.monotonic() + self.ttl, entity)
+                while len(self._created) > self.max_entries:
+                    self._created.popitem(last=False)
+        running.set()
@@ -0,0 +1,93 @@
+"""
+Multi-process launcher: forks one server worker per shard, all bound to the same public
+port with SO_REUSEPORT so the kernel spreads incoming connections across them.
+
+Every worker owns the posts and comments whose IDs hash to its shard and forwards other
+requests to the owner over a private per-worker port (see server/sharding.py).
+
+    python -m server.launcher --processes 4 --port 50051
+"""
+import copy
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+
+from server import reddit_server
+from server.sharding import ShardIds, ShardRouter
+
+def parse_arguments():
+    parser = reddit_server.build_parser()
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='Worker processes (default: one per CPU)')
+    parser.add_argument('--internal_port_base', type=int,
+                        help='First of the consecutive per-worker ports used for forwarding (default: port + 1)')
+    parser.add_argument('--max_forwards', type=int,
+                        help='Calls a worker may forward to other workers at once; past that they fail with '
+                             'RESOURCE_EXHAUSTED (default: the --max_workers threads not left to watchers, less one)')
+    args = parser.parse_args()
+    reddit_server.validate_arguments(parser, args)
+    if args.mode != 'thread':
+        parser.error('the launcher only runs thread-pool workers')
+    if args.warm_from:
+        parser.error('--warm_from is not supported by the sharded launcher')
+    if args.rate_limit is not None:
+        # Forwarded calls would reach the owning worker from its peer's address, all in one bucket
+        parser.error('--rate_limit is not supported by the sharded launcher')
+    if args.internal_port_base is None:
+        args.internal_port_base = args.port + 1
+    # Watchers and forwarded calls both wait on others; keeping a thread free of either means every
+    # worker can always serve the calls its peers forward to it, so two workers never wait on each other
+    watchers = reddit_server.watcher_limit(args)
+    if args.max_forwards is None:
+        args.max_forwards = args.max_workers - watchers - 1
+    if args.max_forwards < 1 or watchers + args.max_forwards >= args.max_workers:
+        parser.error('--max_watchers and --max_forwards must leave a --max_workers thread to forwarded calls')
+    return args
+
+# Shared-nothing: every worker gets its own database file / log directory
+def worker_arguments(args, shard):
+    worker_args = copy.copy(args)
+    worker_args.db_path = f"{args.db_path}.shard{shard}"
+    if args.wal_dir:
+        worker_args.wal_dir = os.path.join(args.wal_dir, f"shard{shard}")
+    if args.metrics_port is not None:
+        worker_args.metrics_port = args.metrics_port + shard
+    if args.profile_dir:
+        worker_args.profile_dir = os.path.join(args.profile_dir, f"shard{shard}")
+    worker_args.slow_request_log = f"{args.slow_request_log}.shard{shard}"
+    return worker_args
+
+def run_worker(args, shard):
+    logging.basicConfig()
+    peers = [f"localhost:{args.internal_port_base + owner}" for owner in range(args.processes)]
+    worker_args = worker_arguments(args, shard)
+    service = reddit_server.build_service(worker_args, new_id=ShardIds(args.processes))
+    sampler = reddit_server.build_sampler(worker_args)
+    reddit_server.serve(args.port, args.max_workers, service.store,
+                        servicer=ShardRouter(service, shard, peers, args.max_forwards),
+                        options=[("grpc.so_reuseport", 1)], internal_port=args.internal_port_base + shard,
+                        metrics=reddit_server.build_metrics(worker_args, service),
+                        slow_requests=reddit_server.build_slow_requests(worker_args, sampler),
+                        admission=reddit_server.build_admission(worker_args), max_concurrent_rpcs=args.max_concurrent_rpcs)
+
+def main():
+    args = parse_arguments()
+    # Spawned so that no worker inherits gRPC state from the launcher
+    spawn = multiprocessing.get_context("spawn")
+    workers = [spawn.Process(target=run_worker, args=(args, shard)) for shard in range(args.processes)]
+    for worker in workers:
+        worker.start()
+    # Take the workers down with the launcher, whether it is interrupted or terminated
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+import multiprocessing
+import os
+import sqlite3
+import time
+from concurrent import futures
+
+import reddit_pb2
+from server.sqlite_store import (BACKFILLS, COMMENT_COLUMNS, MIGRATIONS, POST_COLUMNS, add_functions, comment_from_row,
+                                 post_from_row, subreddit_from_row)
+
+
+def _connect_read_only(path):
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    add_functions(connection)
+    return connection
+
+
+def _select_list(connection, table, columns):
+    """
+    Returns the SELECT list of the columns from a table, computing those that the migrations
+    haven't added to the database yet as the migrations would fill them in, so that a database
+    from before them loads without being written to.
+    """
+    existing = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+    expressions = []
+    for column in columns.split(", "):
+        if column in existing:
+            expressions.append(column)
+        elif (table, column) in BACKFILLS:
+            expressions.append(BACKFILLS[table, column].split(" = ", 1)[1])  # "UPDATE ... SET column = expression"
+        else:
+            expressions.append("0" if "DEFAULT 0" in MIGRATIONS[table][column] else "NULL")
+    return ", ".join(expressions)
+
+
+def _rowid_ranges(connection, table, chunk_rows):
+    low, high = connection.execute(f"SELECT min(rowid), max(rowid) FROM {table}").fetchone()
+    if low is None:
+        return []
+    return [(start, min(start + chunk_rows, high + 1)) for start in range(low, high + 1, chunk_rows)]
+
+
+def _build_chunk(path, table, columns, start, end, fetch_size):
+    """Runs in a worker process: turns one rowid range of a table into a serialized StoreChunk."""
+    connection = _connect_read_only(path)
+    convert, field = (post_from_row, "posts") if table == "posts" else (comment_from_row, "comments")
+    cursor = connection.execute(f"SELECT {columns} FROM {table} WHERE rowid >= ? AND rowid < ? ORDER BY rowid",
+                                (start, end))
+    chunk = reddit_pb2.StoreChunk()
+    entities = getattr(chunk, field)
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        entities.extend(convert(row) for row in rows)
+    connection.close()
+    # One serialized message per chunk is parsed in C by the parent, far cheaper than pickling messages
+    return chunk.SerializeToString()
+
+
+def load_from_sqlite(store, path, workers=None, chunk_rows=50000, fetch_size=5000):
+    """
+    Warms an InMemoryStore from a reddit.db file and returns the number of seconds it took. The
+    file is only read, and may predate the schema migrations.
+
+    Rows are read in rowid ranges by a pool of worker processes, each streaming its range with
+    fetchmany() and building the protobufs. The main process parses each finished chunk in a
+    single call and bulk-loads it in rowid (creation) order, which rebuilds the subreddit post
+    lists and the parent->children indexes without per-comment inserts.
+    """
+    start_time = time.perf_counter()
+    connection = _connect_read_only(path)
+    columns = {"posts": _select_list(connection, "posts", POST_COLUMNS),
+               "comments": _select_list(connection, "comments", COMMENT_COLUMNS)}
+    # Subreddit metadata is small; their post lists are rebuilt from the posts themselves
+    subreddits = [subreddit_from_row(row) for row in connection.execute("SELECT * FROM subreddits")]
+    for subreddit in subreddits:
+        del subreddit.post_ids[:]
+    ranges = [("posts", start, end) for start, end in _rowid_ranges(connection, "posts", chunk_rows)]
+    ranges += [("comments", start, end) for start, end in _rowid_ranges(connection, "comments", chunk_rows)]
+    connection.close()
+
+    store.load(subreddits=subreddits)
+    # Spawned rather than forked workers, since the gRPC server's threads may already be running
+    spawn = multiprocessing.get_context("spawn")
+    with futures.ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=spawn) as executor:
+        pending = [executor.submit(_build_chunk, path, table, columns[table], start, end, fetch_size) for table, start, end in ranges]
+        # Chunks are consumed in submission order, so posts precede comments and rowid order is kept
+        for future in pending:
+            chunk = reddit_pb2.StoreChunk.FromString(future.result())
+            store.load(chunk.posts, chunk.comments)
+    return time.perf_counter() - start_time
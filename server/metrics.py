@@ -0,0 +1,329 @@
+import bisect
+import inspect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import grpc
+
+# Upper bounds (seconds) of the latency histogram buckets, plus an implicit +Inf bucket
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class MethodStats:
+    """Counters of one RPC method, updated under its own lock."""
+
+    __slots__ = ("lock", "buckets", "duration_sum", "in_flight", "request_bytes", "requests",
+                 "response_bytes", "responses", "codes")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.duration_sum = 0.0
+        self.in_flight = 0
+        self.request_bytes = 0
+        self.requests = 0
+        self.response_bytes = 0
+        self.responses = 0  # Response messages; a streaming call sends several
+        self.codes = {}  # Status code name -> completed calls
+
+    def started(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def finished(self, seconds, code):
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self.lock:
+            self.in_flight -= 1
+            self.buckets[bucket] += 1
+            self.duration_sum += seconds
+            self.codes[code] = self.codes.get(code, 0) + 1
+
+    def received(self, size):
+        with self.lock:
+            self.request_bytes += size
+            self.requests += 1
+
+    def sent(self, size):
+        with self.lock:
+            self.response_bytes += size
+            self.responses += 1
+
+
+class Metrics:
+    """
+    Per-method RPC metrics, plus gauges read when the metrics are exported, rendered in
+    the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.methods = {}  # Method name -> MethodStats
+        self._gauges = []  # (name, help, callable returning {labels: value})
+
+    def method(self, name):
+        stats = self.methods.get(name)
+        if stats is None:
+            with self._lock:
+                stats = self.methods.setdefault(name, MethodStats())
+        return stats
+
+    def add_gauge(self, name, help_text, read):
+        """Exports the values returned by read(), a dict of {label string: value}, as gauge name."""
+        self._gauges.append((name, help_text, read))
+
+    def render(self):
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        snapshot = {}
+        for name, stats in sorted(self.methods.items()):
+            with stats.lock:
+                snapshot[name] = (list(stats.buckets), stats.duration_sum, stats.in_flight, stats.request_bytes,
+                                  stats.requests, stats.response_bytes, stats.responses, dict(stats.codes))
+
+        family("reddit_rpc_duration_seconds", "histogram", "Time from receiving an RPC to completing it.")
+        for name, (buckets, duration_sum, *_) in snapshot.items():
+            cumulative = 0
+            for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), buckets):
+                cumulative += count
+                lines.append(f'reddit_rpc_duration_seconds_bucket{{method="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'reddit_rpc_duration_seconds_sum{{method="{name}"}} {duration_sum}')
+            lines.append(f'reddit_rpc_duration_seconds_count{{method="{name}"}} {cumulative}')
+        family("reddit_rpc_in_flight", "gauge", "RPCs being handled.")
+        for name, values in snapshot.items():
+            lines.append(f'reddit_rpc_in_flight{{method="{name}"}} {values[2]}')
+        family("reddit_rpc_request_bytes", "summary", "Size of the serialized request messages.")
+        for name, values in snapshot.items():
+            lines.append(f'reddit_rpc_request_bytes_sum{{method="{name}"}} {values[3]}')
+            lines.append(f'reddit_rpc_request_bytes_count{{method="{name}"}} {values[4]}')
+        family("reddit_rpc_response_bytes", "summary", "Size of the serialized response messages.")
+        for name, values in snapshot.items():
+            lines.append(f'reddit_rpc_response_bytes_sum{{method="{name}"}} {values[5]}')
+            lines.append(f'reddit_rpc_response_bytes_count{{method="{name}"}} {values[6]}')
+        family("reddit_rpc_completed_total", "counter", "Completed RPCs by status code.")
+        for name, values in snapshot.items():
+            for code, count in sorted(values[7].items()):
+                lines.append(f'reddit_rpc_completed_total{{method="{name}",code="{code}"}} {count}')
+
+        for gauge, help_text, read in self._gauges:
+            family(gauge, "gauge", help_text)
+            for labels, value in read().items():
+                lines.append(f"{gauge}{{{labels}}} {value}" if labels else f"{gauge} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def add_service_gauges(metrics, service):
+    """Exports the store sizes, response and entity cache counters and number of watched posts of a RedditService."""
+    metrics.add_gauge("reddit_store_items", "Entities in the store.",
+                      lambda: {f'kind="{kind}"': count for kind, count in service.store.sizes().items()})
+    if service.cache is not None:
+        metrics.add_gauge("reddit_response_cache", "Response cache counters.",
+                          lambda: {f'stat="{stat}"': value for stat, value in service.cache.stats().items()})
+    if service.encoded:
+        metrics.add_gauge("reddit_entity_cache", "Counters of the cached post and comment encodings.",
+                          lambda: {f'stat="{stat}"': value for stat, value in service.store.encoder.stats().items()})
+    metrics.add_gauge("reddit_watched_posts", "Posts with at least one WatchPost subscriber.",
+                      lambda: {"": len(service.broker)})
+
+
+# Integer status code -> name, for servers that report codes as integers
+_CODE_NAMES = {status.value[0]: status.name for status in grpc.StatusCode}
+
+
+def status_name(context, default="OK"):
+    """Returns the name of the status code the handler set, or default if it set none."""
+    code = context.code()
+    if code is None:
+        return default
+    return code.name if isinstance(code, grpc.StatusCode) else _CODE_NAMES.get(code, "UNKNOWN")
+
+
+class Rejected(Exception):
+    """Raised by an observe function of observed_handler to end the call with a status instead of running it."""
+
+    def __init__(self, code, details):
+        super().__init__(details)
+        self.code = code
+        self.details = details
+
+
+def observed_handler(handler, observe, deserialize=None, serialize=None):
+    """
+    Returns a thread-pool server's unary or server-streaming handler that calls
+    observe(request, context) as each call starts, and the function it returns with the name
+    of the call's status code once the call ends: CANCELLED for a stream abandoned before its
+    end, UNKNOWN for a handler that raised without setting one. The (de)serializers default
+    to the handler's own.
+    """
+    deserialize = deserialize or handler.request_deserializer
+    serialize = serialize or handler.response_serializer
+    if handler.unary_unary:
+        behavior = handler.unary_unary
+
+        def unary(request, context):
+            try:
+                finish = observe(request, context)
+            except Rejected as rejected:
+                context.abort(rejected.code, rejected.details)
+            code = "UNKNOWN"
+            try:
+                response = behavior(request, context)
+                code = status_name(context)
+                return response
+            except Exception:
+                code = status_name(context, default="UNKNOWN")  # Set by context.abort(), if it raised
+                raise
+            finally:
+                finish(code)
+
+        return grpc.unary_unary_rpc_method_handler(unary, deserialize, serialize)
+
+    behavior = handler.unary_stream
+
+    def stream(request, context):
+        # The sync server runs a response stream on one thread from start to end
+        try:
+            finish = observe(request, context)
+        except Rejected as rejected:
+            context.abort(rejected.code, rejected.details)
+        code = "CANCELLED"  # Unless the stream runs to its end or fails
+        try:
+            yield from behavior(request, context)
+            code = status_name(context)
+        except Exception:
+            code = status_name(context, default="UNKNOWN")
+            raise
+        finally:
+            finish(code)
+
+    return grpc.unary_stream_rpc_method_handler(stream, deserialize, serialize)
+
+
+def observed_async_handler(handler, observe, deserialize=None, serialize=None):
+    """observed_handler for grpc.aio servers, whose handlers are coroutines and async generators."""
+    deserialize = deserialize or handler.request_deserializer
+    serialize = serialize or handler.response_serializer
+    if handler.unary_unary:
+        behavior = handler.unary_unary
+
+        async def unary(request, context):
+            try:
+                finish = observe(request, context)
+            except Rejected as rejected:
+                await context.abort(rejected.code, rejected.details)
+            code = "UNKNOWN"
+            try:
+                response = await behavior(request, context)
+                code = status_name(context)
+                return response
+            except Exception:
+                code = status_name(context, default="UNKNOWN")
+                raise
+            finally:
+                finish(code)
+
+        return grpc.unary_unary_rpc_method_handler(unary, deserialize, serialize)
+
+    behavior = handler.unary_stream
+
+    async def stream(request, context):
+        try:
+            finish = observe(request, context)
+        except Rejected as rejected:
+            await context.abort(rejected.code, rejected.details)
+        code = "CANCELLED"
+        try:
+            async for response in behavior(request, context):
+                yield response
+            code = status_name(context)
+        except Exception:
+            code = status_name(context, default="UNKNOWN")
+            raise
+        finally:
+            finish(code)
+
+    return grpc.unary_stream_rpc_method_handler(stream, deserialize, serialize)
+
+
+def _measured_serializers(handler, stats):
+    def deserialize(data):
+        stats.received(len(data))
+        return handler.request_deserializer(data)
+
+    def serialize(response):
+        data = handler.response_serializer(response)
+        stats.sent(len(data))
+        return data
+
+    return deserialize, serialize
+
+
+def _timer(stats):
+    def observe(request, context):
+        stats.started()
+        start = time.perf_counter()
+        return lambda code: stats.finished(time.perf_counter() - start, code)
+    return observe
+
+
+def method_name(handler_call_details):
+    """Returns the method a call is for: /package.Service/Method -> Method."""
+    return handler_call_details.method.rsplit("/", 1)[-1]
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    """Records latency, in-flight calls, message sizes and status codes of every unary and server-streaming RPC."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None or not (handler.unary_unary or handler.unary_stream):
+            return handler
+        stats = self.metrics.method(method_name(handler_call_details))
+        return observed_handler(handler, _timer(stats), *_measured_serializers(handler, stats))
+
+
+class AsyncMetricsInterceptor(grpc.aio.ServerInterceptor):
+    """MetricsInterceptor for grpc.aio servers, whose handlers are coroutines and async generators."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None or not (handler.unary_unary or handler.unary_stream):
+            return handler
+        behavior = handler.unary_unary or handler.unary_stream
+        if not (inspect.iscoroutinefunction(behavior) or inspect.isasyncgenfunction(behavior)):
+            return handler  # Synchronous handlers run in the server's thread pool; they are not measured
+        stats = self.metrics.method(method_name(handler_call_details))
+        return observed_async_handler(handler, _timer(stats), *_measured_serializers(handler, stats))
+
+
+def serve_metrics(metrics, port):
+    """Serves metrics.render() at http://host:port/metrics from a daemon thread; returns the HTTP server."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes are too frequent to log
+
+    server = ThreadingHTTPServer(("", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
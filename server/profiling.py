@@ -0,0 +1,186 @@
+import collections
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+
+import grpc
+from google.protobuf import text_format
+
+from server.handlers import SERVICE
+from server.metrics import method_name, observed_handler
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+HANDLER_NAMES = {method.name for method in SERVICE.methods}
+# Functions of gRPC's thread-pool server that run one call, including (de)serializing its messages
+GRPC_CALL_FRAMES = {("_server.py", "_unary_response_in_pool"), ("_server.py", "_stream_response_in_pool")}
+
+# Caps on what a single slow request record holds
+MAX_CALL_SAMPLES = 1000
+MAX_PAYLOAD_CHARS = 4096
+
+# Subscriptions stay open for as long as the client watches, so how long they take says nothing
+UNTIMED_METHODS = {"WatchPost"}
+
+
+def fold(frame):
+    """
+    Returns a thread's stack as one folded line, outermost frame first, or None if the thread
+    isn't handling an RPC (an idle pool thread, gRPC's polling threads, the main thread
+    waiting for termination). Frames keep their line number, so a wait on a lock shows up at
+    the line that takes it.
+    """
+    frames = []
+    in_call = False
+    while frame is not None:
+        code = frame.f_code
+        filename = os.path.basename(code.co_filename)
+        in_call = in_call or (code.co_name in HANDLER_NAMES and code.co_filename.startswith(SERVER_DIR)) or \
+            (filename, code.co_name) in GRPC_CALL_FRAMES
+        frames.append(f"{code.co_name} ({filename}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(frames)) if in_call else None
+
+
+class StackSampler:
+    """
+    Samples the Python stacks of the server's threads from a daemon thread, every `interval`
+    seconds.
+
+    With output_dir set, the stacks of threads handling a call are counted and written
+    every flush_interval seconds to a new file of folded stacks ("frame;frame;... count"
+    lines, the input of flamegraph.pl and speedscope), keeping the newest `keep` files.
+    Independently, a thread that registered a list with track() gets its stacks appended
+    to it until untrack().
+
+    The sampler only runs once the busy thread gives up the GIL, which by default it may hold
+    for 5 ms, long enough to finish a typical handler. A switch_interval (seconds) lowers the
+    interpreter's GIL switch interval until stop(), so that samples can land inside them;
+    it applies to the whole process.
+    """
+
+    def __init__(self, interval=0.01, output_dir=None, flush_interval=60, keep=60, switch_interval=None):
+        self.interval = interval
+        self.output_dir = output_dir
+        self.flush_interval = flush_interval
+        self.keep = keep
+        self._counts = collections.Counter()
+        self._tracked = {}  # Thread ident -> list collecting that thread's stacks
+        self._stopped = threading.Event()
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+        self._switch_interval = sys.getswitchinterval()
+        if switch_interval is not None:
+            sys.setswitchinterval(min(self._switch_interval, switch_interval))
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def track(self, samples):
+        self._tracked[threading.get_ident()] = samples
+
+    def untrack(self):
+        self._tracked.pop(threading.get_ident(), None)
+
+    def _run(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while not self._stopped.wait(self.interval):
+            self.sample()
+            if self.output_dir is not None and time.monotonic() >= next_flush:
+                self.flush()
+                next_flush = time.monotonic() + self.flush_interval
+
+    def sample(self):
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            samples = self._tracked.get(ident)
+            if ident == own or (samples is None and self.output_dir is None):
+                continue
+            stack = fold(frame)
+            if stack is None:
+                continue
+            if samples is not None and len(samples) < MAX_CALL_SAMPLES:
+                samples.append(stack)
+            if self.output_dir is not None:
+                self._counts[stack] += 1
+
+    def flush(self):
+        """Writes the stacks counted since the last flush to a new file and returns its path, if there were any."""
+        counts, self._counts = self._counts, collections.Counter()
+        if not counts:
+            return None
+        path = os.path.join(self.output_dir, time.strftime("profile-%Y%m%d-%H%M%S.folded"))
+        with open(path, "a") as file:
+            for stack, count in counts.most_common():
+                file.write(f"{stack} {count}\n")
+        profiles = sorted(name for name in os.listdir(self.output_dir) if name.startswith("profile-"))
+        for name in profiles[:-self.keep]:
+            os.remove(os.path.join(self.output_dir, name))
+        return path
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        sys.setswitchinterval(self._switch_interval)
+        if self.output_dir is not None:
+            self.flush()
+
+
+def slow_request_logger(path, max_bytes=10 << 20, backups=5):
+    """Returns a logger writing to path, rotated every max_bytes with `backups` old files kept."""
+    logger = logging.getLogger(f"reddit.slow_requests.{path}")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    return logger
+
+
+class SlowRequestInterceptor(grpc.ServerInterceptor):
+    """
+    Logs every unary or server-streaming call that takes longer than `threshold` seconds as
+    one JSON line: the method, duration, status code, request message and the stacks the
+    sampler caught the call's thread in. Thread-pool servers only, since stacks are matched
+    to calls by thread.
+    """
+
+    def __init__(self, sampler, threshold, logger):
+        self.sampler = sampler
+        self.threshold = threshold
+        self.logger = logger
+
+    def _log(self, method, seconds, code, request, samples):
+        self.logger.info(json.dumps({
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "method": method,
+            "duration_ms": round(seconds * 1000, 3),
+            "code": code,
+            "request": text_format.MessageToString(request, as_one_line=True)[:MAX_PAYLOAD_CHARS],
+            "stacks": collections.Counter(samples).most_common(),
+        }))
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None or not (handler.unary_unary or handler.unary_stream):
+            return handler
+        method = method_name(handler_call_details)
+        if method in UNTIMED_METHODS:
+            return handler
+
+        def observe(request, context):
+            samples = []
+            self.sampler.track(samples)
+            start = time.perf_counter()
+
+            def finish(code):
+                self.sampler.untrack()
+                seconds = time.perf_counter() - start
+                if seconds > self.threshold:
+                    self._log(method, seconds, code, request, samples)
+            return finish
+
+        return observed_handler(handler, observe)
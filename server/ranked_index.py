@@ -0,0 +1,77 @@
+import bisect
+import itertools
+
+
+class RankedIndex:
+    """
+    Groups item IDs under a parent ID, keeping every group sorted by descending rank.
+
+    Ties are broken by insertion order, which matches a stable sort over insertion-ordered
+    storage. Reading the top N of a group is a slice, and re-ranking one item is a
+    binary search plus a list insert, so neither depends on how many items other groups hold.
+    """
+
+    def __init__(self):
+        self._groups = {}  # parent_id -> sorted list of (-rank, seq, item_id)
+        self._entries = {}  # item_id -> (parent_id, entry)
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, item_id):
+        return item_id in self._entries
+
+    def add(self, parent_id, item_id, rank=0):
+        entry = (-rank, next(self._seq), item_id)
+        group = self._groups.setdefault(parent_id, [])
+        if not group or group[-1] < entry:
+            group.append(entry)  # Common case: new items arrive with the lowest rank
+        else:
+            bisect.insort(group, entry)
+        self._entries[item_id] = (parent_id, entry)
+
+    def add_many(self, items):
+        """Adds (parent_id, item_id, rank) triples, sorting each affected group once at the end."""
+        touched = set()
+        for parent_id, item_id, rank in items:
+            entry = (-rank, next(self._seq), item_id)
+            self._groups.setdefault(parent_id, []).append(entry)
+            self._entries[item_id] = (parent_id, entry)
+            touched.add(parent_id)
+        for parent_id in touched:
+            self._groups[parent_id].sort()
+
+    def update(self, item_id, rank):
+        parent_id, entry = self._entries[item_id]
+        if entry[0] == -rank:
+            return
+        group = self._groups[parent_id]
+        del group[bisect.bisect_left(group, entry)]
+        new_entry = (-rank, entry[1], item_id)
+        bisect.insort(group, new_entry)
+        self._entries[item_id] = (parent_id, new_entry)
+
+    def parent_of(self, item_id):
+        return self._entries[item_id][0]
+
+    def count(self, parent_id):
+        return len(self._groups.get(parent_id, ()))
+
+    def top(self, parent_id, n):
+        """Returns the IDs of the n highest-ranked items under parent_id."""
+        if n <= 0:
+            return []
+        return [entry[2] for entry in self._groups.get(parent_id, ())[:n]]
+
+    def page(self, parent_id, n, after=None):
+        """
+        Returns up to n (key, item_id) pairs of the group in rank order, starting right after
+        the item whose key is `after`. Keys are (-rank, seq) tuples and stay valid for
+        resuming even if that item has since been re-ranked.
+        """
+        if n <= 0:
+            return []
+        group = self._groups.get(parent_id, ())
+        start = 0 if after is None else bisect.bisect_left(group, (after[0], after[1] + 1))
+        return [(entry[:2], entry[2]) for entry in group[start:start + n]]
@@ -0,0 +1,67 @@
+import functools
+import math
+import time
+
+# Format of Post.publication_date and Comment.publication_date
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Reference point of the hot rank; only differences between ranks matter
+HOT_EPOCH = 1134028003
+
+# z-score of the confidence level of the BEST order's lower bound (80%, as reddit uses)
+WILSON_Z = 1.281551565545
+
+
+@functools.lru_cache(maxsize=4096)
+def created_seconds(publication_date):
+    try:
+        return time.mktime(time.strptime(publication_date, DATE_FORMAT))
+    except ValueError:
+        return float(HOT_EPOCH)  # Entities without a usable date rank as the oldest
+
+
+def created_at(entity):
+    """Returns a Post's or Comment's creation time in epoch seconds, parsing publication_date only if created_at is unset."""
+    return entity.created_at or int(created_seconds(entity.publication_date))
+
+
+def vote_counts(score, upvotes, downvotes):
+    """
+    Returns (upvotes, downvotes) consistent with score. Entities stored before votes were counted
+    separately only have a score, which is taken to be all upvotes or all downvotes.
+    """
+    unexplained = score - (upvotes - downvotes)
+    return upvotes + max(unexplained, 0), downvotes + max(-unexplained, 0)
+
+
+def hot(score, created):
+    """
+    Reddit's hot rank: the order of magnitude of the score, signed, plus one point for every
+    12.5 hours since the epoch, so an entity needs ten times the votes to beat one that is 12.5
+    hours newer. It only depends on the creation time, not on the current time, so a rank
+    changes only when the score does.
+    """
+    order = math.log10(max(abs(score), 1))
+    sign = (score > 0) - (score < 0)
+    return round(sign * order + (created - HOT_EPOCH) / 45000, 7)
+
+
+def controversial(upvotes, downvotes):
+    """Reddit's controversial rank: the number of votes, raised to the ratio of the smaller side to the larger."""
+    if upvotes <= 0 or downvotes <= 0:
+        return 0.0
+    balance = downvotes / upvotes if upvotes > downvotes else upvotes / downvotes
+    return (upvotes + downvotes) ** balance
+
+
+def confidence(upvotes, downvotes):
+    """
+    Lower bound of the Wilson score interval of the share of upvotes: the BEST order, which
+    ranks 90 up / 10 down above 1 up / 0 down because it is surer about the larger sample.
+    """
+    votes = upvotes + downvotes
+    if votes == 0:
+        return 0.0
+    share = upvotes / votes
+    z2 = WILSON_Z * WILSON_Z
+    return (share + z2 / (2 * votes) - WILSON_Z * math.sqrt((share * (1 - share) + z2 / (4 * votes)) / votes)) / (1 + z2 / votes)
@@ -1,25 +1,220 @@
 import logging
 import grpc
 from concurrent import futures
+from collections import defaultdict
 import time
 import uuid
+import signal
 import sys
+import threading
 import argparse
+import asyncio
+import base64
+import binascii
+from google.protobuf.message import DecodeError
+from grpc_health.v1 import health, health_pb2, health_pb2_grpc
 
 # Import the generated classes
 import reddit_pb2
 import reddit_pb2_grpc
+from server.aio_server import serve_async
+from server.admission import Admission, AdmissionInterceptor, parse_method_limits
+from server.broker import Broker
+from server.handlers import SERVER_OPTIONS, SERVICE, add_servicer_to_server, serialize_response
+from server.idempotency import IdempotencyKeys
+from server.loader import load_from_sqlite
+from server.metrics import Metrics, MetricsInterceptor, add_service_gauges, serve_metrics
+from server.profiling import SlowRequestInterceptor, StackSampler, slow_request_logger
+from server.ranking import DATE_FORMAT
+from server.response_cache import ResponseCache
+from server.sqlite_store import SQLiteStore
+from server.store import InMemoryStore
+from server.vote_buffer import VoteBuffer
+from server.wal import Snapshotter, recover
+from server import wire
+from server.wire import EntityEncoder
 
-# Store posts and comments in memory
-posts = {}
-comments = {}
-subreddits = {}
+SERVICE_NAME = reddit_pb2.DESCRIPTOR.services_by_name['RedditService'].full_name
+
+MISSING_PARENT = 'Must provide either parent_post_id or parent_comment_id'
+
+# Number of posts StreamSubredditFeed reads from the store at a time
+FEED_PAGE_SIZE = 100
+
+# Orders of StreamSubredditFeed; CONTROVERSIAL and BEST only apply to comments
+# Calls per worker thread that a thread-mode server with admission control accepts at once, by default
+ADMITTED_CALLS_PER_WORKER = 4
+
+FEED_SORTS = (reddit_pb2.TOP, reddit_pb2.HOT, reddit_pb2.NEW)
+
+def random_id(affinity=None):
+    return str(uuid.uuid4())  # Generate a random UUID
+
+def creation_time():
+    """Returns the current time as created_at seconds and as the publication_date string of the same instant."""
+    seconds = int(time.time())
+    return seconds, time.strftime(DATE_FORMAT, time.localtime(seconds))
+
+def vote_counts(upvote):
+    return (1, 0) if upvote else (0, 1)
+
+def build_comment(request, comment_id):
+    """Creates a new Comment from a CreateCommentRequest, or returns None if the request has no parent."""
+    created_at, publication_date = creation_time()
+    new_comment = reddit_pb2.Comment(
+        comment_id=comment_id,
+        text=request.text,
+        author=request.author,
+        score=0,
+        status=reddit_pb2.Comment.NORMAL,
+        publication_date=publication_date,
+        created_at=created_at,
+    )
+
+    # Set the parent based on the request
+    if request.HasField("parent_post_id"):
+        new_comment.parent_post_id = request.parent_post_id
+    elif request.HasField("parent_comment_id"):
+        new_comment.parent_comment_id = request.parent_comment_id
+    else:
+        return None
+    return new_comment
+
+def batch_status(code=grpc.StatusCode.OK, message=""):
+    return reddit_pb2.BatchItemStatus(code=code.value[0], message=message)
+
+def encode_cursor(sort, key):
+    cursor = reddit_pb2.FeedCursor(sort=sort, rank=key[0], seq=key[1])
+    return base64.urlsafe_b64encode(cursor.SerializeToString()).decode()
+
+def decode_cursor(cursor):
+    """Returns the FeedCursor encoded in a FeedItem.cursor string, or None if it is malformed."""
+    try:
+        return reddit_pb2.FeedCursor.FromString(base64.urlsafe_b64decode(cursor))
+    except (binascii.Error, ValueError, DecodeError):
+        return None
+
+def score_version(event):
+    """Returns the (entity ID, version) of a PostEvent carrying a score, or None for other events."""
+    kind = event.WhichOneof("event")
+    if kind == "post_score" or kind == "comment_score":
+        update = getattr(event, kind)
+        return update.id, update.version
+    return None
 
 # Implement the RedditService
 class RedditService(reddit_pb2_grpc.RedditServiceServicer):
 
+    def __init__(self, store=None, new_id=random_id, broker=None, cache=None, idempotency=None, max_watchers=None):
+        # Store posts and comments in memory unless another store is provided
+        self.store = store if store is not None else InMemoryStore()
+        # new_id(affinity) creates IDs; a post's affinity is its subreddit, a comment's is its parent
+        self.new_id = new_id
+        # Fans the changes to a thread out to its watchers (WatchPost), with the post ID as the topic
+        self.broker = broker if broker is not None else Broker()
+        # Optional ResponseCache of serialized read responses, invalidated per thread
+        self.cache = cache
+        # With a store that has an EntityEncoder, GetPost, GetTopCommentsUnderPost and ExpandCommentBranch
+        # return serialized responses assembled from the store's cached encodings of posts and comments
+        self.encoded = getattr(self.store, "encoder", None) is not None
+        # Posts and comments created by requests with an idempotency_key, returned again when they are retried
+        self.idempotency = idempotency if idempotency is not None else IdempotencyKeys()
+        # A thread-pool server's WatchPost holds a worker for as long as the stream is open, so at
+        # most max_watchers streams may be, leaving the other workers to the unary calls
+        self._watch_slots = threading.BoundedSemaphore(max_watchers) if max_watchers is not None else None
+
+    def _thread_of(self, comment):
+        """
+        Returns the ID of the post at the root of a comment's thread, or of its topmost ancestor
+        that doesn't exist, so that every comment of a thread maps to the same ID.
+        """
+        while comment.HasField("parent_comment_id"):
+            parent = self.store.get_comment(comment.parent_comment_id)
+            if parent is None:
+                return comment.parent_comment_id
+            comment = parent
+        return comment.parent_post_id
+
+    def _tracks_threads(self):
+        # Finding a comment's thread costs store reads, so it is skipped unless a cache or a watcher needs it
+        return self.cache is not None or bool(self.broker)
+
+    def _cached_response(self, key, build, thread_of):
+        """Returns the cached serialized response for key, or builds, caches and returns one."""
+        if self.cache is None:
+            return build()
+        response = self.cache.get(key)
+        if response is None:
+            ticket = self.cache.ticket()
+            response = serialize_response(build())
+            self.cache.put(key, response, thread_of(), ticket)
+        return response
+
+    def _publish_post_scores(self, updates):
+        # Concurrent votes may publish out of order; subscriptions drop updates older than one they have queued
+        for update in updates:
+            if update is not None and self.broker.has_subscribers(update.id):
+                self.broker.publish(update.id, reddit_pb2.PostEvent(post_score=update))
+
+    def _comments_voted(self, updates):
+        if not self._tracks_threads():
+            return
+        for update in updates:
+            if update is None:
+                continue
+            post_id = self._thread_of(self.store.get_comment(update.id))
+            if self.cache is not None:
+                self.cache.invalidate(post_id)
+            if self.broker.has_subscribers(post_id):
+                self.broker.publish(post_id, reddit_pb2.PostEvent(comment_score=update))
+
+    def _first_replies(self, new_comments):
+        # IDs of the parent comments these replies will flip has_replies on; read before they are stored
+        if not self.broker:
+            return set()
+        parent_ids = {comment.parent_comment_id for comment in new_comments if comment.HasField("parent_comment_id")}
+        return {parent_id for parent_id in parent_ids
+                if (parent := self.store.get_comment(parent_id)) is not None and not parent.has_replies}
+
+    def _comments_created(self, new_comments, first_replies):
+        if not self._tracks_threads():
+            return
+        for comment in new_comments:
+            post_id = self._thread_of(comment)
+            if self.cache is not None:
+                self.cache.invalidate(post_id)
+            if not self.broker.has_subscribers(post_id):
+                continue
+            self.broker.publish(post_id, reddit_pb2.PostEvent(comment=comment))
+            if comment.parent_comment_id in first_replies:
+                first_replies.discard(comment.parent_comment_id)
+                self.broker.publish(post_id, reddit_pb2.PostEvent(has_replies=comment.parent_comment_id))
+
+    def _create_once(self, kind, key, create):
+        """Returns create()'s new entity, or the entity created earlier by a request with the same idempotency key."""
+        if not key:
+            return create()
+        key = (kind, key)
+        entity = self.idempotency.claim(key)
+        if entity is not None:
+            return entity
+        try:
+            entity = create()
+        finally:
+            self.idempotency.finish(key, entity)
+        return entity
+
     def CreatePost(self, request, context):
-        post_id = str(uuid.uuid4())  # Generate a random UUID
+        if request.WhichOneof("media") is None:  # No media: raise an error
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details('Must provide either image_url or video_url')
+            return reddit_pb2.CreatePostResponse()
+        new_post = self._create_once("post", request.idempotency_key, lambda: self._add_post(request))
+        return reddit_pb2.CreatePostResponse(post=new_post)
+
+    def _add_post(self, request):
+        post_id = self.new_id(request.subreddit_id)
+        created_at, publication_date = creation_time()
 
         # Create a new Post object
         new_post = reddit_pb2.Post(
@@ -29,7 +224,8 @@ class RedditService(reddit_pb2_grpc.RedditServiceServicer):
             author=request.author,
             score=0,
             state=reddit_pb2.Post.NORMAL,
-            publication_date=str(time.strftime("%Y-%m-%d %H:%M:%S")),
+            publication_date=publication_date,
+            created_at=created_at,
             subreddit_id=request.subreddit_id,
             tags=request.tags,
         )
@@ -37,118 +233,508 @@ class RedditService(reddit_pb2_grpc.RedditServiceServicer):
         # Set the media based on the request
         if request.HasField("image_url"):
             new_post.image_url = request.image_url
-        elif request.HasField("video_url"):
+        else:
             new_post.video_url = request.video_url
-        else:  # No media: raise an error
-            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
-            context.set_details('Must provide either image_url or video_url')
-            return reddit_pb2.CreatePostResponse()
-
-        # Add the new post to the posts dictionary
-        posts[post_id] = new_post
 
-        # Create the associated subreddit if it doesn't exist
-        if request.subreddit_id not in subreddits:
-            subreddits[request.subreddit_id] = reddit_pb2.Subreddit(subreddit_id=request.subreddit_id, post_ids=[])
-        # Add the new post to the subreddit
-        subreddits[request.subreddit_id].post_ids.append(post_id)
-        
-        return reddit_pb2.CreatePostResponse(post=new_post)
+        # Add the new post to the store and to its subreddit
+        self.store.add_post(new_post)
+        return new_post
 
     def VotePost(self, request, context):
-        if request.post_id not in posts:
+        update = self.store.vote_post(request.post_id, *vote_counts(request.upvote))
+        if update is None:
             return reddit_pb2.VotePostResponse(message="Post not found")
-
-        posts[request.post_id].score += 1 if request.upvote else -1
+        self._publish_post_scores([update])
         return reddit_pb2.VotePostResponse(message="Vote recorded")
 
     def GetPost(self, request, context):
-        if request.post_id in posts:
-            return reddit_pb2.GetPostResponse(post=posts[request.post_id])
+        post = self.store.encoded_post(request.post_id) if self.encoded else self.store.get_post(request.post_id)
+        if post is not None:
+            return wire.get_post_response(post) if self.encoded else reddit_pb2.GetPostResponse(post=post)
         else:
             context.set_code(grpc.StatusCode.NOT_FOUND)
             context.set_details('Post not found')
             return reddit_pb2.GetPostResponse()
 
     def CreateComment(self, request, context):
-        comment_id = str(uuid.uuid4())  # Generate a random UUID
-
-        new_comment = reddit_pb2.Comment(
-            comment_id=comment_id,
-            text=request.text,
-            author=request.author,
-            score=0,
-            status=reddit_pb2.Comment.NORMAL,
-            publication_date=str(time.strftime("%Y-%m-%d %H:%M:%S")),
-        )
-
-        # Set the parent based on the request
-        if request.HasField("parent_post_id"):
-            new_comment.parent_post_id = request.parent_post_id
-        elif request.HasField("parent_comment_id"):
-            new_comment.parent_comment_id = request.parent_comment_id
-            # Update the has_replies field of the parent comment
-            if request.parent_comment_id in comments:
-                parent_comment = comments[request.parent_comment_id]
-                parent_comment.has_replies = True
-        else:  # No parent: raise an error
+        if request.WhichOneof("parent") is None:  # No parent: raise an error
             context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
-            context.set_details('Must provide either parent_post_id or parent_comment_id')
+            context.set_details(MISSING_PARENT)
             return reddit_pb2.CreateCommentResponse()
-
-        # Store the new comment
-        comments[comment_id] = new_comment
-
+        new_comment = self._create_once("comment", request.idempotency_key, lambda: self._add_comments([request])[0])
         return reddit_pb2.CreateCommentResponse(comment=new_comment)
 
+    def _add_comments(self, comment_requests):
+        """Creates and stores a comment per request and returns them, with None for the requests without a parent."""
+        new_comments = [build_comment(comment_request, self.new_id(comment_request.parent_post_id or
+                                                                   comment_request.parent_comment_id))
+                        for comment_request in comment_requests]
+        valid_comments = [comment for comment in new_comments if comment is not None]
+        # Store the new comments (this also flags their parent comments as having replies)
+        first_replies = self._first_replies(valid_comments)
+        self.store.add_comments(valid_comments)
+        self._comments_created(valid_comments, first_replies)
+        return new_comments
+
     def VoteComment(self, request, context):
-        if request.comment_id not in comments:
+        update = self.store.vote_comment(request.comment_id, *vote_counts(request.upvote))
+        if update is None:
             return reddit_pb2.VoteCommentResponse(message="Comment not found")
-
-        comments[request.comment_id].score += 1 if request.upvote else -1
+        self._comments_voted([update])
         return reddit_pb2.VoteCommentResponse(message="Vote recorded")
 
     def GetTopCommentsUnderPost(self, request, context):
-        filtered_comments = [comment for comment in comments.values() if comment.parent_post_id == request.post_id]
-        sorted_comments = sorted(filtered_comments, key=lambda x: x.score, reverse=True)
-        return reddit_pb2.GetTopCommentsUnderPostResponse(comments=sorted_comments[:request.count])
+        if request.sort not in reddit_pb2.SortOrder.values():
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details('sort must be a known SortOrder')
+            return reddit_pb2.GetTopCommentsUnderPostResponse()
+
+        def build():
+            if self.encoded:
+                return wire.top_comments_response(
+                    [comment for _, comment in self.store.encoded_top_comments(request.post_id, request.count, request.sort)])
+            top_comments = self.store.top_comments(request.post_id, request.count, request.sort)
+            return reddit_pb2.GetTopCommentsUnderPostResponse(comments=top_comments)
+        return self._cached_response(('GetTopCommentsUnderPost', request.post_id, request.count, request.sort), build,
+                                     lambda: request.post_id)
 
     def ExpandCommentBranch(self, request, context):
-        # Retrieve and sort the top comments under the post
-        filtered_comments = [comment for comment in comments.values() if comment.parent_comment_id == request.comment_id]
-        sorted_comments = sorted(filtered_comments, key=lambda x: x.score, reverse=True)
-        top_comments = sorted_comments[:request.count]
-
-        # Create a CommentNode for each top comment
-        comment_nodes = []
-        for comment in top_comments:
-            # Retrieve and sort the top comments under this specific comment
-            filtered_child_comments = [child_comment for child_comment in comments.values() 
-                                       if child_comment.parent_comment_id == comment.comment_id]
-            sorted_child_comments = sorted(filtered_child_comments, key=lambda x: x.score, reverse=True)
-            top_replies = sorted_child_comments[:request.count]
-
-            # Create the CommentNode for this comment and its top replies
-            comment_node = reddit_pb2.CommentNode(comment=comment, children=top_replies)
-            comment_nodes.append(comment_node)
-        return reddit_pb2.ExpandCommentBranchResponse(comment_nodes=comment_nodes)
+        if request.max_depth < 0:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details('max_depth must not be negative')
+            return reddit_pb2.ExpandCommentBranchResponse()
 
-def parse_arguments():
+        def thread_of():
+            comment = self.store.get_comment(request.comment_id)
+            return request.comment_id if comment is None else self._thread_of(comment)
+        build = self._encode_comment_branch if self.encoded else self._expand_comment_branch
+        return self._cached_response(('ExpandCommentBranch', request.comment_id, request.count, request.max_depth),
+                                     lambda: build(request), thread_of)
+
+    def _expand_comment_branch(self, request):
+        response = reddit_pb2.ExpandCommentBranchResponse()
+        top_comments = self.store.top_replies(request.comment_id, request.count)
+
+        if request.max_depth == 0:
+            # Depth 2 layout: each top reply with its own top replies as flat children
+            for comment in top_comments:
+                top_replies = self.store.top_replies(comment.comment_id, request.count)
+                response.comment_nodes.add(comment=comment, children=top_replies)
+            return response
+
+        # Walk the branch level by level, appending each node into its parent's replies,
+        # so the work done is proportional to the size of the returned subtree
+        frontier = [(response.comment_nodes, comment) for comment in top_comments]
+        for depth in range(1, request.max_depth + 1):
+            next_frontier = []
+            for siblings, comment in frontier:
+                node = siblings.add(comment=comment)
+                if depth < request.max_depth:
+                    next_frontier.extend((node.replies, reply)
+                                         for reply in self.store.top_replies(comment.comment_id, request.count))
+            frontier = next_frontier
+        return response
+
+    def _encode_comment_branch(self, request):
+        """Returns the serialized ExpandCommentBranchResponse that _expand_comment_branch would build."""
+        top_comments = self.store.encoded_top_replies(request.comment_id, request.count)
+
+        if request.max_depth == 0:
+            return wire.expand_response(
+                wire.comment_node(comment, children=[child for _, child in self.store.encoded_top_replies(comment_id, request.count)])
+                for comment_id, comment in top_comments)
+
+        # A node's encoding holds its replies' encodings, so collect the branch level by level
+        # as (position of the parent in the level above, comment ID, encoding) and encode it bottom up
+        levels = [[(None, comment_id, comment) for comment_id, comment in top_comments]]
+        while len(levels) < request.max_depth and levels[-1]:
+            levels.append([(position, reply_id, reply) for position, (_, comment_id, _) in enumerate(levels[-1])
+                           for reply_id, reply in self.store.encoded_top_replies(comment_id, request.count)])
+        below = {}
+        for level in reversed(levels):
+            nodes = defaultdict(list)
+            for position, (parent, _, comment) in enumerate(level):
+                nodes[parent].append(wire.comment_node(comment, replies=below.get(position, ())))
+            below = nodes
+        return wire.expand_response(below.get(None, ()))
+
+    def GetPostThread(self, request, context):
+        if request.max_depth < 0:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details('max_depth must not be negative')
+            return reddit_pb2.GetPostThreadResponse()
+        post = self.store.get_post(request.post_id)
+        if post is None:
+            context.set_code(grpc.StatusCode.NOT_FOUND)
+            context.set_details('Post not found')
+            return reddit_pb2.GetPostThreadResponse()
+
+        response = reddit_pb2.GetPostThreadResponse(post=post, comments=self.store.top_comments(request.post_id, request.count))
+        if response.comments:
+            branch = self._expand_comment_branch(reddit_pb2.ExpandCommentBranchRequest(
+                comment_id=response.comments[0].comment_id, count=request.count, max_depth=request.max_depth))
+            response.top_branch.extend(branch.comment_nodes)
+        return response
+
+    def SearchPosts(self, request, context):
+        results = self.store.search_posts(request.query, request.count, request.tags, request.subreddit_id)
+        return reddit_pb2.SearchPostsResponse(results=[reddit_pb2.PostSearchResult(post=post, score=score)
+                                                       for score, post in results])
+
+    def SearchComments(self, request, context):
+        results = self.store.search_comments(request.query, request.count)
+        if results is None:
+            context.set_code(grpc.StatusCode.FAILED_PRECONDITION)
+            context.set_details('Comments are not indexed; start the server with --search_comments')
+            return reddit_pb2.SearchCommentsResponse()
+        return reddit_pb2.SearchCommentsResponse(results=[reddit_pb2.CommentSearchResult(comment=comment, score=score)
+                                                          for score, comment in results])
+
+    def BatchGetPosts(self, request, context):
+        response = reddit_pb2.BatchGetPostsResponse()
+        for post in self.store.get_posts(request.post_ids):
+            if post is None:
+                response.results.add(status=batch_status(grpc.StatusCode.NOT_FOUND, 'Post not found'))
+            else:
+                response.results.add(status=batch_status(), post=post)
+        return response
+
+    def BatchVotePosts(self, request, context):
+        updates = self.store.vote_posts([(vote.post_id, *vote_counts(vote.upvote)) for vote in request.votes])
+        self._publish_post_scores(updates)
+        return reddit_pb2.BatchVotePostsResponse(statuses=[
+            batch_status(grpc.StatusCode.NOT_FOUND, 'Post not found') if update is None else batch_status()
+            for update in updates])
+
+    def BatchVoteComments(self, request, context):
+        updates = self.store.vote_comments([(vote.comment_id, *vote_counts(vote.upvote))
+                                            for vote in request.votes])
+        self._comments_voted(updates)
+        return reddit_pb2.BatchVoteCommentsResponse(statuses=[
+            batch_status(grpc.StatusCode.NOT_FOUND, 'Comment not found') if update is None else batch_status()
+            for update in updates])
+
+    def BatchCreateComments(self, request, context):
+        items = request.comments
+        new_comments = [None] * len(items)
+        created = {}  # Idempotency key -> the comment created under it, earlier or by this batch
+        claimed = set()
+        try:
+            # Claiming keys in sorted order keeps two batches with common keys from waiting on each other
+            for key in sorted({item.idempotency_key for item in items if item.idempotency_key}):
+                comment = self.idempotency.claim(("comment", key))
+                if comment is None:
+                    claimed.add(key)
+                else:
+                    created[key] = comment
+            # Items without a key, and the first item of each claimed key, create a comment
+            to_create = []
+            unused = set(claimed)
+            for position, item in enumerate(items):
+                if not item.idempotency_key or item.idempotency_key in unused:
+                    unused.discard(item.idempotency_key)
+                    to_create.append(position)
+            for position, comment in zip(to_create, self._add_comments([items[p] for p in to_create])):
+                new_comments[position] = comment
+                if items[position].idempotency_key:
+                    created[items[position].idempotency_key] = comment
+        finally:
+            for key in claimed:
+                self.idempotency.finish(("comment", key), created.get(key))
+        # The other items with a key repeat the comment created under it
+        for position, item in enumerate(items):
+            if item.idempotency_key and new_comments[position] is None:
+                new_comments[position] = created.get(item.idempotency_key)
+
+        response = reddit_pb2.BatchCreateCommentsResponse()
+        for comment in new_comments:
+            if comment is None:
+                response.results.add(status=batch_status(grpc.StatusCode.INVALID_ARGUMENT, MISSING_PARENT))
+            else:
+                response.results.add(status=batch_status(), comment=comment)
+        return response
+
+    def StreamSubredditFeed(self, request, context):
+        if request.limit < 0 or request.sort not in FEED_SORTS:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details('limit must not be negative and sort must be TOP, HOT or NEW')
+            return
+
+        after = None
+        if request.cursor:
+            cursor = decode_cursor(request.cursor)
+            if cursor is None or cursor.sort != request.sort:
+                context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+                context.set_details('Invalid cursor for this feed')
+                return
+            after = (cursor.rank, cursor.seq)
+
+        # Read the feed a page at a time, so the first posts go out before the rest are ranked
+        # and memory doesn't grow with the size of the subreddit
+        remaining = request.limit or float('inf')
+        while remaining > 0:
+            count = min(FEED_PAGE_SIZE, remaining)
+            try:
+                page = self.store.feed_page(request.subreddit_id, request.sort, count, after)
+            except ValueError:  # A well-formed cursor that the store never handed out
+                context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+                context.set_details('Invalid cursor for this feed')
+                return
+            for after, post in page:
+                yield reddit_pb2.FeedItem(post=post, cursor=encode_cursor(request.sort, after))
+            if len(page) < count:
+                return
+            remaining -= len(page)
+
+    def watch_post(self, request, context):
+        """
+        Subscribes to the events of a post's thread, with the post's current score queued first.
+        Returns None, with the status set, if the post doesn't exist.
+        """
+        # Subscribe before reading the score, so no vote can fall between the two; a vote's update
+        # queued ahead of the read score makes the subscription drop the score if it is older
+        subscription = self.broker.subscribe(request.post_id, order=score_version)
+        post = self.store.get_post(request.post_id)
+        if post is None:
+            subscription.close()
+            context.set_code(grpc.StatusCode.NOT_FOUND)
+            context.set_details('Post not found')
+            return None
+        # The version is read first: a vote landing meanwhile then leaves it behind the score, never ahead
+        version = post.version
+        subscription.offer(reddit_pb2.PostEvent(post_score=reddit_pb2.ScoreUpdate(
+            id=post.post_id, score=post.score, upvotes=post.upvotes, downvotes=post.downvotes, version=version)))
+        return subscription
+
+    def end_watch(self, subscription, context):
+        if subscription.dropped:
+            context.set_code(grpc.StatusCode.RESOURCE_EXHAUSTED)
+            context.set_details('Watcher fell too far behind; re-read the thread and watch again')
+
+    def WatchPost(self, request, context):
+        if self._watch_slots is not None and not self._watch_slots.acquire(blocking=False):
+            context.set_code(grpc.StatusCode.RESOURCE_EXHAUSTED)
+            context.set_details('Too many open watchers; retry later, or watch through an async server')
+            return
+        try:
+            subscription = self.watch_post(request, context)
+            if subscription is None:
+                return
+            context.add_callback(subscription.close)  # Ends the stream when the watcher goes away
+            yield from subscription
+            self.end_watch(subscription, context)
+        finally:
+            if self._watch_slots is not None:
+                self._watch_slots.release()
+
+def build_parser():
     parser = argparse.ArgumentParser(description='Reddit gRPC Server')
     parser.add_argument('--port', type=int, default=50051, help='Port to listen on (default: 50051)')
     parser.add_argument('--max_workers', type=int, default=10, help='Number of thread workers (default: 10)')
-    return parser.parse_args()
+    parser.add_argument('--mode', choices=['thread', 'async'], default='thread',
+                        help='Serve from a thread pool or from a grpc.aio event loop (default: thread)')
+    parser.add_argument('--storage', choices=['memory', 'sqlite'], default='memory', help='Storage backend (default: memory)')
+    parser.add_argument('--db_path', default='reddit.db', help='SQLite database file for --storage sqlite (default: reddit.db)')
+    parser.add_argument('--wal_dir', help='Directory for the write-ahead log and snapshots of the in-memory store (default: disabled)')
+    parser.add_argument('--snapshot_interval', type=float, default=300, help='Seconds between snapshots when --wal_dir is set (default: 300)')
+    parser.add_argument('--warm_from', help='SQLite database to bulk-load into the in-memory store at startup (default: none)')
+    parser.add_argument('--load_workers', type=int, help='Worker processes for --warm_from (default: one per CPU)')
+    parser.add_argument('--startup_budget', type=float, help='Seconds the --warm_from load is expected to take; a warning is logged when exceeded')
+    parser.add_argument('--lock_stripes', type=int, default=256, help='Number of lock stripes in the in-memory store (default: 256)')
+    parser.add_argument('--search_comments', action='store_true',
+                        help='Index comment text for SearchComments; posts are always indexed (default: disabled)')
+    parser.add_argument('--vote_buffer', action='store_true', help='Coalesce votes in a buffer before applying them to the store')
+    parser.add_argument('--vote_flush_ms', type=int, default=50, help='Vote buffer flush interval in milliseconds (default: 50)')
+    parser.add_argument('--vote_flush_size', type=int, default=10000, help='Pending IDs that force a vote buffer flush (default: 10000)')
+    parser.add_argument('--watch_queue_size', type=int, default=256,
+                        help='Events a WatchPost subscriber may fall behind before it is dropped (default: 256)')
+    parser.add_argument('--max_watchers', type=int,
+                        help='Open WatchPost streams in thread mode, each holding a worker thread; more are rejected with '
+                             'RESOURCE_EXHAUSTED (default: half of --max_workers)')
+    parser.add_argument('--response_cache_size', type=int, default=10000,
+                        help='Serialized GetTopCommentsUnderPost/ExpandCommentBranch responses to cache; 0 disables the cache (default: 10000)')
+    parser.add_argument('--response_cache_ttl', type=float, help='Seconds a cached response may be served for (default: until invalidated)')
+    parser.add_argument('--entity_cache_size', type=int, default=100000,
+                        help='Posts, and comments, whose encoding the in-memory store keeps to assemble GetPost/'
+                             'GetTopCommentsUnderPost/ExpandCommentBranch responses from; 0 serializes every response (default: 100000)')
+    parser.add_argument('--idempotency_keys', type=int, default=100000,
+                        help='Idempotency keys of CreatePost/CreateComment requests to remember (default: 100000)')
+    parser.add_argument('--idempotency_ttl', type=float, default=600,
+                        help='Seconds a retry with the same idempotency key returns the entity created first (default: 600)')
+    parser.add_argument('--metrics_port', type=int, help='Port to serve Prometheus metrics on at /metrics (default: disabled)')
+    parser.add_argument('--rate_limit', type=float, help='Calls per second allowed per client (default: unlimited)')
+    parser.add_argument('--rate_burst', type=float, help='Calls a client may burst above --rate_limit (default: --rate_limit)')
+    parser.add_argument('--client_id_header', default='x-client-id',
+                        help='Metadata key identifying a client for --rate_limit; clients without it are keyed by address (default: x-client-id)')
+    parser.add_argument('--method_concurrency', type=parse_method_limits, default={},
+                        help='Calls of a method that may run at once, e.g. ExpandCommentBranch=4,GetPostThread=4 (default: unlimited)')
+    parser.add_argument('--max_concurrent_rpcs', type=int,
+                        help='Calls the server accepts at once, running or queued; more are rejected with RESOURCE_EXHAUSTED '
+                             f'(default: {ADMITTED_CALLS_PER_WORKER} per worker thread with admission control in thread mode, else unlimited)')
+    parser.add_argument('--profile_dir', help='Directory to write sampled stacks of the server threads to, as folded stacks (default: disabled)')
+    parser.add_argument('--profile_interval_ms', type=float, default=10, help='Stack sampling interval in milliseconds (default: 10)')
+    parser.add_argument('--profile_flush', type=float, default=60, help='Seconds of samples per --profile_dir file (default: 60)')
+    parser.add_argument('--profile_keep', type=int, default=60, help='Newest --profile_dir files to keep (default: 60)')
+    parser.add_argument('--profile_switch_interval_ms', type=float,
+                        help='GIL switch interval while sampling, for samples inside short handlers; process-wide (default: unchanged)')
+    parser.add_argument('--slow_request_ms', type=float,
+                        help='Log the request and stack samples of calls slower than this many milliseconds (default: disabled)')
+    parser.add_argument('--slow_request_log', default='slow_requests.log', help='File for --slow_request_ms records (default: slow_requests.log)')
+    parser.add_argument('--slow_request_log_bytes', type=int, default=10 << 20,
+                        help='Size at which the slow request log is rotated (default: 10485760)')
+    parser.add_argument('--slow_request_log_backups', type=int, default=5, help='Rotated slow request logs to keep (default: 5)')
+    return parser
+
+def validate_arguments(parser, args):
+    if args.warm_from and args.storage != 'memory':
+        parser.error('--warm_from requires --storage memory')
+    if args.warm_from and args.wal_dir:
+        # The warm-up would load the database on top of the recovered state, and bypass the log
+        parser.error('--warm_from cannot be combined with --wal_dir')
+    if args.slow_request_ms is not None and args.mode != 'thread':
+        parser.error('--slow_request_ms requires --mode thread')
+    if args.max_watchers is not None and args.mode == 'thread' and not 0 < args.max_watchers < args.max_workers:
+        parser.error('--max_watchers must leave some of the --max_workers threads to other calls')
+    unknown_methods = set(args.method_concurrency) - {method.name for method in SERVICE.methods}
+    if unknown_methods:
+        parser.error(f"--method_concurrency: unknown methods {', '.join(sorted(unknown_methods))}")
+
+def parse_arguments():
+    parser = build_parser()
+    args = parser.parse_args()
+    validate_arguments(parser, args)
+    return args
+
+# Create the store described by the command line arguments
+def build_store(args):
+    encoder = EntityEncoder(args.entity_cache_size) if args.entity_cache_size > 0 else None
+    if args.storage == 'sqlite':
+        store = SQLiteStore(args.db_path, search_comments=args.search_comments)
+    elif args.wal_dir:
+        # Load the latest snapshot, replay the log tail and keep logging from there
+        store = recover(args.wal_dir, args.lock_stripes, search_comments=args.search_comments, encoder=encoder)
+        Snapshotter(store, args.snapshot_interval)
+    else:
+        store = InMemoryStore(args.lock_stripes, search_comments=args.search_comments, encoder=encoder)
+    if args.vote_buffer:
+        store = VoteBuffer(store, flush_interval=args.vote_flush_ms / 1000, max_pending=args.vote_flush_size)
+    return store
+
+# Open watchers a thread-mode server allows; async servers run watchers on the event loop, so only thread mode caps them
+def watcher_limit(args):
+    if args.mode != 'thread':
+        return None
+    return args.max_watchers if args.max_watchers is not None else max(args.max_workers // 2, 1)
+
+# Create the service, with its store and watcher broker, described by the command line arguments
+def build_service(args, new_id=random_id):
+    cache = ResponseCache(args.response_cache_size, args.response_cache_ttl) if args.response_cache_size > 0 else None
+    return RedditService(build_store(args), new_id=new_id, broker=Broker(args.watch_queue_size), cache=cache,
+                         idempotency=IdempotencyKeys(args.idempotency_keys, args.idempotency_ttl),
+                         max_watchers=watcher_limit(args))
+
+# Create the metrics of the service and serve them over HTTP, if requested
+def build_metrics(args, service):
+    if args.metrics_port is None:
+        return None
+    metrics = Metrics()
+    add_service_gauges(metrics, service)
+    serve_metrics(metrics, args.metrics_port)
+    return metrics
+
+# Create the admission control for --rate_limit and --method_concurrency, if requested
+def build_admission(args):
+    if args.rate_limit is None and not args.method_concurrency:
+        return None
+    return Admission(args.rate_limit, args.rate_burst, args.client_id_header, args.method_concurrency)
+
+def concurrent_rpc_limit(max_workers, admission, max_concurrent_rpcs):
+    """
+    Returns the maximum_concurrent_rpcs of a thread-mode server. Admission turns calls down on
+    a pool thread, once they have waited for one, so it can't keep a flood out of the pool's
+    queue; gRPC enforces this bound before a call reaches the pool.
+    """
+    if max_concurrent_rpcs is None and admission is not None:
+        return ADMITTED_CALLS_PER_WORKER * max_workers
+    return max_concurrent_rpcs
+
+# Start the stack sampler for --profile_dir and --slow_request_ms, if requested
+def build_sampler(args):
+    if args.profile_dir is None and args.slow_request_ms is None:
+        return None
+    switch_interval = None if args.profile_switch_interval_ms is None else args.profile_switch_interval_ms / 1000
+    return StackSampler(args.profile_interval_ms / 1000, args.profile_dir, args.profile_flush, args.profile_keep,
+                        switch_interval)
+
+# Create the interceptor logging calls slower than --slow_request_ms, if requested
+def build_slow_requests(args, sampler):
+    if args.slow_request_ms is None:
+        return None
+    logger = slow_request_logger(args.slow_request_log, args.slow_request_log_bytes, args.slow_request_log_backups)
+    return SlowRequestInterceptor(sampler, args.slow_request_ms / 1000, logger)
+
+# Create the startup step that bulk-loads --warm_from into the store, if requested
+def build_warm_up(args):
+    if not args.warm_from:
+        return None
+
+    def warm_up(store):
+        elapsed = load_from_sqlite(store, args.warm_from, workers=args.load_workers)
+        print(f"Loaded {args.warm_from} in {elapsed:.2f}s")
+        if args.startup_budget is not None and elapsed > args.startup_budget:
+            logging.warning("Startup load took %.2fs, over the %.2fs budget", elapsed, args.startup_budget)
+    return warm_up
 
 # Create a gRPC server
-def serve(port, max_workers):
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
-    reddit_pb2_grpc.add_RedditServiceServicer_to_server(RedditService(), server)
+def serve(port, max_workers, store=None, warm_up=None, servicer=None, options=(), internal_port=None, metrics=None,
+          slow_requests=None, admission=None, max_concurrent_rpcs=None):
+    store = store if store is not None else InMemoryStore()
+    servicer = servicer if servicer is not None else RedditService(store)
+    # Metrics see rejected calls too; the slow request log only sees admitted ones
+    interceptors = [MetricsInterceptor(metrics)] if metrics is not None else []
+    if admission is not None:
+        interceptors.append(AdmissionInterceptor(admission))
+    if slow_requests is not None:
+        interceptors.append(slow_requests)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers), options=[*SERVER_OPTIONS, *options],
+                         interceptors=interceptors,
+                         maximum_concurrent_rpcs=concurrent_rpc_limit(max_workers, admission, max_concurrent_rpcs))
+    add_servicer_to_server(servicer, server)
+
+    # Report readiness through the standard gRPC health service
+    health_servicer = health.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
+
     server.add_insecure_port(f"[::]:{port}")
+    if internal_port is not None:
+        # Port that the other workers of a multi-process deployment forward requests to
+        server.add_insecure_port(f"[::]:{internal_port}")
+    # Warm the store before the port opens, so no call ever sees it half loaded
+    if warm_up is not None:
+        warm_up(store)
     server.start()
     print(f"Server started, listening on {port}")
+    for service in ("", SERVICE_NAME):
+        health_servicer.set(service, health_pb2.HealthCheckResponse.SERVING)
     server.wait_for_termination()
 
 if __name__ == '__main__':
     logging.basicConfig()
     args = parse_arguments()
-    serve(args.port, args.max_workers)
+    sampler = build_sampler(args)
+    try:
+        if args.mode == 'async':
+            # Stores that wait on disk run their handlers off the event loop
+            offload = args.storage == 'sqlite' or args.wal_dir is not None
+            service = build_service(args)
+            asyncio.run(serve_async(args.port, service, build_warm_up(args), offload, metrics=build_metrics(args, service),
+                                    admission=build_admission(args), max_concurrent_rpcs=args.max_concurrent_rpcs))
+        else:
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # Leave through the finally below
+            service = build_service(args)
+            serve(args.port, args.max_workers, service.store, build_warm_up(args), servicer=service,
+                  metrics=build_metrics(args, service), slow_requests=build_slow_requests(args, sampler),
+                  admission=build_admission(args), max_concurrent_rpcs=args.max_concurrent_rpcs)
+    finally:
+        if sampler is not None:
+            sampler.stop()  # Writes out the last partial profile
@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of serialized responses, with an optional time-to-live.
+
+    Every entry is tagged with the thread (root post ID) it was computed from, and
+    invalidate(tag) drops all of that thread's entries. To keep a response computed
+    concurrently with an invalidation from being cached, callers take a ticket() before
+    reading the store and hand it to put(), which skips the response if its tag has been
+    invalidated since.
+    """
+
+    def __init__(self, max_entries=10000, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (response, tag, expiry or None), least recently used first
+        self._tagged = {}  # tag -> set of keys
+        # Sequence number of each tag's latest invalidation, oldest first. Only the most recent
+        # ones are remembered; tickets older than the forgotten ones are refused outright.
+        self._invalidated = OrderedDict()
+        self._max_invalidated = max(1024, max_entries)
+        self._sequence = 0
+        self._floor = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "invalidations": self.invalidations, "entries": len(self._entries)}
+
+    def _remove(self, key):
+        # Must be called with the lock held
+        _, tag, _ = self._entries.pop(key)
+        keys = self._tagged[tag]
+        keys.discard(key)
+        if not keys:
+            del self._tagged[tag]
+
+    def get(self, key):
+        """Returns the cached response for key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[2] is None or entry[2] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                self._remove(key)  # Expired
+            self.misses += 1
+            return None
+
+    def ticket(self):
+        return self._sequence
+
+    def put(self, key, response, tag, ticket):
+        with self._lock:
+            if ticket < self._floor or self._invalidated.get(tag, 0) > ticket:
+                return  # The thread changed while the response was being computed
+            if key in self._entries:
+                self._remove(key)
+            expiry = None if self.ttl is None else time.monotonic() + self.ttl
+            self._entries[key] = (response, tag, expiry)
+            self._tagged.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, tag):
+        with self._lock:
+            self._sequence += 1
+            self._invalidated[tag] = self._sequence
+            self._invalidated.move_to_end(tag)
+            if len(self._invalidated) > self._max_invalidated:
+                _, self._floor = self._invalidated.popitem(last=False)
+            for key in list(self._tagged.get(tag, ())):
+                self._remove(key)
+                self.invalidations += 1
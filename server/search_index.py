@@ -0,0 +1,219 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+from array import array
+from collections import Counter, defaultdict
+
+TOKEN = re.compile(r"\w+")
+
+# BM25 parameters: K1 caps how much a repeated term counts, B how much longer documents are penalized
+K1 = 1.2
+B = 0.75
+
+# Largest term frequency a posting records
+MAX_FREQUENCY = 0xFFFF
+
+# Postings per block of a posting list
+BLOCK_SIZE = 128
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+def _contains(numbers, number):
+    position = bisect.bisect_left(numbers, number)
+    return position < len(numbers) and numbers[position] == number
+
+
+class _Postings:
+    """
+    Documents containing a term, with the term's frequency in each, in document order.
+    Postings are grouped in blocks of BLOCK_SIZE, each with the highest frequency and the
+    shortest document length in it, which bound the score of any document of the block.
+    """
+
+    __slots__ = ("numbers", "frequencies", "max_frequencies", "min_lengths")
+
+    def __init__(self):
+        self.numbers = array("I")
+        self.frequencies = array("H")
+        self.max_frequencies = array("H")
+        self.min_lengths = array("I")
+
+    def append(self, number, frequency, length):
+        # Block bounds first, then the posting, so a reader never sees a posting its block doesn't cover
+        if len(self.numbers) % BLOCK_SIZE == 0:
+            self.max_frequencies.append(frequency)
+            self.min_lengths.append(length)
+        else:
+            self.max_frequencies[-1] = max(self.max_frequencies[-1], frequency)
+            self.min_lengths[-1] = min(self.min_lengths[-1], length)
+        self.frequencies.append(frequency)
+        self.numbers.append(number)
+
+
+class SearchIndex:
+    """
+    Inverted index of text documents, ranked by BM25 and updated as documents are added.
+
+    Documents are numbered in the order they are added, so every posting list is append-only
+    and stays sorted without any work. A document may also carry tags and a scope (a post's
+    subreddit), which are kept as sorted lists of document numbers and filter the results.
+
+    A top-k search skips the blocks of postings whose score bound can't reach the k-th best
+    score found so far, and stops looking at new documents once the terms left can't lift
+    one into the top k (block-max MaxScore), so common terms cost little once rarer ones
+    have been scored.
+
+    add() is serialized by a lock; search() takes no lock, because a document's postings are
+    appended only after everything else about it is recorded.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}  # Term -> _Postings
+        self._tags = {}  # Tag -> array of document numbers
+        self._scopes = {}  # Scope -> array of document numbers
+        self._ids = []  # Document number -> ID
+        self._lengths = array("I")  # Document number -> number of terms
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, doc_id, text, tags=(), scope=None):
+        terms = Counter(tokenize(text))
+        for tag in tags:
+            terms.update(tokenize(tag))  # Tags match query words too
+        length = sum(terms.values())
+        with self._lock:
+            number = len(self._lengths)
+            self._ids.append(doc_id)
+            self._lengths.append(length)
+            self._total_length += length
+            for tag in set(tags):
+                self._tags.setdefault(tag, array("I")).append(number)
+            if scope is not None:
+                self._scopes.setdefault(scope, array("I")).append(number)
+            for term, frequency in terms.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = _Postings()
+                postings.append(number, min(frequency, MAX_FREQUENCY), length)
+
+    def search(self, query, count, tags=(), scope=None):
+        """
+        Returns up to count (score, ID) pairs of the documents matching any word of the query,
+        best BM25 score first, restricted to documents with all of the tags and of the scope
+        when given. An empty query matches every document that passes the filters, newest
+        first, with a score of 0.
+        """
+        if count <= 0:
+            return []
+        filters = [self._tags.get(tag) for tag in set(tags)]
+        if scope is not None:
+            filters.append(self._scopes.get(scope))
+        if None in filters:
+            return []
+        filters.sort(key=len)
+        terms = set(tokenize(query))
+
+        if not terms:
+            newest = reversed(filters[0]) if filters else range(len(self._lengths) - 1, -1, -1)
+            matches = (number for number in newest if all(_contains(other, number) for other in filters[1:]))
+            return [(0.0, self._ids[number]) for number, _ in zip(matches, range(count))]
+
+        documents = len(self._lengths)
+        average_length = max(self._total_length, 1) / max(documents, 1)
+        postings = [self._postings[term] for term in terms if term in self._postings]
+        if filters and len(filters[0]) < sum(len(term.numbers) for term in postings):
+            # The filters leave fewer documents than the postings hold: score just those
+            candidates = [number for number in filters[0] if all(_contains(other, number) for other in filters[1:])]
+            scores = self._score_candidates(postings, candidates, documents, average_length)
+        else:
+            # Pruning compares against the k-th best score, which only holds when every scored document qualifies
+            scores = self._score_postings(postings, count if not filters else None, documents, average_length)
+        matches = ((score, number) for number, score in scores.items()
+                   if all(_contains(numbers, number) for numbers in filters))
+        # Equal scores rank the newer document first
+        return [(score, self._ids[number]) for score, number in heapq.nlargest(count, matches)]
+
+    def _score_candidates(self, postings, candidates, documents, average_length):
+        lengths = self._lengths
+        scores = defaultdict(float)
+        for term in postings:
+            numbers, frequencies = term.numbers, term.frequencies
+            weight = _idf(documents, len(numbers)) * (K1 + 1)
+            for number in candidates:
+                position = bisect.bisect_left(numbers, number)
+                if position < len(numbers) and numbers[position] == number:
+                    frequency = frequencies[position]
+                    scores[number] += weight * frequency / (frequency + K1 * (1 - B + B * lengths[number] / average_length))
+        return scores
+
+    def _score_postings(self, postings, count, documents, average_length):
+        """
+        Returns document number -> score for the documents of the postings that may be in the
+        top count; the scores of those that end up there are exact. With count None, scores
+        every posting.
+        """
+        lengths = self._lengths
+        # Per term: its weight, the score bound of each block and of the whole term
+        terms = []
+        for term in postings:
+            weight = _idf(documents, len(term.numbers)) * (K1 + 1)
+            bounds = [weight * frequency / (frequency + K1 * (1 - B + B * length / average_length))
+                      for frequency, length in zip(term.max_frequencies, term.min_lengths)]
+            terms.append((max(bounds), weight, bounds, term))
+        terms.sort(key=lambda item: item[0], reverse=True)  # Rarest (highest bound) first
+
+        scores = {}
+        remaining = sum(item[0] for item in terms)
+        for bound, weight, bounds, term in terms:
+            remaining -= bound  # Now the most the terms after this one can add
+            threshold = 0.0
+            if count is not None and len(scores) >= count:
+                threshold = heapq.nlargest(count, scores.values())[-1]
+                # Drop the documents that can't reach the top any more; the rest are scored exactly from here
+                scores = {number: score for number, score in scores.items() if score + bound + remaining >= threshold}
+            carried = list(scores)
+            numbers, frequencies = term.numbers, term.frequencies
+            end = len(numbers)
+            # Visit the blocks best bound first, so the threshold rises early and the tail can be skipped
+            order = sorted(range(len(bounds)), key=bounds.__getitem__, reverse=True)
+            top = []  # Min-heap of the best new totals of this term, a lower bound of the k-th best score
+            skipped = set()
+            for position, block in enumerate(order):
+                if bounds[block] + remaining < threshold:
+                    skipped.update(order[position:])
+                    break
+                first = block * BLOCK_SIZE
+                last = min(first + BLOCK_SIZE, end)
+                for number, frequency in zip(numbers[first:last], frequencies[first:last]):
+                    total = scores.get(number, 0.0) + weight * frequency / (
+                        frequency + K1 * (1 - B + B * lengths[number] / average_length))
+                    scores[number] = total
+                    if count is None:
+                        continue
+                    if len(top) < count:
+                        heapq.heappush(top, total)
+                        if len(top) == count:
+                            threshold = max(threshold, top[0])
+                    elif total > top[0]:
+                        heapq.heapreplace(top, total)
+                        threshold = max(threshold, top[0])
+            if skipped:
+                # Documents scored by earlier terms still need this term's share if their block was skipped
+                for number in carried:
+                    position = bisect.bisect_left(numbers, number, 0, end)
+                    if position < end and numbers[position] == number and position // BLOCK_SIZE in skipped:
+                        frequency = frequencies[position]
+                        scores[number] += weight * frequency / (frequency + K1 * (1 - B + B * lengths[number] / average_length))
+        return scores
+
+
+def _idf(documents, containing):
+    return math.log(1 + (documents - containing + 0.5) / (containing + 0.5))
@@ -0,0 +1,241 @@
+import threading
+import uuid
+import zlib
+from collections import defaultdict
+
+import grpc
+
+import reddit_pb2
+import reddit_pb2_grpc
+from server.reddit_server import batch_status
+
+SERVICE = reddit_pb2.DESCRIPTOR.services_by_name['RedditService']
+
+# The ID each single-entity RPC is routed by. A post lives with its subreddit and a comment
+# with its parent, so a thread never spans shards and reads are always answered by one worker.
+ROUTING_KEYS = {
+    'CreatePost': lambda request: request.subreddit_id,
+    'VotePost': lambda request: request.post_id,
+    'GetPost': lambda request: request.post_id,
+    'CreateComment': lambda request: request.parent_post_id or request.parent_comment_id,
+    'VoteComment': lambda request: request.comment_id,
+    'GetTopCommentsUnderPost': lambda request: request.post_id,
+    'ExpandCommentBranch': lambda request: request.comment_id,
+    'StreamSubredditFeed': lambda request: request.subreddit_id,
+    'WatchPost': lambda request: request.post_id,
+    'GetPostThread': lambda request: request.post_id,
+}
+
+# Metadata on a search fanned out to the other shards, so that they answer from their own store
+SHARD_LOCAL_KEY = 'x-shard-local'
+
+# Seconds a forwarded call may take when its caller set no deadline, so that a worker thread
+# never waits on a peer for good
+FORWARD_TIMEOUT = 30
+
+
+def remaining_timeout(context, default=FORWARD_TIMEOUT):
+    # Calls without a deadline report an effectively infinite time remaining
+    remaining = context.time_remaining()
+    return remaining if remaining is not None and remaining < 1e6 else default
+
+
+def shard_of(entity_id, shards):
+    # Stable across processes, unlike hash()
+    return zlib.crc32(entity_id.encode()) % shards
+
+
+class ShardIds:
+    """ID factory for RedditService that places every new ID on the same shard as its affinity key."""
+
+    def __init__(self, shards):
+        self.shards = shards
+
+    def __call__(self, affinity=None):
+        target = shard_of(affinity or '', self.shards)
+        while True:
+            candidate = str(uuid.uuid4())
+            if shard_of(candidate, self.shards) == target:
+                return candidate
+
+
+class ShardRouter(reddit_pb2_grpc.RedditServiceServicer):
+    """
+    Front for one worker of a multi-process deployment.
+
+    Requests whose routing ID belongs to this worker's shard are handled by the local
+    RedditService; the rest are forwarded to the owning worker's internal port. Batches are
+    split per shard, forwarded concurrently and reassembled in request order.
+
+    A forwarding call holds a worker thread until the owner answers, and the owner answers
+    from the same kind of pool. At most max_forwards calls are forwarded at once, so that
+    with max_forwards below the pool size every worker keeps threads for the calls its peers
+    forward to it; past that, calls that need forwarding fail with RESOURCE_EXHAUSTED.
+    """
+
+    def __init__(self, service, shard, peer_addresses, max_forwards):
+        self.service = service
+        self.shard = shard
+        self.shards = len(peer_addresses)
+        self.peers = {owner: reddit_pb2_grpc.RedditServiceStub(grpc.insecure_channel(address))
+                      for owner, address in enumerate(peer_addresses) if owner != shard}
+        self._forward_slots = threading.BoundedSemaphore(max_forwards)
+
+    def _reserve_forward(self, context):
+        if self._forward_slots.acquire(blocking=False):
+            return True
+        context.set_code(grpc.StatusCode.RESOURCE_EXHAUSTED)
+        context.set_details('Too many calls waiting on other workers; retry later')
+        return False
+
+    def _route(self, name, request, context):
+        return self._call(shard_of(ROUTING_KEYS[name](request), self.shards), name, request, context)
+
+    def _call(self, owner, name, request, context):
+        if owner == self.shard:
+            return getattr(self.service, name)(request, context)
+        empty = getattr(reddit_pb2, SERVICE.methods_by_name[name].output_type.name)
+        if not self._reserve_forward(context):
+            return empty()
+        try:
+            return getattr(self.peers[owner], name)(request, timeout=remaining_timeout(context))
+        except grpc.RpcError as error:
+            context.set_code(error.code())
+            context.set_details(error.details())
+            return empty()
+        finally:
+            self._forward_slots.release()
+
+    def _route_stream(self, name, request, context):
+        owner = shard_of(ROUTING_KEYS[name](request), self.shards)
+        if owner == self.shard:
+            yield from getattr(self.service, name)(request, context)
+            return
+        if not self._reserve_forward(context):
+            return
+        try:
+            # Watchers stay open until they are cancelled, so only their caller's deadline applies
+            default = None if name == 'WatchPost' else FORWARD_TIMEOUT
+            call = getattr(self.peers[owner], name)(request, timeout=remaining_timeout(context, default))
+            context.add_callback(call.cancel)  # Stop the owner's stream if our client goes away
+            yield from call
+        except grpc.RpcError as error:
+            context.set_code(error.code())
+            context.set_details(error.details())
+        finally:
+            self._forward_slots.release()
+
+    def _scatter(self, name, items, key_of, build_request, results_field, failure, context):
+        groups = defaultdict(list)
+        for position, item in enumerate(items):
+            groups[shard_of(key_of(item), self.shards)].append(position)
+
+        forwards = groups.keys() - {self.shard}
+        # Checked before any part of the batch runs, so that a rejected batch is not half applied
+        if forwards and not self._reserve_forward(context):
+            return []
+        try:
+            remote = {owner: getattr(self.peers[owner], name).future(build_request([items[p] for p in positions]),
+                                                                    timeout=remaining_timeout(context))
+                      for owner, positions in groups.items() if owner in forwards}
+            results = [None] * len(items)
+            if self.shard in groups:
+                positions = groups[self.shard]
+                local = getattr(self.service, name)(build_request([items[p] for p in positions]), context)
+                for position, result in zip(positions, getattr(local, results_field)):
+                    results[position] = result
+            for owner, call in remote.items():
+                try:
+                    owner_results = getattr(call.result(), results_field)
+                except grpc.RpcError as error:
+                    owner_results = [failure(error)] * len(groups[owner])
+                for position, result in zip(groups[owner], owner_results):
+                    results[position] = result
+            return results
+        finally:
+            if forwards:
+                self._forward_slots.release()
+
+    def _search_all(self, name, request, context):
+        """
+        Runs a search on every shard and merges the results by score. Each shard scores with its
+        own term statistics, which differ little once shards hold more than a few documents.
+        """
+        if any(key == SHARD_LOCAL_KEY for key, _ in context.invocation_metadata()):
+            return getattr(self.service, name)(request, context)
+        if self.peers and not self._reserve_forward(context):
+            return getattr(reddit_pb2, SERVICE.methods_by_name[name].output_type.name)()
+        try:
+            remote = [getattr(peer, name).future(request, timeout=remaining_timeout(context),
+                                                 metadata=((SHARD_LOCAL_KEY, '1'),))
+                      for peer in self.peers.values()]
+            response = getattr(self.service, name)(request, context)
+            results = list(response.results)
+            for call in remote:
+                try:
+                    results.extend(call.result().results)
+                except grpc.RpcError as error:
+                    # A search that silently skipped a shard would look complete, so fail it instead
+                    context.set_code(error.code())
+                    context.set_details(error.details())
+                    return type(response)()
+            results.sort(key=lambda result: result.score, reverse=True)
+            return type(response)(results=results[:request.count])
+        finally:
+            if self.peers:
+                self._forward_slots.release()
+
+    def SearchPosts(self, request, context):
+        if request.subreddit_id:
+            # A subreddit's posts all live on the subreddit's shard
+            return self._call(shard_of(request.subreddit_id, self.shards), 'SearchPosts', request, context)
+        return self._search_all('SearchPosts', request, context)
+
+    def SearchComments(self, request, context):
+        return self._search_all('SearchComments', request, context)
+
+    def BatchGetPosts(self, request, context):
+        results = self._scatter('BatchGetPosts', list(request.post_ids), lambda post_id: post_id,
+                                lambda post_ids: reddit_pb2.BatchGetPostsRequest(post_ids=post_ids), 'results',
+                                lambda error: reddit_pb2.GetPostResult(status=batch_status(error.code(), error.details())),
+                                context)
+        return reddit_pb2.BatchGetPostsResponse(results=results)
+
+    def BatchVotePosts(self, request, context):
+        statuses = self._scatter('BatchVotePosts', list(request.votes), lambda vote: vote.post_id,
+                                 lambda votes: reddit_pb2.BatchVotePostsRequest(votes=votes), 'statuses',
+                                 lambda error: batch_status(error.code(), error.details()), context)
+        return reddit_pb2.BatchVotePostsResponse(statuses=statuses)
+
+    def BatchVoteComments(self, request, context):
+        statuses = self._scatter('BatchVoteComments', list(request.votes), lambda vote: vote.comment_id,
+                                 lambda votes: reddit_pb2.BatchVoteCommentsRequest(votes=votes), 'statuses',
+                                 lambda error: batch_status(error.code(), error.details()), context)
+        return reddit_pb2.BatchVoteCommentsResponse(statuses=statuses)
+
+    def BatchCreateComments(self, request, context):
+        results = self._scatter('BatchCreateComments', list(request.comments), ROUTING_KEYS['CreateComment'],
+                                lambda comments: reddit_pb2.BatchCreateCommentsRequest(comments=comments), 'results',
+                                lambda error: reddit_pb2.CreateCommentResult(
+                                    status=batch_status(error.code(), error.details())),
+                                context)
+        return reddit_pb2.BatchCreateCommentsResponse(results=results)
+
+
+def _routed_handler(name):
+    def handler(self, request, context):
+        return self._route(name, request, context)
+    handler.__name__ = name
+    return handler
+
+
+def _routed_stream_handler(name):
+    def handler(self, request, context):
+        yield from self._route_stream(name, request, context)
+    handler.__name__ = name
+    return handler
+
+
+for _name in ROUTING_KEYS:
+    _factory = _routed_stream_handler if SERVICE.methods_by_name[_name].server_streaming else _routed_handler
+    setattr(ShardRouter, _name, _factory(_name))
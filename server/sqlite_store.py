@@ -0,0 +1,492 @@
+import contextlib
+import queue
+import sqlite3
+import threading
+
+import reddit_pb2
+from server.ranking import confidence, controversial, created_at, created_seconds, hot
+from server.search_index import tokenize
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    post_id TEXT PRIMARY KEY,
+    title TEXT,
+    text TEXT,
+    author TEXT,
+    score INTEGER,
+    state TEXT,
+    publication_date TEXT,
+    subreddit_id TEXT,
+    tags TEXT);
+CREATE TABLE IF NOT EXISTS comments (
+    comment_id TEXT PRIMARY KEY,
+    text TEXT,
+    author TEXT,
+    score INTEGER,
+    status TEXT,
+    publication_date TEXT,
+    parent_post_id TEXT,
+    parent_comment_id TEXT,
+    has_replies BOOLEAN);
+CREATE TABLE IF NOT EXISTS subreddits (
+    subreddit_id TEXT PRIMARY KEY,
+    name TEXT,
+    visibility TEXT,
+    tags TEXT,
+    post_ids TEXT);
+CREATE INDEX IF NOT EXISTS idx_posts_subreddit ON posts (subreddit_id);
+CREATE INDEX IF NOT EXISTS idx_comments_parent_post ON comments (parent_post_id, score DESC);
+CREATE INDEX IF NOT EXISTS idx_comments_parent_comment ON comments (parent_comment_id, score DESC);
+"""
+
+# Columns added on top of the original reddit.db schema
+MIGRATIONS = {
+    "posts": {"image_url": "TEXT", "video_url": "TEXT", "hot": "REAL", "upvotes": "INTEGER NOT NULL DEFAULT 0",
+              "downvotes": "INTEGER NOT NULL DEFAULT 0", "created_at": "INTEGER NOT NULL DEFAULT 0",
+              "version": "INTEGER NOT NULL DEFAULT 0"},
+    "comments": {"upvotes": "INTEGER NOT NULL DEFAULT 0", "downvotes": "INTEGER NOT NULL DEFAULT 0",
+                 "created_at": "INTEGER NOT NULL DEFAULT 0", "hot": "REAL", "controversial": "REAL", "best": "REAL",
+                 "version": "INTEGER NOT NULL DEFAULT 0"},
+}
+
+# Fills in a migrated column for the rows that existed before it was added, in MIGRATIONS order.
+# Rows from before votes were counted separately take their score as all upvotes or all downvotes.
+BACKFILLS = {
+    ("posts", "hot"): "UPDATE posts SET hot = hot_rank(score, date_seconds(publication_date))",
+    ("posts", "upvotes"): "UPDATE posts SET upvotes = MAX(score, 0)",
+    ("posts", "downvotes"): "UPDATE posts SET downvotes = MAX(-score, 0)",
+    ("posts", "created_at"): "UPDATE posts SET created_at = date_seconds(publication_date)",
+    ("comments", "upvotes"): "UPDATE comments SET upvotes = MAX(score, 0)",
+    ("comments", "downvotes"): "UPDATE comments SET downvotes = MAX(-score, 0)",
+    ("comments", "created_at"): "UPDATE comments SET created_at = date_seconds(publication_date)",
+    ("comments", "hot"): "UPDATE comments SET hot = hot_rank(score, created_at)",
+    ("comments", "controversial"): "UPDATE comments SET controversial = controversial_rank(upvotes, downvotes)",
+    ("comments", "best"): "UPDATE comments SET best = confidence(upvotes, downvotes)",
+}
+
+# Indexes over migrated columns, created once the migrations have run
+MIGRATED_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_posts_subreddit_top ON posts (subreddit_id, score DESC);
+CREATE INDEX IF NOT EXISTS idx_posts_subreddit_hot ON posts (subreddit_id, hot DESC);
+CREATE INDEX IF NOT EXISTS idx_comments_parent_post_new ON comments (parent_post_id) WHERE parent_post_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_comments_parent_post_hot ON comments (parent_post_id, hot DESC)
+    WHERE parent_post_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_comments_parent_post_controversial ON comments (parent_post_id, controversial DESC)
+    WHERE parent_post_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_comments_parent_post_best ON comments (parent_post_id, best DESC)
+    WHERE parent_post_id IS NOT NULL;
+"""
+
+# FTS5 indexes over the posts and comments tables, filled in by triggers as rows are inserted.
+# Indexed columns are never updated and rows are never deleted, so inserts are all they track.
+SEARCH_SCHEMAS = {
+    "posts_fts": """
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(title, text, tags, content='posts', content_rowid='rowid');
+CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN
+    INSERT INTO posts_fts (rowid, title, text, tags) VALUES (new.rowid, new.title, new.text, new.tags);
+END;
+""",
+    "comments_fts": """
+CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts USING fts5(text, content='comments', content_rowid='rowid');
+CREATE TRIGGER IF NOT EXISTS comments_fts_insert AFTER INSERT ON comments BEGIN
+    INSERT INTO comments_fts (rowid, text) VALUES (new.rowid, new.text);
+END;
+""",
+}
+
+# Column each ranked feed order sorts by; ties, and the NEW order, fall back to creation (rowid) order
+FEED_COLUMNS = {reddit_pb2.TOP: "score", reddit_pb2.HOT: "hot"}
+
+# Column each order of a post's top-level comments sorts by, likewise
+COMMENT_ORDER_COLUMNS = {reddit_pb2.TOP: "score", reddit_pb2.HOT: "hot", reddit_pb2.CONTROVERSIAL: "controversial",
+                         reddit_pb2.BEST: "best"}
+
+POST_COLUMNS = ("post_id, title, text, author, score, state, publication_date, subreddit_id, tags, image_url, video_url, "
+                "upvotes, downvotes, version, created_at")
+COMMENT_COLUMNS = ("comment_id, text, author, score, status, publication_date, parent_post_id, parent_comment_id, "
+                   "has_replies, upvotes, downvotes, version, created_at")
+
+# The same columns, for queries that join them with an FTS5 table
+QUALIFIED_POST_COLUMNS = ", ".join(f"posts.{column}" for column in POST_COLUMNS.split(", "))
+QUALIFIED_COMMENT_COLUMNS = ", ".join(f"comments.{column}" for column in COMMENT_COLUMNS.split(", "))
+
+# SQLite caps the number of bound parameters per statement
+MAX_PARAMS = 900
+
+
+def match_expression(query):
+    """Returns an FTS5 query matching any word of query, tokenized like the in-memory index, or "" if it has none."""
+    return " OR ".join(f'"{term}"' for term in dict.fromkeys(tokenize(query)))
+
+
+def _date_seconds(publication_date):
+    return int(created_seconds(publication_date or ""))
+
+
+def add_functions(connection):
+    """Registers the SQL functions that the schema's backfills and rank columns are computed with."""
+    connection.create_function("hot_rank", 2, hot, deterministic=True)
+    connection.create_function("controversial_rank", 2, controversial, deterministic=True)
+    connection.create_function("confidence", 2, confidence, deterministic=True)
+    connection.create_function("date_seconds", 1, _date_seconds, deterministic=True)
+
+
+def _placeholders(count):
+    return ", ".join("?" * count)
+
+
+def _join(values):
+    return ",".join(values)
+
+
+def _split(value):
+    return value.split(",") if value else []
+
+
+def post_to_row(post):
+    return (post.post_id, post.title, post.text, post.author, post.score, reddit_pb2.Post.State.Name(post.state),
+            post.publication_date, post.subreddit_id, _join(post.tags),
+            post.image_url if post.HasField("image_url") else None,
+            post.video_url if post.HasField("video_url") else None,
+            post.upvotes, post.downvotes, post.version, created_at(post))
+
+
+def post_from_row(row):
+    (post_id, title, text, author, score, state, publication_date, subreddit_id, tags, image_url, video_url,
+     upvotes, downvotes, version, created) = row
+    post = reddit_pb2.Post(post_id=post_id, title=title, text=text, author=author, score=score,
+                           state=reddit_pb2.Post.State.Value(state or "NORMAL"), publication_date=publication_date,
+                           subreddit_id=subreddit_id, tags=_split(tags), upvotes=upvotes, downvotes=downvotes,
+                           version=version, created_at=created)
+    if image_url is not None:
+        post.image_url = image_url
+    elif video_url is not None:
+        post.video_url = video_url
+    return post
+
+
+def comment_to_row(comment):
+    return (comment.comment_id, comment.text, comment.author, comment.score,
+            reddit_pb2.Comment.Status.Name(comment.status), comment.publication_date,
+            comment.parent_post_id if comment.HasField("parent_post_id") else None,
+            comment.parent_comment_id if comment.HasField("parent_comment_id") else None,
+            comment.has_replies, comment.upvotes, comment.downvotes, comment.version, created_at(comment))
+
+
+def comment_from_row(row):
+    (comment_id, text, author, score, status, publication_date, parent_post_id, parent_comment_id, has_replies,
+     upvotes, downvotes, version, created) = row
+    comment = reddit_pb2.Comment(comment_id=comment_id, text=text, author=author, score=score,
+                                 status=reddit_pb2.Comment.Status.Value(status or "NORMAL"),
+                                 publication_date=publication_date, has_replies=bool(has_replies),
+                                 upvotes=upvotes, downvotes=downvotes, version=version, created_at=created)
+    if parent_post_id is not None:
+        comment.parent_post_id = parent_post_id
+    elif parent_comment_id is not None:
+        comment.parent_comment_id = parent_comment_id
+    return comment
+
+
+def subreddit_from_row(row):
+    subreddit_id, name, visibility, tags, post_ids = row
+    return reddit_pb2.Subreddit(subreddit_id=subreddit_id, name=name,
+                                visibility=reddit_pb2.Subreddit.Visibility.Value(visibility or "PUBLIC"),
+                                tags=_split(tags), post_ids=_split(post_ids))
+
+
+class _PendingWrite:
+    __slots__ = ("apply", "done", "result", "error")
+
+    def __init__(self, apply):
+        self.apply = apply
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SQLiteStore:
+    """
+    Store backed by an SQLite database using the reddit.db schema.
+
+    The database runs in WAL mode so readers (one connection per server thread) never block
+    the writer. All writes go through a queue drained by a single writer thread, which
+    applies everything that is waiting in one transaction (group commit). Callers block
+    until their write is committed, so a write is visible to every later read.
+
+    Posts are searchable through an FTS5 index, and comments too when search_comments is set.
+    """
+
+    def __init__(self, path="reddit.db", max_batch=512, search_comments=False):
+        self.path = path
+        self.max_batch = max_batch
+        self.search_comments_enabled = search_comments
+        self._local = threading.local()
+        self._queue = queue.Queue()
+
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        for table, columns in MIGRATIONS.items():
+            existing = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+            for column, column_type in columns.items():
+                if column not in existing:
+                    connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                    if (table, column) in BACKFILLS:
+                        connection.execute(BACKFILLS[table, column])
+        connection.executescript(MIGRATED_INDEXES)
+        for table in ("posts_fts", "comments_fts") if search_comments else ("posts_fts",):
+            exists = connection.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (table,)).fetchone()
+            connection.executescript(SEARCH_SCHEMAS[table])
+            if not exists:
+                # Index the rows of a database created before the index was
+                connection.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+        self._writer = threading.Thread(target=self._run_writer, args=(connection,), daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        # Autocommit mode: transactions are opened explicitly by the writer
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA busy_timeout=5000")
+        add_functions(connection)
+        return connection
+
+    def _reader(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def _run_writer(self, connection):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            writes = [write for write in batch if write is not None]
+
+            try:
+                self._apply_group(connection, writes)
+            except Exception as error:  # The writer must outlive any failure, or every later write would hang
+                if connection.in_transaction:
+                    with contextlib.suppress(sqlite3.Error):
+                        connection.execute("ROLLBACK")
+                for write in writes:
+                    write.error = error
+            finally:
+                for write in writes:
+                    write.done.set()
+
+            if len(writes) < len(batch):  # close() was called
+                connection.close()
+                return
+
+    @staticmethod
+    def _apply_group(connection, writes):
+        connection.execute("BEGIN")
+        for write in writes:
+            # A savepoint per write keeps one failing write from undoing the rest of the group
+            connection.execute("SAVEPOINT pending_write")
+            try:
+                write.result = write.apply(connection)
+            except Exception as error:  # Not just sqlite3.Error: a bad row may raise TypeError or ValueError
+                connection.execute("ROLLBACK TO pending_write")
+                write.error = error
+            connection.execute("RELEASE pending_write")
+        connection.execute("COMMIT")
+
+    def _write(self, apply):
+        write = _PendingWrite(apply)
+        self._queue.put(write)
+        write.done.wait()
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+
+    # Posts and subreddits
+
+    @staticmethod
+    def _insert_posts(connection, new_posts):
+        rows = [post_to_row(post) for post in new_posts]
+        connection.executemany(f"INSERT INTO posts ({POST_COLUMNS}, hot) VALUES ({_placeholders(len(POST_COLUMNS.split(', ')) + 1)})",
+                               [row + (hot(post.score, row[-1]),) for post, row in zip(new_posts, rows)])
+        # A subreddit's post list is read from posts.subreddit_id, so only new subreddits are written
+        connection.executemany("INSERT OR IGNORE INTO subreddits VALUES (?, '', 'PUBLIC', '', '')",
+                               [(subreddit_id,) for subreddit_id in {post.subreddit_id for post in new_posts}])
+
+    def sizes(self):
+        # Rows are never deleted, so the largest rowid counts them without scanning the table
+        return {table: self._reader().execute(f"SELECT IFNULL(MAX(rowid), 0) FROM {table}").fetchone()[0]
+                for table in ("posts", "comments", "subreddits")}
+
+    def add_post(self, post):
+        self._write(lambda connection: self._insert_posts(connection, [post]))
+
+    def get_post(self, post_id):
+        row = self._reader().execute(f"SELECT {POST_COLUMNS} FROM posts WHERE post_id = ?", (post_id,)).fetchone()
+        return None if row is None else post_from_row(row)
+
+    def get_posts(self, post_ids):
+        found = {}
+        for start in range(0, len(post_ids), MAX_PARAMS):
+            chunk = post_ids[start:start + MAX_PARAMS]
+            rows = self._reader().execute(f"SELECT {POST_COLUMNS} FROM posts WHERE post_id IN "
+                                          f"({', '.join('?' * len(chunk))})", chunk)
+            found.update((row[0], post_from_row(row)) for row in rows)
+        return [found.get(post_id) for post_id in post_ids]
+
+    @staticmethod
+    def _apply_votes(connection, table, id_column, votes, rerank=""):
+        # The right-hand sides of an UPDATE see the old values, so ranks are computed from the old values plus the votes
+        statement = (f"UPDATE {table} SET upvotes = upvotes + ?1, downvotes = downvotes + ?2, score = score + ?1 - ?2, "
+                     f"version = version + ?1 + ?2{rerank} WHERE {id_column} = ?3 "
+                     f"RETURNING score, upvotes, downvotes, version")
+        updates = []
+        for item_id, upvotes, downvotes in votes:
+            row = connection.execute(statement, (upvotes, downvotes, item_id)).fetchone()
+            updates.append(None if row is None else reddit_pb2.ScoreUpdate(
+                id=item_id, score=row[0], upvotes=row[1], downvotes=row[2], version=row[3]))
+        return updates
+
+    def vote_post(self, post_id, upvotes, downvotes):
+        return self.vote_posts([(post_id, upvotes, downvotes)])[0]
+
+    def vote_posts(self, votes):
+        # Keep the stored hot rank in step with the score, so the feed index stays ordered
+        return self._write(lambda connection: self._apply_votes(
+            connection, "posts", "post_id", votes, rerank=", hot = hot_rank(score + ?1 - ?2, created_at)"))
+
+    def get_subreddit(self, subreddit_id):
+        # The post_ids column is left as it was: rewriting it on every post would grow quadratically
+        reader = self._reader()
+        row = reader.execute("SELECT subreddit_id, name, visibility, tags, '' FROM subreddits WHERE subreddit_id = ?",
+                             (subreddit_id,)).fetchone()
+        if row is None:
+            return None
+        subreddit = subreddit_from_row(row)
+        subreddit.post_ids.extend(post_id for post_id, in reader.execute(
+            "SELECT post_id FROM posts WHERE subreddit_id = ? ORDER BY rowid", (subreddit_id,)))
+        return subreddit
+
+    def feed_page(self, subreddit_id, sort, count, after=None):
+        """
+        Returns up to count (key, post) pairs of a subreddit in the given SortOrder, continuing
+        after the post whose key is `after`. Keys are (-rank, rowid) pairs, or (0, rowid) for NEW;
+        raises ValueError for a key with a negative rowid, which no post has.
+        """
+        if after is not None and after[1] < 0:
+            raise ValueError(f"no post has rowid {after[1]}")
+        if count <= 0:
+            return []
+        params = {"subreddit_id": subreddit_id, "count": count}
+        if sort == reddit_pb2.NEW:
+            rank, keyset, order = "0", "rowid < :seq", "rowid DESC"
+        else:
+            column = FEED_COLUMNS[sort]
+            # Seek past the previous page through the (subreddit_id, column DESC) index
+            rank, keyset, order = (f"-{column}", f"({column} < :rank OR ({column} = :rank AND rowid > :seq))",
+                                   f"{column} DESC, rowid")
+        where = "subreddit_id = :subreddit_id"
+        if after is not None:
+            where += f" AND {keyset}"
+            params.update(rank=-after[0], seq=after[1])
+        rows = self._reader().execute(f"SELECT {rank}, rowid, {POST_COLUMNS} FROM posts WHERE {where} "
+                                      f"ORDER BY {order} LIMIT :count", params)
+        return [((row[0], row[1]), post_from_row(row[2:])) for row in rows]
+
+    def _search(self, table, columns, query, count, where=(), params=()):
+        # Returns the (score, row) pairs of the best matches, newest first on equal scores
+        if count <= 0:
+            return []
+        expression = match_expression(query)
+        if not expression:
+            conditions = " AND ".join(where) or "1"
+            rows = self._reader().execute(f"SELECT 0.0, {columns} FROM {table} WHERE {conditions} "
+                                          f"ORDER BY {table}.rowid DESC LIMIT ?", (*params, count))
+        else:
+            conditions = " AND ".join((f"{table}_fts MATCH ?", *where))
+            rows = self._reader().execute(f"SELECT -bm25({table}_fts), {columns} FROM {table}_fts "
+                                          f"JOIN {table} ON {table}.rowid = {table}_fts.rowid WHERE {conditions} "
+                                          f"ORDER BY bm25({table}_fts), {table}.rowid DESC LIMIT ?",
+                                          (expression, *params, count))
+        return [(row[0], row[1:]) for row in rows]
+
+    def search_posts(self, query, count, tags=(), subreddit_id=None):
+        """Returns up to count (score, post) pairs of the posts best matching the query, ranked by FTS5's BM25."""
+        where, params = [], []
+        if subreddit_id:
+            where.append("posts.subreddit_id = ?")
+            params.append(subreddit_id)
+        for tag in set(tags):
+            where.append("instr(',' || posts.tags || ',', ?) > 0")
+            params.append(f",{tag},")
+        return [(score, post_from_row(row))
+                for score, row in self._search("posts", QUALIFIED_POST_COLUMNS, query, count, where, params)]
+
+    # Comments
+
+    @staticmethod
+    def _insert_comments(connection, new_comments):
+        rows = [comment_to_row(comment) for comment in new_comments]
+        connection.executemany(f"INSERT INTO comments ({COMMENT_COLUMNS}, hot, controversial, best) "
+                               f"VALUES ({_placeholders(len(COMMENT_COLUMNS.split(', ')) + 3)})",
+                               [row + (hot(comment.score, row[-1]), controversial(comment.upvotes, comment.downvotes),
+                                       confidence(comment.upvotes, comment.downvotes))
+                                for comment, row in zip(new_comments, rows)])
+        # Update the has_replies field of the parent comments; gaining replies is a new version of a comment
+        connection.executemany("UPDATE comments SET has_replies = 1, version = version + 1 "
+                               "WHERE comment_id = ? AND NOT has_replies",
+                               [(comment.parent_comment_id,) for comment in new_comments
+                                if comment.HasField("parent_comment_id")])
+
+    def add_comment(self, comment):
+        self.add_comments([comment])
+
+    def add_comments(self, new_comments):
+        self._write(lambda connection: self._insert_comments(connection, new_comments))
+
+    def get_comment(self, comment_id):
+        row = self._reader().execute(f"SELECT {COMMENT_COLUMNS} FROM comments WHERE comment_id = ?",
+                                     (comment_id,)).fetchone()
+        return None if row is None else comment_from_row(row)
+
+    def vote_comment(self, comment_id, upvotes, downvotes):
+        return self.vote_comments([(comment_id, upvotes, downvotes)])[0]
+
+    def vote_comments(self, votes):
+        return self._write(lambda connection: self._apply_votes(
+            connection, "comments", "comment_id", votes,
+            rerank=", hot = hot_rank(score + ?1 - ?2, created_at), "
+                   "controversial = controversial_rank(upvotes + ?1, downvotes + ?2), "
+                   "best = confidence(upvotes + ?1, downvotes + ?2)"))
+
+    def search_comments(self, query, count):
+        """Returns up to count (score, comment) pairs of the comments best matching the query, or None if comments aren't indexed."""
+        if not self.search_comments_enabled:
+            return None
+        return [(score, comment_from_row(row))
+                for score, row in self._search("comments", QUALIFIED_COMMENT_COLUMNS, query, count)]
+
+    def _top_children(self, parent_column, parent_id, count, order="score DESC, rowid"):
+        if count <= 0:
+            return []
+        # Equal ranks come back in insertion (rowid) order, matching the in-memory index
+        rows = self._reader().execute(f"SELECT {COMMENT_COLUMNS} FROM comments WHERE {parent_column} = ? "
+                                      f"ORDER BY {order} LIMIT ?", (parent_id, count))
+        return [comment_from_row(row) for row in rows]
+
+    def top_comments(self, post_id, count, sort=reddit_pb2.TOP):
+        """Returns the post's top-level comments in the given SortOrder."""
+        if sort == reddit_pb2.NEW:
+            return self._top_children("parent_post_id", post_id, count, "rowid DESC")
+        column = COMMENT_ORDER_COLUMNS.get(sort, "score")
+        return self._top_children("parent_post_id", post_id, count, f"{column} DESC, rowid")
+
+    def top_replies(self, comment_id, count):
+        return self._top_children("parent_comment_id", comment_id, count)
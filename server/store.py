@@ -0,0 +1,338 @@
+import threading
+from collections import defaultdict
+
+import reddit_pb2
+from server.comment_table import CommentTable, pack_id
+from server.ranked_index import RankedIndex
+from server.ranking import confidence, controversial, created_at, hot
+from server.search_index import SearchIndex
+
+
+class InMemoryStore:
+    """
+    Thread-safe in-memory storage for posts, comments and subreddits.
+
+    Mutations are guarded by a fixed set of lock stripes selected by ID hash, so writers
+    touching unrelated entities rarely share a lock while read-modify-write updates on the
+    same entity are serialized. A post is striped by its own ID; a comment is striped by its
+    parent's ID, because a vote re-orders the comment among its siblings in the reply index.
+
+    Comments are kept in a compact CommentTable and indexed by row, so get_comment() and the
+    top_* reads return fresh Comment messages rather than the stored state. A post's top-level
+    comments are indexed by score up front; the first read of them in another order builds
+    that order's index for the post, which votes and new comments then keep up to date.
+
+    Posts are indexed for search by title, text and tags, and comments by text when
+    search_comments is set.
+
+    When a MutationLog is attached, every mutation is appended to it while the stripe is held
+    and the call returns once the record is durable.
+
+    With an EntityEncoder, the encoded_* reads return posts and comments serialized from its
+    cached encodings, without building messages.
+    """
+
+    def __init__(self, lock_stripes=256, log=None, search_comments=False, encoder=None):
+        self._stripes = [threading.Lock() for _ in range(lock_stripes)]
+        self.log = log
+        self.encoder = encoder
+        self.posts = {}
+        self.comments = CommentTable()
+        self.subreddits = {}
+        # Comment rows grouped by parent post ID / packed parent comment ID, kept in descending score order
+        self.post_comments = RankedIndex()
+        self.comment_replies = RankedIndex()
+        # Top-level comment rows grouped by post in the other SortOrders, with the posts whose group is built
+        self.comment_orders = {sort: (RankedIndex(), set())
+                               for sort in (reddit_pb2.HOT, reddit_pb2.NEW, reddit_pb2.CONTROVERSIAL, reddit_pb2.BEST)}
+        # Post IDs grouped by subreddit in TOP and HOT order; NEW order is the subreddit's post_ids
+        self.subreddit_top = RankedIndex()
+        self.subreddit_hot = RankedIndex()
+        # Posts by title, text and tags, scoped by subreddit; comment rows by text
+        self.post_search = SearchIndex()
+        self.comment_search = SearchIndex() if search_comments else None
+
+    def _lock(self, key):
+        return self._stripes[hash(key) % len(self._stripes)]
+
+    def _group_by_lock(self, keyed_items):
+        # Batch helpers take each stripe once for all of the items that map to it
+        groups = defaultdict(list)
+        for key, item in keyed_items:
+            groups[self._lock(key)].append(item)
+        return groups.items()
+
+    def _record(self, **mutation):
+        # Called with the entity's stripe held, so one entity's records are logged in apply order
+        if self.log is None:
+            return 0
+        return self.log.append(reddit_pb2.StoreMutation(**mutation))
+
+    def _sync(self, position):
+        if position:
+            self.log.wait(position)
+
+    def _index_post(self, post):
+        self.post_search.add(post.post_id, f"{post.title}\n{post.text}", post.tags, post.subreddit_id)
+
+    def _index_comment(self, row, comment):
+        if self.comment_search is not None:
+            self.comment_search.add(row, comment.text)
+
+    def _index_of(self, row):
+        return self.post_comments if self.comments.parent_is_post(row) else self.comment_replies
+
+    def _comment_rank(self, sort, row):
+        if sort == reddit_pb2.NEW:
+            return row  # Rows are numbered in creation order
+        if sort == reddit_pb2.HOT:
+            return hot(self.comments.score(row), self.comments.created(row))
+        if sort == reddit_pb2.CONTROVERSIAL:
+            return controversial(*self.comments.vote_counts(row))
+        return confidence(*self.comments.vote_counts(row))
+
+    def _rerank_comment(self, row):
+        # Called with the parent's stripe held, like every change to a post's comment groups
+        self._index_of(row).update(row, self.comments.score(row))
+        for sort, (index, _) in self.comment_orders.items():
+            if row in index:
+                index.update(row, self._comment_rank(sort, row))
+
+    def load(self, posts=(), comments=(), subreddits=()):
+        """Bulk-inserts posts and comments, in creation order, into a store that isn't serving yet."""
+        for subreddit in subreddits:
+            self.subreddits[subreddit.subreddit_id] = subreddit
+        for post in posts:
+            self.posts[post.post_id] = post
+            if post.subreddit_id not in self.subreddits:
+                self.subreddits[post.subreddit_id] = reddit_pb2.Subreddit(subreddit_id=post.subreddit_id, post_ids=[])
+            self.subreddits[post.subreddit_id].post_ids.append(post.post_id)
+        self.subreddit_top.add_many((post.subreddit_id, post.post_id, post.score) for post in posts)
+        self.subreddit_hot.add_many((post.subreddit_id, post.post_id, hot(post.score, created_at(post)))
+                                    for post in posts)
+        for post in posts:
+            self._index_post(post)
+
+        # Build the parent indexes with one sort per parent instead of one insert per comment
+        post_children, comment_children = [], []
+        for comment in comments:
+            parent = self.comments.parent_key(comment)
+            row = self.comments.add(comment, parent)
+            self._index_comment(row, comment)
+            children = post_children if comment.HasField("parent_post_id") else comment_children
+            children.append((parent, row, comment.score))
+        self.post_comments.add_many(post_children)
+        self.comment_replies.add_many(comment_children)
+        for parent, _, _ in comment_children:
+            parent_row = self.comments.packed_row(parent)
+            if parent_row is not None:
+                self.comments.set_has_replies(parent_row)
+
+    def sizes(self):
+        return {"posts": len(self.posts), "comments": len(self.comments), "subreddits": len(self.subreddits)}
+
+    # Posts and subreddits
+
+    def add_post(self, post):
+        with self._lock(post.post_id):
+            self.posts[post.post_id] = post
+            position = self._record(post=post)
+        with self._lock(post.subreddit_id):
+            # Create the associated subreddit if it doesn't exist
+            if post.subreddit_id not in self.subreddits:
+                self.subreddits[post.subreddit_id] = reddit_pb2.Subreddit(subreddit_id=post.subreddit_id, post_ids=[])
+            self.subreddits[post.subreddit_id].post_ids.append(post.post_id)
+            # Read the score here, so a vote that raced ahead of the indexing is not lost
+            self.subreddit_top.add(post.subreddit_id, post.post_id, post.score)
+            self.subreddit_hot.add(post.subreddit_id, post.post_id, hot(post.score, created_at(post)))
+        self._index_post(post)
+        self._sync(position)
+
+    def get_post(self, post_id):
+        return self.posts.get(post_id)
+
+    def vote_post(self, post_id, upvotes, downvotes):
+        """Adds votes to the post and returns its new ScoreUpdate, or None if the post doesn't exist."""
+        return self.vote_posts([(post_id, upvotes, downvotes)])[0]
+
+    def encoded_post(self, post_id):
+        post = self.posts.get(post_id)
+        return None if post is None else self.encoder.post(post)
+
+    def get_posts(self, post_ids):
+        return [self.posts.get(post_id) for post_id in post_ids]
+
+    def vote_posts(self, votes):
+        """
+        Applies (post_id, upvotes, downvotes) triples and returns the post's new ScoreUpdate for
+        each one, or None where the post doesn't exist. A triple bumps the post's version once per vote it
+        carries, so votes batched into one triple advance it as far as separate ones would.
+        """
+        updates = [None] * len(votes)
+        found = [(post_id, (position, self.posts[post_id], upvotes, downvotes))
+                 for position, (post_id, upvotes, downvotes) in enumerate(votes) if post_id in self.posts]
+        log_position = 0
+        for lock, group in self._group_by_lock(found):
+            with lock:
+                for position, post, upvotes, downvotes in group:
+                    post.upvotes += upvotes
+                    post.downvotes += downvotes
+                    post.score += upvotes - downvotes
+                    post.version += upvotes + downvotes
+                    update = updates[position] = reddit_pb2.ScoreUpdate(
+                        id=post.post_id, score=post.score, upvotes=post.upvotes, downvotes=post.downvotes,
+                        version=post.version)
+                    log_position = self._record(post_score=update)
+        self._rerank_posts({post.post_id: post for _, (_, post, _, _) in found}.values())
+        self._sync(log_position)
+        return updates
+
+    def _rerank_posts(self, voted_posts):
+        # The feed indexes are guarded by the subreddit's stripe. Each update reads the current
+        # score under that stripe, so the last update of a post always leaves it correctly ranked.
+        for lock, group in self._group_by_lock((post.subreddit_id, post) for post in voted_posts):
+            with lock:
+                for post in group:
+                    if post.post_id in self.subreddit_top:  # Not yet indexed: add_post will read the score
+                        self.subreddit_top.update(post.post_id, post.score)
+                        self.subreddit_hot.update(post.post_id, hot(post.score, created_at(post)))
+
+    def feed_page(self, subreddit_id, sort, count, after=None):
+        """
+        Returns up to count (key, post) pairs of a subreddit in the given SortOrder, continuing
+        after the post whose key is `after`. Keys are (rank, seq) pairs that only have meaning
+        to the store; raises ValueError for a key the store couldn't have returned.
+        """
+        if sort == reddit_pb2.NEW:
+            # Newest first: walk the subreddit's post_ids backwards, keyed by list position
+            with self._lock(subreddit_id):
+                subreddit = self.subreddits.get(subreddit_id)
+                if subreddit is None or count <= 0:
+                    return []
+                end = len(subreddit.post_ids) if after is None else int(after[1])
+                if not 0 <= end <= len(subreddit.post_ids):
+                    raise ValueError(f"no post at position {end} of subreddit {subreddit_id}")
+                page = [((0, position), subreddit.post_ids[position])
+                        for position in range(end - 1, max(end - count, 0) - 1, -1)]
+        else:
+            index = self.subreddit_hot if sort == reddit_pb2.HOT else self.subreddit_top
+            with self._lock(subreddit_id):
+                page = index.page(subreddit_id, count, after)
+        return [(key, self.posts[post_id]) for key, post_id in page]
+
+    def get_subreddit(self, subreddit_id):
+        return self.subreddits.get(subreddit_id)
+
+    def search_posts(self, query, count, tags=(), subreddit_id=None):
+        """Returns up to count (score, post) pairs of the posts best matching the query; see SearchIndex.search."""
+        return [(score, self.posts[post_id])
+                for score, post_id in self.post_search.search(query, count, tags, subreddit_id or None)]
+
+    # Comments
+
+    def add_comment(self, comment):
+        self.add_comments([comment])
+
+    def add_comments(self, new_comments):
+        keyed = []
+        for comment in new_comments:
+            parent = self.comments.parent_key(comment)
+            keyed.append((parent, (parent, comment)))
+        log_position = 0
+        for lock, additions in self._group_by_lock(keyed):
+            with lock:
+                for parent, comment in additions:
+                    row = self.comments.add(comment, parent)
+                    self._index_of(row).add(parent, row, comment.score)
+                    if comment.HasField("parent_post_id"):
+                        for sort, (index, built) in self.comment_orders.items():
+                            if parent in built:
+                                index.add(parent, row, self._comment_rank(sort, row))
+                    self._index_comment(row, comment)
+                    log_position = self._record(comment=comment)
+        self._sync(log_position)
+        # Update the has_replies field of the parent comments, under the stripe their votes take
+        replied = []
+        for parent, comment in (item for _, item in keyed):
+            if comment.HasField("parent_comment_id"):
+                parent_row = self.comments.packed_row(parent)
+                if parent_row is not None:
+                    replied.append((self.comments.parent(parent_row), parent_row))
+        for lock, parent_rows in self._group_by_lock(replied):
+            with lock:
+                for parent_row in parent_rows:
+                    self.comments.set_has_replies(parent_row)
+
+    def get_comment(self, comment_id):
+        return self.comments.get(comment_id)
+
+    def vote_comment(self, comment_id, upvotes, downvotes):
+        """Adds votes to the comment and returns its new ScoreUpdate, or None if the comment doesn't exist."""
+        return self.vote_comments([(comment_id, upvotes, downvotes)])[0]
+
+    def vote_comments(self, votes):
+        """
+        Applies (comment_id, upvotes, downvotes) triples and returns the comment's new ScoreUpdate
+        for each one, or None where the comment doesn't exist. Versions advance as in vote_posts.
+        """
+        updates = [None] * len(votes)
+        keyed = []
+        for position, (comment_id, upvotes, downvotes) in enumerate(votes):
+            row = self.comments.row(comment_id)
+            if row is not None:
+                keyed.append((self.comments.parent(row), (position, comment_id, row, upvotes, downvotes)))
+        log_position = 0
+        for lock, group in self._group_by_lock(keyed):
+            with lock:
+                for position, comment_id, row, upvotes, downvotes in group:
+                    score = self.comments.vote(row, upvotes, downvotes)
+                    # Keep the comment's position among its siblings in sync with its new votes
+                    self._rerank_comment(row)
+                    ups, downs = self.comments.votes(row)
+                    update = updates[position] = reddit_pb2.ScoreUpdate(
+                        id=comment_id, score=score, upvotes=ups, downvotes=downs, version=self.comments.version(row))
+                    log_position = self._record(comment_score=update)
+        self._sync(log_position)
+        return updates
+
+    def search_comments(self, query, count):
+        """Returns up to count (score, comment) pairs of the comments best matching the query, or None if comments aren't indexed."""
+        if self.comment_search is None:
+            return None
+        return [(score, self.comments.materialize(row)) for score, row in self.comment_search.search(query, count)]
+
+    def _top_comment_rows(self, post_id, count, sort):
+        if sort not in self.comment_orders:
+            with self._lock(post_id):
+                return self.post_comments.top(post_id, count)
+        index, built = self.comment_orders[sort]
+        with self._lock(post_id):
+            if post_id not in built:
+                # In row order, so equal ranks leave the older comment first
+                rows = sorted(self.post_comments.top(post_id, self.post_comments.count(post_id)))
+                index.add_many((post_id, row, self._comment_rank(sort, row)) for row in rows)
+                built.add(post_id)
+            return index.top(post_id, count)
+
+    def _top_reply_rows(self, comment_id, count):
+        parent = pack_id(comment_id)
+        with self._lock(parent):
+            return self.comment_replies.top(parent, count)
+
+    def _encoded_rows(self, rows):
+        # (comment ID, encoding) pairs; the ID lets callers walk on down the thread
+        return [(self.comments.comment_id(row), self.encoder.comment_row(self.comments, row)) for row in rows]
+
+    def top_comments(self, post_id, count, sort=reddit_pb2.TOP):
+        """Returns the post's top-level comments in the given SortOrder; TOP unless sort is HOT, NEW, CONTROVERSIAL or BEST."""
+        return [self.comments.materialize(row) for row in self._top_comment_rows(post_id, count, sort)]
+
+    def top_replies(self, comment_id, count):
+        return [self.comments.materialize(row) for row in self._top_reply_rows(comment_id, count)]
+
+    def encoded_top_comments(self, post_id, count, sort=reddit_pb2.TOP):
+        """Returns (comment ID, encoding) pairs of the comments top_comments returns."""
+        return self._encoded_rows(self._top_comment_rows(post_id, count, sort))
+
+    def encoded_top_replies(self, comment_id, count):
+        return self._encoded_rows(self._top_reply_rows(comment_id, count))
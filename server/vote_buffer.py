@@ -0,0 +1,252 @@
+import copy
+import threading
+from collections import defaultdict
+
+import reddit_pb2
+
+
+# The kinds of entity the buffer holds votes for
+KINDS = ('post', 'comment')
+
+
+def _group_of(kind, item):
+    # The key ranked reads of the item go through: a post's subreddit feed or a comment's sibling list
+    return item.subreddit_id if kind == 'post' else item.parent_comment_id or item.parent_post_id
+
+
+class _Stripe:
+    """The buffered votes of the IDs that hash to one lock stripe."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Kind -> ID -> [pending upvotes, pending downvotes, votes the store holds before them]
+        self.pending = {kind: {} for kind in KINDS}
+        # The batch a flush took from pending, readable until the flush has applied it to the store
+        self.applying = {kind: {} for kind in KINDS}
+
+
+class VoteBuffer:
+    """
+    Write-coalescing layer in front of a store that batches votes per post/comment ID.
+
+    Votes only bump pending up/down counters; a background thread folds them into the
+    wrapped store every flush_interval seconds, or sooner once max_pending distinct IDs are
+    waiting. Reads add any pending votes to the stored ones, and ranked reads flush
+    first when the items they rank have votes pending, so callers always observe their own
+    votes. Everything else is delegated to the wrapped store unchanged.
+
+    Counters are guarded by lock stripes selected by ID hash. A flush swaps every stripe's
+    counters for empty ones and applies them with no stripe held, so votes and reads never
+    wait on the store's write.
+    """
+
+    def __init__(self, store, flush_interval=0.05, max_pending=10000, lock_stripes=256):
+        self.store = store
+        self.max_pending = max_pending
+        self._stripes = [_Stripe() for _ in range(lock_stripes)]
+        # One flush at a time, so that batches reach the store in the order they were taken
+        self._flush_lock = threading.Lock()
+        # Guards the pending ID count and the groups with votes pending or being applied
+        self._groups_lock = threading.Lock()
+        self._pending_count = 0
+        self._pending_groups = {kind: set() for kind in KINDS}
+        self._applying_groups = {kind: set() for kind in KINDS}
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, args=(flush_interval,), daemon=True)
+        self._flusher.start()
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def _stripe(self, key):
+        return self._stripes[hash(key) % len(self._stripes)]
+
+    def _group_by_stripe(self, keyed_items):
+        # Batch helpers take each stripe once for all of the items that map to it
+        groups = defaultdict(list)
+        for key, item in keyed_items:
+            groups[self._stripe(key)].append(item)
+        return groups.items()
+
+    def _flush_periodically(self, flush_interval):
+        while not self._closed.wait(flush_interval):
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._groups_lock:
+                self._applying_groups, self._pending_groups = self._pending_groups, {kind: set() for kind in KINDS}
+            batches = {kind: [] for kind in KINDS}
+            for stripe in self._stripes:
+                with stripe.lock:
+                    for kind in KINDS:
+                        stripe.applying[kind], stripe.pending[kind] = stripe.pending[kind], {}
+                        batches[kind].extend((item_id, ups, downs)
+                                             for item_id, (ups, downs, _) in stripe.applying[kind].items())
+            with self._groups_lock:
+                self._pending_count -= len(batches['post']) + len(batches['comment'])
+            # With SQLite this is a durable commit, so no stripe is held meanwhile
+            if batches['post']:
+                self.store.vote_posts(batches['post'])
+            if batches['comment']:
+                self.store.vote_comments(batches['comment'])
+            for stripe in self._stripes:
+                with stripe.lock:
+                    stripe.applying = {kind: {} for kind in KINDS}
+            with self._groups_lock:
+                self._applying_groups = {kind: set() for kind in KINDS}
+
+    def close(self):
+        self._closed.set()
+        self._flusher.join()
+        self.flush()
+        if hasattr(self.store, "close"):
+            self.store.close()
+
+    @staticmethod
+    def _unapplied(stripe, kind, item_id, item):
+        """
+        Returns the (upvotes, downvotes) the buffer holds for the item beyond the stored ones.
+        Must be called with the stripe held, since the item was read from the store.
+        """
+        upvotes = downvotes = 0
+        applying = stripe.applying[kind].get(item_id)
+        # The store may already hold a batch that its flush hasn't let go of yet. Only votes
+        # change an item's vote count, so the count tells whether the batch has landed.
+        if applying is not None and item.upvotes + item.downvotes < applying[2] + applying[0] + applying[1]:
+            upvotes, downvotes = applying[0], applying[1]
+        pending = stripe.pending[kind].get(item_id)
+        if pending is not None:
+            upvotes += pending[0]
+            downvotes += pending[1]
+        return upvotes, downvotes
+
+    def _buffer_votes(self, kind, votes, read_items):
+        updates = [None] * len(votes)
+        full = False
+        for stripe, group in self._group_by_stripe((vote[0], (position, vote)) for position, vote in enumerate(votes)):
+            # Read the stored items with the stripe held: a flush in between could apply and let
+            # go of the unapplied votes, and the updates would miss them
+            with stripe.lock:
+                items = read_items([item_id for _, (item_id, _, _) in group])
+                for (position, (item_id, upvotes, downvotes)), item in zip(group, items):
+                    if item is None:
+                        continue
+                    pending = stripe.pending[kind].get(item_id)
+                    if pending is None:
+                        applying_ups, applying_downs = self._unapplied(stripe, kind, item_id, item)
+                        pending = stripe.pending[kind][item_id] = [
+                            0, 0, item.upvotes + item.downvotes + applying_ups + applying_downs]
+                        with self._groups_lock:
+                            self._pending_groups[kind].add(_group_of(kind, item))
+                            self._pending_count += 1
+                            full = self._pending_count >= self.max_pending
+                    pending[0] += upvotes
+                    pending[1] += downvotes
+                    ups, downs = self._unapplied(stripe, kind, item_id, item)
+                    updates[position] = reddit_pb2.ScoreUpdate(
+                        id=item_id, score=item.score + ups - downs, upvotes=item.upvotes + ups,
+                        downvotes=item.downvotes + downs, version=item.version + ups + downs)
+        if full:
+            self.flush()
+        return updates
+
+    def _with_pending(self, stripe, kind, item_id, item):
+        # Must be called with the stripe held, since the item was read from the store
+        if item is None:
+            return None
+        upvotes, downvotes = self._unapplied(stripe, kind, item_id, item)
+        if not upvotes and not downvotes:
+            return item
+        # Never mutate the stored message; the flusher owns the real score
+        merged = copy.copy(item)
+        merged.upvotes += upvotes
+        merged.downvotes += downvotes
+        merged.score += upvotes - downvotes
+        # One version per unapplied vote, as the flush will advance the stored version
+        merged.version += upvotes + downvotes
+        return merged
+
+    def _read(self, kind, item_ids, read_items):
+        items = [None] * len(item_ids)
+        for stripe, group in self._group_by_stripe((item_id, (position, item_id))
+                                                   for position, item_id in enumerate(item_ids)):
+            with stripe.lock:
+                for (position, item_id), item in zip(group, read_items([item_id for _, item_id in group])):
+                    items[position] = self._with_pending(stripe, kind, item_id, item)
+        return items
+
+    def _settle(self, kind, group):
+        # Ranks live in the store's indexes, so the group's votes must reach the store before a ranked read
+        with self._groups_lock:
+            unsettled = group in self._pending_groups[kind] or group in self._applying_groups[kind]
+        if unsettled:
+            self.flush()
+
+    def vote_post(self, post_id, upvotes, downvotes):
+        return self.vote_posts([(post_id, upvotes, downvotes)])[0]
+
+    def get_post(self, post_id):
+        return self.get_posts([post_id])[0]
+
+    def vote_posts(self, votes):
+        return self._buffer_votes('post', votes, self.store.get_posts)
+
+    def encoded_post(self, post_id):
+        stripe = self._stripe(post_id)
+        with stripe.lock:
+            buffered = post_id in stripe.pending['post'] or post_id in stripe.applying['post']
+        if not buffered:
+            # Every vote acknowledged before this check is already in the store
+            return self.store.encoded_post(post_id)
+        post = self.get_post(post_id)
+        return None if post is None else self.store.encoder.post(post)
+
+    def get_posts(self, post_ids):
+        return self._read('post', post_ids, self.store.get_posts)
+
+    def vote_comment(self, comment_id, upvotes, downvotes):
+        return self.vote_comments([(comment_id, upvotes, downvotes)])[0]
+
+    def get_comment(self, comment_id):
+        return self._read('comment', [comment_id], self._get_comments)[0]
+
+    def _get_comments(self, comment_ids):
+        return [self.store.get_comment(comment_id) for comment_id in comment_ids]
+
+    def vote_comments(self, votes):
+        return self._buffer_votes('comment', votes, self._get_comments)
+
+    def top_comments(self, post_id, count, sort=reddit_pb2.TOP):
+        self._settle('comment', post_id)
+        return self.store.top_comments(post_id, count, sort)
+
+    def top_replies(self, comment_id, count):
+        self._settle('comment', comment_id)
+        return self.store.top_replies(comment_id, count)
+
+    def encoded_top_comments(self, post_id, count, sort=reddit_pb2.TOP):
+        self._settle('comment', post_id)
+        return self.store.encoded_top_comments(post_id, count, sort)
+
+    def encoded_top_replies(self, comment_id, count):
+        self._settle('comment', comment_id)
+        return self.store.encoded_top_replies(comment_id, count)
+
+    def feed_page(self, subreddit_id, sort, count, after=None):
+        # The scores returned with the ranks live in the store too
+        self._settle('post', subreddit_id)
+        return self.store.feed_page(subreddit_id, sort, count, after)
+
+    def search_posts(self, query, count, tags=(), subreddit_id=None):
+        # Matches are re-read with their stripes held, like every other read of buffered votes
+        results = self.store.search_posts(query, count, tags, subreddit_id)
+        posts = self.get_posts([post.post_id for _, post in results])
+        return [(score, post) for (score, _), post in zip(results, posts)]
+
+    def search_comments(self, query, count):
+        results = self.store.search_comments(query, count)
+        if results is None:
+            return None
+        comments = self._read('comment', [comment.comment_id for _, comment in results], self._get_comments)
+        return [(score, comment) for (score, _), comment in zip(results, comments)]
@@ -0,0 +1,220 @@
+import glob
+import os
+import struct
+import threading
+import zlib
+
+import reddit_pb2
+from server.store import InMemoryStore
+
+# Every record is framed as <length, crc32> followed by a serialized StoreMutation
+FRAME_HEADER = struct.Struct("<II")
+
+
+def _segment_path(directory, kind, number):
+    return os.path.join(directory, f"{kind}-{number:010d}.bin")
+
+
+def _segment_numbers(directory, kind):
+    return sorted(int(os.path.basename(path)[len(kind) + 1:-4])
+                  for path in glob.glob(os.path.join(directory, f"{kind}-*.bin")))
+
+
+def frame(mutation):
+    payload = mutation.SerializeToString()
+    return FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_frames(path):
+    """Yields the StoreMutations in a log or snapshot file, stopping at a torn or corrupt tail."""
+    with open(path, "rb", buffering=1 << 20) as file:
+        while True:
+            header = file.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                return
+            length, checksum = FRAME_HEADER.unpack(header)
+            payload = file.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                return
+            yield reddit_pb2.StoreMutation.FromString(payload)
+
+
+class MutationLog:
+    """
+    Append-only, segmented log of store mutations with group commit.
+
+    append() only queues the encoded record and returns its position; a flusher thread
+    writes everything queued so far with a single write and fsync, then wakes every caller
+    waiting on a position up to that point. rotate() starts a new segment, which is how
+    snapshots mark the point the log has to be replayed from.
+    """
+
+    def __init__(self, directory, segment=None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        segments = _segment_numbers(directory, "log")
+        self.segment = segment if segment is not None else (segments[-1] if segments else 0)
+        self._file = open(_segment_path(directory, "log", self.segment), "ab")
+
+        self._io_lock = threading.Lock()  # Held while writing to the segment file
+        self._condition = threading.Condition()  # Guards the fields below
+        self._pending = []
+        self._appended = 0
+        self._durable = 0
+        self._closed = False
+        self._flusher = threading.Thread(target=self._run_flusher, daemon=True)
+        self._flusher.start()
+
+    def append(self, mutation):
+        record = frame(mutation)
+        with self._condition:
+            self._pending.append(record)
+            self._appended += 1
+            self._condition.notify_all()
+            return self._appended
+
+    def wait(self, position):
+        with self._condition:
+            self._condition.wait_for(lambda: self._durable >= position)
+
+    def _write_pending(self):
+        # Must be called with the io lock held
+        with self._condition:
+            records, self._pending = self._pending, []
+            position = self._appended
+        if records:
+            self._file.write(b"".join(records))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        with self._condition:
+            self._durable = position
+            self._condition.notify_all()
+
+    def _run_flusher(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._closed)
+                if self._closed and not self._pending:
+                    return
+            with self._io_lock:
+                self._write_pending()
+
+    def rotate(self):
+        """Closes the current segment and starts the next one; returns the new segment number."""
+        with self._io_lock:
+            self._write_pending()
+            self._file.close()
+            self.segment += 1
+            self._file = open(_segment_path(self.directory, "log", self.segment), "ab")
+            return self.segment
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._flusher.join()
+        with self._io_lock:
+            self._write_pending()
+            self._file.close()
+
+
+def write_snapshot(store, log):
+    """
+    Writes a compact snapshot of the store and drops the log segments it makes redundant.
+
+    The log is rotated first; every mutation made while the snapshot is being written lands
+    in the new segment, and replaying that segment on top of the snapshot converges on the
+    right state because creations are skipped when already present and scores are absolute.
+    """
+    segment = log.rotate()
+    path = _segment_path(log.directory, "snapshot", segment)
+    with open(path + ".tmp", "wb") as file:
+        for post in list(store.posts.values()):
+            file.write(frame(reddit_pb2.StoreMutation(post=post)))
+        for comment in store.comments.values():  # Materialized one at a time
+            file.write(frame(reddit_pb2.StoreMutation(comment=comment)))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(path + ".tmp", path)
+
+    for number in _segment_numbers(log.directory, "log"):
+        if number < segment:
+            os.remove(_segment_path(log.directory, "log", number))
+    for number in _segment_numbers(log.directory, "snapshot"):
+        if number < segment:
+            os.remove(_segment_path(log.directory, "snapshot", number))
+    return path
+
+
+def _vote_difference(entity, update):
+    """Returns the (upvotes, downvotes) that take the entity to the absolute counts of a ScoreUpdate."""
+    if not update.upvotes and not update.downvotes:
+        # Logged before votes were counted separately: only the score is known
+        delta = update.score - entity.score
+        return max(delta, 0), max(-delta, 0)
+    return update.upvotes - entity.upvotes, update.downvotes - entity.downvotes
+
+
+def apply_mutation(store, mutation):
+    kind = mutation.WhichOneof("mutation")
+    if kind == "post":
+        if store.get_post(mutation.post.post_id) is None:
+            store.add_post(mutation.post)
+    elif kind == "comment":
+        if store.get_comment(mutation.comment.comment_id) is None:
+            store.add_comment(mutation.comment)
+    elif kind == "post_score":
+        post = store.get_post(mutation.post_score.id)
+        if post is not None:
+            store.vote_post(post.post_id, *_vote_difference(post, mutation.post_score))
+    elif kind == "comment_score":
+        comment = store.get_comment(mutation.comment_score.id)
+        if comment is not None:
+            store.vote_comment(comment.comment_id, *_vote_difference(comment, mutation.comment_score))
+
+
+def recover(directory, lock_stripes=256, search_comments=False, encoder=None):
+    """
+    Rebuilds an InMemoryStore from the latest snapshot plus the log segments written after it,
+    then attaches a MutationLog so that new mutations are logged.
+    """
+    os.makedirs(directory, exist_ok=True)
+    store = InMemoryStore(lock_stripes, search_comments=search_comments, encoder=encoder)
+    snapshots = _segment_numbers(directory, "snapshot")
+    start = snapshots[-1] if snapshots else 0
+    if snapshots:
+        # Snapshots only hold creations, which can skip the per-mutation path entirely
+        snapshot_posts, snapshot_comments = [], []
+        for mutation in read_frames(_segment_path(directory, "snapshot", start)):
+            if mutation.HasField("post"):
+                snapshot_posts.append(mutation.post)
+            else:
+                snapshot_comments.append(mutation.comment)
+        store.load(snapshot_posts, snapshot_comments)
+    for number in _segment_numbers(directory, "log"):
+        if number >= start:
+            for mutation in read_frames(_segment_path(directory, "log", number)):
+                apply_mutation(store, mutation)
+
+    # Start a fresh segment so a torn tail in the last one is never appended to
+    segments = _segment_numbers(directory, "log")
+    store.log = MutationLog(directory, segment=max(segments[-1] + 1 if segments else 0, start))
+    return store
+
+
+class Snapshotter:
+    """Background thread that snapshots the store every interval seconds."""
+
+    def __init__(self, store, interval):
+        self.store = store
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+        self._thread.start()
+
+    def _run(self, interval):
+        while not self._stopped.wait(interval):
+            write_snapshot(self.store, self.store.log)
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
@@ -0,0 +1,146 @@
+import functools
+import threading
+
+import reddit_pb2
+
+# Wire types of the protobuf encoding
+VARINT = 0
+LENGTH_DELIMITED = 2
+
+
+def _number(message_class, name):
+    return message_class.DESCRIPTOR.fields_by_name[name].number
+
+
+# Fields that change after an entity is created; the encoding of everything else is cached
+POST_CHANGING_FIELDS = ("score", "upvotes", "downvotes", "version")
+COMMENT_CHANGING_FIELDS = ("score", "upvotes", "downvotes", "has_replies", "version")
+
+# Fields the read responses are assembled from
+GET_POST_RESPONSE_POST = _number(reddit_pb2.GetPostResponse, "post")
+TOP_COMMENTS_RESPONSE_COMMENTS = _number(reddit_pb2.GetTopCommentsUnderPostResponse, "comments")
+EXPAND_RESPONSE_COMMENT_NODES = _number(reddit_pb2.ExpandCommentBranchResponse, "comment_nodes")
+NODE_COMMENT, NODE_CHILDREN, NODE_REPLIES = (_number(reddit_pb2.CommentNode, name)
+                                             for name in ("comment", "children", "replies"))
+
+
+def varint(value):
+    if value < 0:
+        value += 1 << 64  # Negative integers are encoded as 64-bit two's complement
+    encoded = bytearray()
+    while value > 0x7F:
+        encoded.append(value & 0x7F | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def _integer_fields(message_class, names):
+    """Returns a function encoding the named integer fields of message_class from their values, leaving out zeros as proto3 does."""
+    tags = [varint(_number(message_class, name) << 3 | VARINT) for name in names]
+
+    @functools.lru_cache(maxsize=65536)  # Vote counts are small numbers that come up over and over
+    def encode(*values):
+        return b"".join(tag + varint(int(value)) for tag, value in zip(tags, values) if value)
+    return encode
+
+
+_post_changing = _integer_fields(reddit_pb2.Post, POST_CHANGING_FIELDS)
+_comment_changing = _integer_fields(reddit_pb2.Comment, COMMENT_CHANGING_FIELDS)
+
+
+@functools.lru_cache(maxsize=65536)
+def _prefix(number, length):
+    return varint(number << 3 | LENGTH_DELIMITED) + varint(length)
+
+
+def length_delimited(number, payload):
+    """Returns the encoding of a message, string or bytes field whose value is encoded as payload."""
+    return _prefix(number, len(payload)) + payload
+
+
+def repeated(number, payloads):
+    """Returns the encoding of a repeated message field whose values are encoded as payloads."""
+    return b"".join([_prefix(number, len(payload)) + payload for payload in payloads])
+
+
+def comment_node(comment, children=(), replies=()):
+    """Returns the encoding of a CommentNode from the encodings of its comment, children and replies."""
+    encoded = _prefix(NODE_COMMENT, len(comment)) + comment
+    # Most nodes of a branch are leaves
+    if children:
+        encoded += repeated(NODE_CHILDREN, children)
+    if replies:
+        encoded += repeated(NODE_REPLIES, replies)
+    return encoded
+
+
+def get_post_response(post):
+    return length_delimited(GET_POST_RESPONSE_POST, post)
+
+
+def top_comments_response(comments):
+    return repeated(TOP_COMMENTS_RESPONSE_COMMENTS, comments)
+
+
+def expand_response(nodes):
+    return repeated(EXPAND_RESPONSE_COMMENT_NODES, nodes)
+
+
+class EntityEncoder:
+    """
+    Serializes posts and comments from cached encodings, for responses assembled as bytes.
+
+    Posts and comments never change once created, apart from their vote counts, versions
+    and a comment's has_replies, so the encoding of every other field is cached per entity and
+    serializing one appends the current values of the changing fields to it. Protobuf
+    parsers accept fields in any order, so the result parses like the entity's own
+    serialization. Comments are encoded straight from their CommentTable row, without
+    building a Comment message unless the row isn't cached.
+
+    Up to max_entries encodings of each kind are kept. The oldest is evicted when one is
+    added, rather than the least recently used, so that cache hits take no lock.
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()  # Serializes additions and evictions
+        self._posts = {}  # post_id -> encoding without the changing fields, oldest first
+        self._rows = {}  # CommentTable row -> likewise
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._posts) + len(self._rows)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self)}
+
+    def _add(self, entries, key, entity, changing_fields):
+        unchanging = type(entity)()
+        unchanging.CopyFrom(entity)
+        for name in changing_fields:
+            unchanging.ClearField(name)
+        encoded = unchanging.SerializeToString()
+        with self._lock:
+            self.misses += 1
+            entries[key] = encoded
+            if len(entries) > self.max_entries:
+                entries.pop(next(iter(entries)), None)
+        return encoded
+
+    def post(self, post):
+        encoded = self._posts.get(post.post_id)
+        if encoded is None:
+            encoded = self._add(self._posts, post.post_id, post, POST_CHANGING_FIELDS)
+        else:
+            self.hits += 1  # Approximate: unlocked increments may be lost
+        return encoded + _post_changing(post.score, post.upvotes, post.downvotes, post.version)
+
+    def comment_row(self, table, row):
+        encoded = self._rows.get(row)
+        if encoded is None:
+            encoded = self._add(self._rows, row, table.materialize(row), COMMENT_CHANGING_FIELDS)
+        else:
+            self.hits += 1
+        return encoded + _comment_changing(*table.changing_fields(row))
@@ -1,8 +1,7 @@
-from client.reddit_client import RedditClient
-
+import asyncio
 import unittest
-from client.reddit_client import RedditClient
-from retrieval import retrieve_and_expand_comments  # Import your first function if it's in a different module
+from client.reddit_client import AsyncRedditClient, RedditClient
+from retrieval import retrieve_and_expand_comments, retrieve_and_expand_many  # Import your first function if it's in a different module
 
 class TestRedditClient(unittest.TestCase):
     def setUp(self):
@@ -43,5 +42,17 @@ class TestRedditClient(unittest.TestCase):
         self.assertTrue(hasattr(most_upvoted_reply, 'publication_date'))
         self.assertTrue(hasattr(most_upvoted_reply, 'parent_comment_id'))
 
+    def test_concurrent_and_composite_retrieval(self):
+        expected = retrieve_and_expand_comments(self.client, self.post_id)
+
+        async def retrieve():
+            async with AsyncRedditClient() as client:
+                return (await retrieve_and_expand_many(client, [self.post_id] * 3),
+                        await retrieve_and_expand_many(client, [self.post_id], composite=True))
+        pipelined, composite = asyncio.run(retrieve())
+
+        self.assertEqual(pipelined, [expected] * 3)
+        self.assertEqual(composite, [expected])
+
 if __name__ == "__main__":
     unittest.main()
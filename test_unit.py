@@ -1,9 +1,40 @@
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
 import time
 import unittest
-from unittest.mock import MagicMock
+from concurrent import futures
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import grpc
+
+import reddit_pb2
+from client.call_policy import Hedger
+from client.read_cache import ReadCache, comment_entities
 from client.reddit_client import RedditClient
-from retrieval import retrieve_and_expand_comments
+from retrieval import retrieve_and_expand_comments, retrieve_and_expand_many
+from server import reddit_server
+from server.admission import Admission, AdmissionInterceptor
+from server.broker import Broker
+from server.handlers import add_servicer_to_server
+from server.metrics import Metrics, MetricsInterceptor, add_service_gauges
+from server.profiling import SlowRequestInterceptor, StackSampler, slow_request_logger
+from server.comment_table import CommentTable, pack_id
+from server.ranked_index import RankedIndex
+from server.ranking import confidence, controversial, created_seconds, hot
+from server.response_cache import ResponseCache
+from server.search_index import SearchIndex
+from server.sharding import FORWARD_TIMEOUT, ShardIds, ShardRouter, remaining_timeout, shard_of
+from server.loader import load_from_sqlite
+from server.sqlite_store import SCHEMA, SQLiteStore
+from server.store import InMemoryStore
+from server.vote_buffer import VoteBuffer
+from server.wal import recover, write_snapshot
+from server.wire import EntityEncoder
 
 class TestRedditClient(unittest.TestCase):
     def test_retrieve_and_expand_comments(self):
@@ -19,6 +50,1003 @@ class TestRedditClient(unittest.TestCase):
         self.assertEqual(result.comment_id, "comment_1_1")
         self.assertEqual(result.author, "user5")
 
+    def test_retrieve_and_expand_many(self):
+        client = MagicMock()
+        client.get_post = AsyncMock(side_effect=lambda post_id: mock_response_for_get_post(post_id))
+        client.get_top_comments_under_post = AsyncMock(
+            side_effect=lambda post_id, count: mock_response_for_top_comments_post(post_id, count))
+        client.expand_comment_branch = AsyncMock(
+            side_effect=lambda comment_id, count: mock_response_for_expand_comment_branch(comment_id, count))
+
+        results = asyncio.run(retrieve_and_expand_many(client, ["post_1", "post_2", "post_3"], max_in_flight=2))
+        self.assertEqual([result.comment_id for result in results], ["comment_1_1"] * 3)
+        self.assertEqual(client.get_post.await_count, 3)
+        self.assertEqual(client.get_top_comments_under_post.await_count, 3)
+
+    def test_clients_share_channel_pools(self):
+        first, second = RedditClient(port=50999), RedditClient(port=50999)
+        self.assertIs(first.pool, second.pool)
+        self.assertIsNot(RedditClient(port=50999, shared=False).pool, first.pool)
+        self.assertIsNot(RedditClient(port=50999, keepalive_time_ms=30000).pool, first.pool)
+
+        pooled = RedditClient(port=50999, pool_size=2, max_message_size=1 << 20)
+        self.assertEqual(len(pooled.pool.channels), 2)
+        self.assertEqual([pooled.stub for _ in range(4)], pooled.pool.stubs * 2)  # Round-robin
+
+        pool = first.pool
+        first.close()
+        second.close()
+        second.close()  # Closing twice is harmless
+        with RedditClient(port=50999) as third:
+            self.assertIsNot(third.pool, pool)
+
+    def test_read_cache_follows_entity_versions(self):
+        service = reddit_server.RedditService(InMemoryStore())
+        context = MagicMock()
+        stub = MagicMock()
+        for method in ["GetPost", "VotePost", "CreateComment", "VoteComment", "GetTopCommentsUnderPost"]:
+            getattr(stub, method).side_effect = lambda request, timeout, method=method: getattr(service, method)(
+                request, context)
+        client = RedditClient(port=50999, shared=False, cache_size=10, cache_ttl=60)
+        client.pool.next_stub = lambda: stub
+
+        post_id = service.CreatePost(
+            reddit_pb2.CreatePostRequest(title="t", text="x", author="a", image_url="i"), context).post.post_id
+        self.assertIs(client.get_post(post_id), client.get_post(post_id))
+        self.assertEqual(stub.GetPost.call_count, 1)
+        client.vote_post(post_id, True)  # Local writes invalidate what they change
+        self.assertEqual((client.get_post(post_id).post.score, client.get_post(post_id).post.version), (1, 1))
+
+        comment = client.create_comment("c", "a", parent_post_id=post_id).comment
+        self.assertEqual(client.get_top_comments_under_post(post_id, 5).comments[0].version, 0)
+        # A vote made elsewhere shows up in a newer version, which evicts the responses holding older ones
+        service.VoteComment(reddit_pb2.VoteCommentRequest(comment_id=comment.comment_id, upvote=True), context)
+        service.CreateComment(reddit_pb2.CreateCommentRequest(text="r", author="a", parent_comment_id=comment.comment_id),
+                              context)
+        newer = service.GetTopCommentsUnderPost(
+            reddit_pb2.GetTopCommentsUnderPostRequest(post_id=post_id, count=1), context)
+        self.assertEqual(newer.comments[0].version, 2)  # The vote and the first reply
+        client.cache.get("GetTopCommentsUnderPost", (post_id, 1, reddit_pb2.TOP), lambda: newer, comment_entities)
+        self.assertEqual(client.get_top_comments_under_post(post_id, 5).comments[0].score, 1)
+        self.assertEqual(stub.GetTopCommentsUnderPost.call_count, 2)
+
+        # Concurrent misses of one key share a single fetch
+        release = threading.Event()
+        cache = ReadCache(ttl=60)
+
+        def fetch():
+            release.wait()
+            return newer
+        with futures.ThreadPoolExecutor(4) as executor:
+            calls = [executor.submit(cache.get, "GetTopCommentsUnderPost", ("p",), fetch, comment_entities)
+                     for _ in range(4)]
+            time.sleep(0.05)
+            release.set()
+            self.assertTrue(all(call.result() is newer for call in calls))
+        stats = cache.stats()["GetTopCommentsUnderPost"]
+        self.assertEqual((stats["misses"], stats["coalesced"], stats["hits"]), (1, 3, 0))
+        # Invalidating an entity evicts the responses keyed by it, even those not holding it
+        cache.invalidate("p")
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(client.cache_stats()["GetPost"]["hit_ratio"], 0.5)
+
+    def test_deadlines_retries_and_hedging(self):
+        store = InMemoryStore()
+        store.add_post(reddit_pb2.Post(post_id="slow", image_url="i"))
+        get_post = store.get_post
+        stalled = threading.Event()
+        release = threading.Event()
+
+        def stall_once(post_id):
+            if post_id == "slow" and not stalled.is_set():
+                stalled.set()
+                release.wait(5)
+            return get_post(post_id)
+        store.get_post = stall_once
+        servers = []
+
+        def start(*interceptors):
+            server = grpc.server(futures.ThreadPoolExecutor(max_workers=4), interceptors=interceptors)
+            add_servicer_to_server(reddit_server.RedditService(store), server)
+            port = server.add_insecure_port("localhost:0")
+            server.start()
+            servers.append(server)
+            return port
+        try:
+            # Admits a call every 50ms, so back-to-back calls are turned down with a short pushback
+            with RedditClient(port=start(AdmissionInterceptor(Admission(rate=20, burst=1))), shared=False,
+                              max_attempts=5) as client:
+                post_id = client.create_post(title="t", text="t", image_url="i").post.post_id
+                self.assertEqual(client.get_post(post_id).post.post_id, post_id)  # Retried after the pushback
+                with self.assertRaises(grpc.RpcError):
+                    client.vote_post(post_id, True)  # Votes aren't idempotent, so they aren't retried
+
+            port = start()
+            with RedditClient(port=port, shared=False, timeouts={"GetPost": 0.2}) as client:
+                with self.assertRaises(grpc.RpcError) as raised:
+                    client.get_post("slow")
+                self.assertEqual(raised.exception.code(), grpc.StatusCode.DEADLINE_EXCEEDED)
+
+            stalled.clear()
+            with RedditClient(port=port, shared=False, hedge_percentile=0.5) as client:
+                client.hedger = Hedger(0.5, window=10, min_samples=5)
+                for _ in range(10):
+                    client.get_post(post_id)
+                start_time = time.perf_counter()
+                self.assertEqual(client.get_post("slow").post.post_id, "slow")
+                self.assertLess(time.perf_counter() - start_time, 2)  # The hedge answered while the first call stalled
+                stats = client.hedger.stats()["GetPost"]
+                self.assertEqual((stats["calls"], stats["hedge_wins"]), (11, 1))
+        finally:
+            release.set()
+            for server in servers:
+                server.stop(None)
+        with self.assertRaises(ValueError):
+            RedditClient(port=port, timeouts={"GetPosts": 1})
+
+class TestRankedIndex(unittest.TestCase):
+    def test_top_orders_by_rank_then_insertion(self):
+        index = RankedIndex()
+        for item_id in ["a", "b", "c", "d"]:
+            index.add("parent", item_id)
+        index.add("other", "x", rank=100)
+        index.update("c", 3)
+        index.update("b", 3)
+        index.update("d", -1)
+
+        self.assertEqual(index.top("parent", 10), ["b", "c", "a", "d"])
+        self.assertEqual(index.top("parent", 2), ["b", "c"])
+        self.assertEqual(index.top("missing", 5), [])
+        self.assertEqual(index.count("parent"), 4)
+
+class TestSearchIndex(unittest.TestCase):
+    def test_bm25_ranking_and_filters(self):
+        index = SearchIndex()
+        index.add("short", "rust", tags=["lang"], scope="a")
+        index.add("long", "rust and a lot of other words about nothing", tags=["lang"], scope="a")
+        index.add("twice", "rust rust", scope="b")
+        index.add("common", "the the the", scope="b")
+        # Repeated and less diluted terms score higher; "the" is in every document but one and matters less
+        self.assertEqual([doc for _, doc in index.search("rust", 10)], ["twice", "short", "long"])
+        self.assertEqual([doc for _, doc in index.search("rust the", 1)], ["common"])
+        self.assertEqual([doc for _, doc in index.search("rust", 10, tags=["lang"], scope="a")], ["short", "long"])
+        self.assertEqual([doc for _, doc in index.search("rust", 10, scope="b")], ["twice"])
+        self.assertEqual(index.search("", 2), [(0.0, "common"), (0.0, "twice")])
+        self.assertEqual(index.search("rust", 10, scope="missing"), [])
+
+        # Filters smaller than the postings are scored document by document, with the same scores
+        for number in range(100):
+            index.add(f"filler{number}", "rust filler")
+        self.assertEqual(index.search("rust filler", 10, scope="a"),
+                         [result for result in index.search("rust filler", 200) if result[1] in ("short", "long")])
+
+class TestCommentTable(unittest.TestCase):
+    def test_comments_round_trip(self):
+        table = CommentTable()
+        top = reddit_pb2.Comment(comment_id="0f1e2d3c-4b5a-6978-8695-a4b3c2d1e0f9", text="top", author="alice", score=3,
+                                 publication_date="2024-01-01 12:00:00", parent_post_id="post")
+        reply = reddit_pb2.Comment(comment_id="not-a-uuid", text="reply", author="alice", score=-2,
+                                   status=reddit_pb2.Comment.Status.HIDDEN, publication_date="yesterday",
+                                   parent_comment_id=top.comment_id)
+        for comment in [top, reply]:
+            table.add(comment, table.parent_key(comment))
+
+        self.assertEqual(pack_id(top.comment_id), 0x0f1e2d3c4b5a69788695a4b3c2d1e0f9)
+        self.assertEqual(pack_id("0F1E2D3C-4B5A-6978-8695-A4B3C2D1E0F9"), "0F1E2D3C-4B5A-6978-8695-A4B3C2D1E0F9")
+        self.assertEqual(len(table), 2)
+        self.assertEqual(table.get(top.comment_id), top)
+        self.assertEqual(table.get(reply.comment_id), reply)
+        self.assertIsNone(table.get("missing"))
+        self.assertEqual(table.parent(table.row(reply.comment_id)), pack_id(top.comment_id))
+
+        row = table.row(top.comment_id)
+        self.assertEqual(table.vote(row, 5, 1), 7)
+        # The score from before votes were counted separately counts as upvotes
+        self.assertEqual(table.vote_counts(row), (8, 1))
+        table.set_has_replies(row)
+        self.assertTrue(table.get(top.comment_id).has_replies)
+        self.assertEqual(table.get(top.comment_id).score, 7)
+        self.assertEqual(table.get(top.comment_id).upvotes, 5)
+        self.assertEqual([comment.comment_id for comment in table.values()], [top.comment_id, reply.comment_id])
+
+class TestRedditService(unittest.TestCase):
+    def setUp(self):
+        self.service = reddit_server.RedditService(InMemoryStore())
+        self.context = MagicMock()
+
+    def create_comment(self, **parent):
+        request = reddit_pb2.CreateCommentRequest(text="text", author="author", **parent)
+        return self.service.CreateComment(request, self.context).comment
+
+    def vote_comment(self, comment_id, upvote=True, times=1):
+        for _ in range(times):
+            self.service.VoteComment(reddit_pb2.VoteCommentRequest(comment_id=comment_id, upvote=upvote), self.context)
+
+    def test_get_top_comments_under_post(self):
+        first = self.create_comment(parent_post_id="post_1")
+        second = self.create_comment(parent_post_id="post_1")
+        third = self.create_comment(parent_post_id="post_1")
+        self.create_comment(parent_post_id="post_2")
+        self.create_comment(parent_comment_id=first.comment_id)
+        self.vote_comment(second.comment_id, times=2)
+        self.vote_comment(first.comment_id, upvote=False)
+
+        request = reddit_pb2.GetTopCommentsUnderPostRequest(post_id="post_1", count=2)
+        response = self.service.GetTopCommentsUnderPost(request, self.context)
+
+        self.assertEqual([c.comment_id for c in response.comments], [second.comment_id, third.comment_id])
+        self.assertEqual(response.comments[0].score, 2)
+
+    def test_comment_sort_orders(self):
+        liked, split, new = [self.create_comment(parent_post_id="post_1") for _ in range(3)]
+        self.vote_comment(liked.comment_id, times=3)
+        self.vote_comment(split.comment_id, times=2)
+        self.vote_comment(split.comment_id, upvote=False, times=2)
+
+        def top(sort):
+            request = reddit_pb2.GetTopCommentsUnderPostRequest(post_id="post_1", count=5, sort=sort)
+            return [c.comment_id for c in self.service.GetTopCommentsUnderPost(request, self.context).comments]
+        self.assertEqual(top(reddit_pb2.TOP), [liked.comment_id, split.comment_id, new.comment_id])
+        self.assertEqual(top(reddit_pb2.NEW), [new.comment_id, split.comment_id, liked.comment_id])
+        self.assertEqual(top(reddit_pb2.CONTROVERSIAL), [split.comment_id, liked.comment_id, new.comment_id])
+        self.assertEqual(top(reddit_pb2.BEST), [liked.comment_id, split.comment_id, new.comment_id])
+        self.assertEqual(top(reddit_pb2.HOT)[0], liked.comment_id)
+
+        # Votes and new comments re-rank the orders that have been read
+        self.vote_comment(new.comment_id, times=20)
+        newest = self.create_comment(parent_post_id="post_1")
+        self.assertEqual(top(reddit_pb2.BEST)[0], new.comment_id)
+        self.assertEqual(top(reddit_pb2.HOT)[0], new.comment_id)
+        self.assertEqual(top(reddit_pb2.NEW)[0], newest.comment_id)
+        stored = self.service.store.get_comment(split.comment_id)
+        self.assertEqual((stored.score, stored.upvotes, stored.downvotes), (0, 2, 2))
+        top(7)
+        self.context.set_code.assert_called_with(grpc.StatusCode.INVALID_ARGUMENT)
+
+    def test_ranking_functions(self):
+        # Balanced votes are controversial; a larger sample makes BEST surer of a good ratio
+        self.assertGreater(controversial(10, 10), controversial(100, 1))
+        self.assertEqual(controversial(5, 0), 0)
+        self.assertGreater(confidence(90, 10), confidence(1, 0))
+        self.assertGreater(confidence(1, 0), confidence(0, 0))
+
+    def test_expand_comment_branch(self):
+        root = self.create_comment(parent_post_id="post_1")
+        low = self.create_comment(parent_comment_id=root.comment_id)
+        high = self.create_comment(parent_comment_id=root.comment_id)
+        reply = self.create_comment(parent_comment_id=high.comment_id)
+        deep = self.create_comment(parent_comment_id=reply.comment_id)
+        self.vote_comment(high.comment_id)
+
+        request = reddit_pb2.ExpandCommentBranchRequest(comment_id=root.comment_id, count=5)
+        response = self.service.ExpandCommentBranch(request, self.context)
+        self.assertEqual([n.comment.comment_id for n in response.comment_nodes], [high.comment_id, low.comment_id])
+        self.assertEqual([c.comment_id for c in response.comment_nodes[0].children], [reply.comment_id])
+        self.assertTrue(response.comment_nodes[0].comment.has_replies)
+
+        request.max_depth = 3
+        response = self.service.ExpandCommentBranch(request, self.context)
+        top = response.comment_nodes[0]
+        self.assertEqual(top.replies[0].comment.comment_id, reply.comment_id)
+        self.assertEqual(top.replies[0].replies[0].comment.comment_id, deep.comment_id)
+        self.assertEqual(len(top.replies[0].replies[0].replies), 0)
+        self.assertEqual(len(top.children), 0)
+
+    def test_get_post_thread(self):
+        create = reddit_pb2.CreatePostRequest(title="t", text="t", image_url="i", subreddit_id="s")
+        post = self.service.CreatePost(create, self.context).post
+        low = self.create_comment(parent_post_id=post.post_id)
+        high = self.create_comment(parent_post_id=post.post_id)
+        reply = self.create_comment(parent_comment_id=high.comment_id)
+        self.create_comment(parent_comment_id=low.comment_id)
+        self.vote_comment(high.comment_id)
+
+        request = reddit_pb2.GetPostThreadRequest(post_id=post.post_id, count=5)
+        response = self.service.GetPostThread(request, self.context)
+        self.assertEqual(response.post.post_id, post.post_id)
+        self.assertEqual([c.comment_id for c in response.comments], [high.comment_id, low.comment_id])
+        self.assertEqual([n.comment.comment_id for n in response.top_branch], [reply.comment_id])
+
+        self.service.GetPostThread(reddit_pb2.GetPostThreadRequest(post_id="missing", count=5), self.context)
+        self.context.set_code.assert_called_with(grpc.StatusCode.NOT_FOUND)
+
+    def test_search_posts(self):
+        def create(title, text, tags, subreddit_id):
+            request = reddit_pb2.CreatePostRequest(title=title, text=text, image_url="i", tags=tags, subreddit_id=subreddit_id)
+            return self.service.CreatePost(request, self.context).post.post_id
+        borrow = create("Rust borrow checker", "Fighting the borrow checker", ["rust", "help"], "programming")
+        create("Python", "The GIL is going away", ["python"], "programming")
+        cats = create("Cats", "My cat sleeps all day", ["cats"], "pets")
+        garden = create("Rust in the garden", "My tools rust", ["garden"], "pets")
+
+        def search(query, **filters):
+            request = reddit_pb2.SearchPostsRequest(query=query, count=10, **filters)
+            return [result.post.post_id for result in self.service.SearchPosts(request, self.context).results]
+        self.assertEqual(search("rust BORROW"), [borrow, garden])
+        self.assertEqual(search("rust", tags=["garden"]), [garden])
+        self.assertEqual(search("rust", subreddit_id="programming"), [borrow])
+        self.assertEqual(search("", subreddit_id="pets"), [garden, cats])  # Newest first
+        self.assertEqual(search("python", tags=["rust"]), [])
+        self.assertEqual(search("rust", tags=["missing"]), [])
+
+    def test_search_comments(self):
+        request = reddit_pb2.SearchCommentsRequest(query="checker", count=5)
+        self.service.SearchComments(request, self.context)
+        self.context.set_code.assert_called_with(grpc.StatusCode.FAILED_PRECONDITION)
+
+        self.service = reddit_server.RedditService(InMemoryStore(search_comments=True))
+        self.create_comment(parent_post_id="post_1")
+        match = self.service.CreateComment(reddit_pb2.CreateCommentRequest(
+            text="Borrow checker tips", author="a", parent_post_id="post_1"), self.context).comment
+        results = self.service.SearchComments(request, self.context).results
+        self.assertEqual([result.comment for result in results], [match])
+
+    def test_batch_rpcs(self):
+        create = reddit_pb2.CreatePostRequest(title="t", text="t", image_url="i", subreddit_id="s")
+        post = self.service.CreatePost(create, self.context).post
+
+        created = self.service.BatchCreateComments(reddit_pb2.BatchCreateCommentsRequest(comments=[
+            reddit_pb2.CreateCommentRequest(text="a", author="u", parent_post_id=post.post_id),
+            reddit_pb2.CreateCommentRequest(text="b", author="u"),
+            reddit_pb2.CreateCommentRequest(text="c", author="u", parent_post_id=post.post_id),
+        ]), self.context)
+        self.assertEqual([r.status.code for r in created.results], [0, grpc.StatusCode.INVALID_ARGUMENT.value[0], 0])
+        first, third = created.results[0].comment, created.results[2].comment
+
+        voted = self.service.BatchVoteComments(reddit_pb2.BatchVoteCommentsRequest(votes=[
+            reddit_pb2.VoteCommentRequest(comment_id=third.comment_id, upvote=True),
+            reddit_pb2.VoteCommentRequest(comment_id="missing", upvote=True),
+            reddit_pb2.VoteCommentRequest(comment_id=third.comment_id, upvote=True),
+        ]), self.context)
+        self.assertEqual([s.code for s in voted.statuses], [0, grpc.StatusCode.NOT_FOUND.value[0], 0])
+        top = self.service.GetTopCommentsUnderPost(
+            reddit_pb2.GetTopCommentsUnderPostRequest(post_id=post.post_id, count=5), self.context)
+        self.assertEqual([c.comment_id for c in top.comments], [third.comment_id, first.comment_id])
+
+        self.service.BatchVotePosts(reddit_pb2.BatchVotePostsRequest(votes=[
+            reddit_pb2.VotePostRequest(post_id=post.post_id, upvote=False)]), self.context)
+        fetched = self.service.BatchGetPosts(reddit_pb2.BatchGetPostsRequest(post_ids=["missing", post.post_id]), self.context)
+        self.assertEqual(fetched.results[0].status.code, grpc.StatusCode.NOT_FOUND.value[0])
+        self.assertEqual(fetched.results[1].post.score, -1)
+
+    def test_idempotency_keys(self):
+        create = reddit_pb2.CreatePostRequest(title="t", text="t", image_url="i", idempotency_key="post-key")
+        post = self.service.CreatePost(create, self.context).post
+        self.assertEqual(self.service.CreatePost(create, self.context).post, post)  # A retry returns the first post
+
+        create = reddit_pb2.CreateCommentRequest(text="c", author="a", parent_post_id=post.post_id, idempotency_key="k1")
+        comment = self.service.CreateComment(create, self.context).comment
+        self.assertEqual(self.service.CreateComment(create, self.context).comment, comment)
+        created = self.service.BatchCreateComments(reddit_pb2.BatchCreateCommentsRequest(comments=[
+            create,
+            reddit_pb2.CreateCommentRequest(text="d", author="a", parent_post_id=post.post_id, idempotency_key="k2"),
+            reddit_pb2.CreateCommentRequest(text="d", author="a", parent_post_id=post.post_id, idempotency_key="k2"),
+            reddit_pb2.CreateCommentRequest(text="e", author="a", parent_post_id=post.post_id),
+        ]), self.context).results
+        self.assertEqual(created[0].comment, comment)
+        self.assertEqual(created[1].comment, created[2].comment)
+        top = self.service.GetTopCommentsUnderPost(
+            reddit_pb2.GetTopCommentsUnderPostRequest(post_id=post.post_id, count=10), self.context)
+        self.assertEqual(len(top.comments), 3)
+
+    def test_stream_subreddit_feed(self):
+        create = reddit_pb2.CreatePostRequest(title="t", text="t", image_url="i", subreddit_id="s")
+        a, b, c, d = [self.service.CreatePost(create, self.context).post.post_id for _ in range(4)]
+        create.subreddit_id = "other"
+        self.service.CreatePost(create, self.context)
+        for post_id, upvote in [(c, True), (c, True), (a, True)]:
+            self.service.VotePost(reddit_pb2.VotePostRequest(post_id=post_id, upvote=upvote), self.context)
+        self.service.BatchVotePosts(reddit_pb2.BatchVotePostsRequest(votes=[
+            reddit_pb2.VotePostRequest(post_id=d, upvote=False)]), self.context)
+
+        def feed(sort, limit=0, cursor=""):
+            request = reddit_pb2.StreamSubredditFeedRequest(subreddit_id="s", sort=sort, limit=limit, cursor=cursor)
+            return list(self.service.StreamSubredditFeed(request, self.context))
+
+        first_page = feed(reddit_pb2.TOP, limit=2)
+        self.assertEqual([item.post.post_id for item in first_page], [c, a])
+        self.assertEqual(first_page[0].post.score, 2)
+        # Resuming from a cursor still works after the ranking has changed
+        self.service.VotePost(reddit_pb2.VotePostRequest(post_id=d, upvote=True), self.context)
+        self.assertEqual([item.post.post_id for item in feed(reddit_pb2.TOP, cursor=first_page[1].cursor)], [b, d])
+        self.assertEqual([item.post.post_id for item in feed(reddit_pb2.NEW)], [d, c, b, a])
+        self.assertEqual([item.post.post_id for item in feed(reddit_pb2.NEW, cursor=feed(reddit_pb2.NEW, limit=3)[-1].cursor)], [a])
+        self.assertEqual(feed(reddit_pb2.HOT)[0].post.post_id, c)
+        # Within a day, age outweighs an order of magnitude of score
+        self.assertGreater(hot(1, created_seconds("2024-01-02 00:00:00")), hot(5, created_seconds("2024-01-01 00:00:00")))
+
+        self.assertEqual(feed(reddit_pb2.NEW, cursor=first_page[0].cursor), [])
+        self.context.set_code.assert_called_with(grpc.StatusCode.INVALID_ARGUMENT)
+        self.context.reset_mock()
+        self.assertEqual(feed(reddit_pb2.NEW, cursor=reddit_server.encode_cursor(reddit_pb2.NEW, (0, -1))), [])
+        self.context.set_code.assert_called_with(grpc.StatusCode.INVALID_ARGUMENT)
+
+    def test_watch_post(self):
+        create = reddit_pb2.CreatePostRequest(title="t", text="t", image_url="i", subreddit_id="s")
+        post = self.service.CreatePost(create, self.context).post
+        root = self.create_comment(parent_post_id=post.post_id)
+        self.service.VotePost(reddit_pb2.VotePostRequest(post_id=post.post_id, upvote=True), self.context)
+
+        events = self.service.WatchPost(reddit_pb2.WatchPostRequest(post_id=post.post_id), self.context)
+        self.assertEqual(next(events).post_score.score, 1)  # The current score comes first
+
+        self.service.VotePost(reddit_pb2.VotePostRequest(post_id=post.post_id, upvote=False), self.context)
+        reply = self.create_comment(parent_comment_id=root.comment_id)
+        self.create_comment(parent_comment_id=root.comment_id)
+        self.vote_comment(reply.comment_id)
+        self.create_comment(parent_post_id="other_post")
+
+        self.assertEqual(next(events).post_score.score, 0)
+        self.assertEqual(next(events).comment.comment_id, reply.comment_id)
+        self.assertEqual(next(events).has_replies, root.comment_id)
+        self.assertEqual(next(events).WhichOneof("event"), "comment")  # No second has_replies flip
+        self.assertEqual(next(events).comment_score,
+                         reddit_pb2.ScoreUpdate(id=reply.comment_id, score=1, upvotes=1, version=1))
+        events.close()
+
+        # Closing the stream unsubscribes the watcher
+        self.assertFalse(self.service.broker.has_subscribers(post.post_id))
+        missing = self.service.WatchPost(reddit_pb2.WatchPostRequest(post_id="missing"), self.context)
+        self.assertEqual(list(missing), [])
+        self.context.set_code.assert_called_with(grpc.StatusCode.NOT_FOUND)
+
+    def test_watchers_leave_workers_to_unary_calls(self):
+        post = self.service.CreatePost(reddit_pb2.CreatePostRequest(title="t", text="t", image_url="i"), self.context).post
+        service = reddit_server.RedditService(self.service.store, max_watchers=1)
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+        add_servicer_to_server(service, server)
+        port = server.add_insecure_port("localhost:0")
+        server.start()
+        try:
+            with RedditClient(port=port, shared=False) as client:
+                watcher = client.watch_post(post.post_id)
+                self.assertEqual(next(watcher).post_score.id, post.post_id)
+                # The second watcher would take the last worker, so it is turned away
+                with self.assertRaises(grpc.RpcError) as raised:
+                    next(client.watch_post(post.post_id))
+                self.assertEqual(raised.exception.code(), grpc.StatusCode.RESOURCE_EXHAUSTED)
+                for _ in range(3):
+                    self.assertEqual(client.get_post(post.post_id).post.post_id, post.post_id)
+                watcher.cancel()
+        finally:
+            server.stop(None)
+
+    def test_watched_scores_never_go_back(self):
+        post = self.service.CreatePost(reddit_pb2.CreatePostRequest(title="t", text="t", image_url="i"), self.context).post
+        events = self.service.WatchPost(reddit_pb2.WatchPostRequest(post_id=post.post_id), self.context)
+
+        def vote():
+            for _ in range(25):
+                self.service.VotePost(reddit_pb2.VotePostRequest(post_id=post.post_id, upvote=True), self.context)
+        voters = [threading.Thread(target=vote) for _ in range(4)]
+        for voter in voters:
+            voter.start()
+        updates = [next(events).post_score]
+        while updates[-1].version < 100:
+            updates.append(next(events).post_score)
+        for voter in voters:
+            voter.join()
+        events.close()
+
+        # Updates published out of order are dropped, whichever vote published first
+        self.assertEqual([update.version for update in updates], sorted({update.version for update in updates}))
+        self.assertEqual([update.score for update in updates], sorted({update.score for update in updates}))
+        self.assertEqual(updates[-1].score, 100)
+
+    def test_concurrent_votes_on_hot_post(self):
+        request = reddit_pb2.CreatePostRequest(title="Hot", text="text", image_url="image_url", subreddit_id="sub")
+        post_id = self.service.CreatePost(request, self.context).post.post_id
+        threads, votes_per_thread = 16, 2000
+
+        def hammer(upvote):
+            vote = reddit_pb2.VotePostRequest(post_id=post_id, upvote=upvote)
+            for _ in range(votes_per_thread):
+                self.service.VotePost(vote, self.context)
+
+        workers = [threading.Thread(target=hammer, args=(i % 4 != 0,)) for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        # 12 threads upvote and 4 threads downvote
+        post = self.service.GetPost(reddit_pb2.GetPostRequest(post_id=post_id), self.context).post
+        self.assertEqual(post.score, 8 * votes_per_thread)
+
+class TestRedditServiceSQLite(TestRedditService):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = SQLiteStore(os.path.join(self.directory.name, "reddit.db"))
+        self.service = reddit_server.RedditService(self.store)
+        self.context = MagicMock()
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_data_survives_restart(self):
+        request = reddit_pb2.CreatePostRequest(title="t", text="t", video_url="v", subreddit_id="s", tags=["a", "b"])
+        post, second = [self.service.CreatePost(request, self.context).post for _ in range(2)]
+        comment = self.create_comment(parent_post_id=post.post_id)
+        self.vote_comment(comment.comment_id)
+        self.store.close()
+
+        self.store = SQLiteStore(self.store.path)
+        self.assertEqual(self.store.get_post(post.post_id), post)
+        self.assertEqual(self.store.get_subreddit("s").post_ids, [post.post_id, second.post_id])
+        self.assertEqual(self.store.top_comments(post.post_id, 1)[0].score, 1)
+
+    def test_batch_without_valid_comments(self):
+        created = self.service.BatchCreateComments(reddit_pb2.BatchCreateCommentsRequest(comments=[
+            reddit_pb2.CreateCommentRequest(text="a", author="u")]), self.context)
+        self.assertEqual(created.results[0].status.code, grpc.StatusCode.INVALID_ARGUMENT.value[0])
+        self.store.add_comments([])
+        # The writer is still running
+        self.assertEqual(self.create_comment(parent_post_id="post").parent_post_id, "post")
+
+    def test_writer_survives_failed_writes(self):
+        with self.assertRaises(TypeError):
+            self.store._write(lambda connection: None + 1)
+        self.assertEqual(self.create_comment(parent_post_id="post").parent_post_id, "post")
+
+class TestWriteAheadLog(unittest.TestCase):
+    def test_recover_from_snapshot_and_log_tail(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = recover(directory)
+            service = reddit_server.RedditService(store)
+            context = MagicMock()
+            create = reddit_pb2.CreatePostRequest(title="t", text="t", image_url="i", subreddit_id="s")
+            post = service.CreatePost(create, context).post
+            comment = service.CreateComment(reddit_pb2.CreateCommentRequest(
+                text="c", author="a", parent_post_id=post.post_id), context).comment
+            service.VoteComment(reddit_pb2.VoteCommentRequest(comment_id=comment.comment_id, upvote=True), context)
+
+            write_snapshot(store, store.log)
+            reply = service.CreateComment(reddit_pb2.CreateCommentRequest(
+                text="r", author="a", parent_comment_id=comment.comment_id), context).comment
+            for _ in range(3):
+                service.VotePost(reddit_pb2.VotePostRequest(post_id=post.post_id, upvote=False), context)
+            service.VoteComment(reddit_pb2.VoteCommentRequest(comment_id=comment.comment_id, upvote=True), context)
+            store.log.close()
+
+            # A torn record at the end of the log is ignored
+            with open(os.path.join(directory, f"log-{store.log.segment:010d}.bin"), "ab") as file:
+                file.write(b"\x05\x00\x00")
+
+            recovered = recover(directory)
+            self.assertEqual(recovered.get_post(post.post_id).score, -3)
+            self.assertEqual(recovered.get_subreddit("s").post_ids, [post.post_id])
+            self.assertEqual([c.score for c in recovered.top_comments(post.post_id, 5)], [2])
+            self.assertTrue(recovered.get_comment(comment.comment_id).has_replies)
+            self.assertEqual(recovered.top_replies(comment.comment_id, 5), [reply])
+            recovered.log.close()
+
+class TestBulkLoader(unittest.TestCase):
+    def test_load_from_sqlite(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "reddit.db")
+            source = SQLiteStore(path)
+            service = reddit_server.RedditService(source)
+            context = MagicMock()
+            create = reddit_pb2.CreatePostRequest(title="t", text="t", image_url="i", subreddit_id="s")
+            post = service.CreatePost(create, context).post
+            comments = [service.CreateComment(reddit_pb2.CreateCommentRequest(
+                text=str(i), author="a", parent_post_id=post.post_id), context).comment for i in range(7)]
+            reply = service.CreateComment(reddit_pb2.CreateCommentRequest(
+                text="r", author="a", parent_comment_id=comments[0].comment_id), context).comment
+            for comment in comments[3:5]:
+                service.VoteComment(reddit_pb2.VoteCommentRequest(comment_id=comment.comment_id, upvote=True), context)
+            source.close()
+
+            store = InMemoryStore()
+            load_from_sqlite(store, path, workers=2, chunk_rows=3)
+            self.assertEqual(store.get_post(post.post_id), post)
+            self.assertEqual(store.get_subreddit("s").post_ids, [post.post_id])
+            expected = [comments[3], comments[4], comments[0], comments[1]]
+            self.assertEqual([c.comment_id for c in store.top_comments(post.post_id, 4)], [c.comment_id for c in expected])
+            self.assertTrue(store.get_comment(comments[0].comment_id).has_replies)
+            self.assertEqual(store.top_replies(comments[0].comment_id, 5), [reply])
+
+    def test_warm_up_excludes_write_ahead_log(self):
+        parser = reddit_server.build_parser()
+        with patch.object(parser, "error", side_effect=ValueError) as error:
+            with self.assertRaises(ValueError):
+                reddit_server.validate_arguments(parser, parser.parse_args(["--warm_from", "r.db", "--wal_dir", "wal"]))
+        self.assertIn("--wal_dir", error.call_args.args[0])
+
+    def test_load_from_unmigrated_database(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "reddit.db")
+            connection = sqlite3.connect(path)
+            connection.executescript(SCHEMA)
+            connection.execute("INSERT INTO posts VALUES ('p', 't', 't', 'a', 3, 'NORMAL', '2024-01-01 00:00:00', 's', '')")
+            connection.execute("INSERT INTO comments VALUES ('c', 't', 'a', -2, 'NORMAL', '2024-01-01 00:00:00', 'p', NULL, 0)")
+            connection.commit()
+            schema = connection.execute("SELECT sql FROM sqlite_master").fetchall()
+
+            store = InMemoryStore()
+            load_from_sqlite(store, path, workers=1)
+            # Missing columns are computed as the migrations would fill them in, without migrating the file
+            self.assertEqual((store.get_post("p").upvotes, store.get_post("p").created_at),
+                             (3, int(created_seconds("2024-01-01 00:00:00"))))
+            self.assertEqual(store.get_comment("c").downvotes, 2)
+            self.assertEqual(connection.execute("SELECT sql FROM sqlite_master").fetchall(), schema)
+            connection.close()
+
+class TestVoteBuffer(unittest.TestCase):
+    def test_reads_see_pending_votes(self):
+        store = InMemoryStore()
+        buffer = VoteBuffer(store, flush_interval=60)
+        service = reddit_server.RedditService(buffer)
+        context = MagicMock()
+        post = service.CreatePost(reddit_pb2.CreatePostRequest(title="t", text="t", image_url="i", subreddit_id="s"), context).post
+        first, second = [service.CreateComment(reddit_pb2.CreateCommentRequest(text="c", author="a", parent_post_id=post.post_id),
+                                               context).comment for _ in range(2)]
+
+        for _ in range(3):
+            service.VotePost(reddit_pb2.VotePostRequest(post_id=post.post_id, upvote=True), context)
+        service.VoteComment(reddit_pb2.VoteCommentRequest(comment_id=second.comment_id, upvote=True), context)
+
+        # Nothing has reached the store yet, but reads merge the pending deltas
+        self.assertEqual(store.get_post(post.post_id).score, 0)
+        self.assertEqual(service.GetPost(reddit_pb2.GetPostRequest(post_id=post.post_id), context).post.score, 3)
+        top = service.GetTopCommentsUnderPost(reddit_pb2.GetTopCommentsUnderPostRequest(post_id=post.post_id, count=2), context)
+        self.assertEqual([c.comment_id for c in top.comments], [second.comment_id, first.comment_id])
+
+        buffer.close()
+        self.assertEqual(store.get_post(post.post_id).score, 3)
+
+    def test_versions_count_pending_votes(self):
+        store = InMemoryStore()
+        buffer = VoteBuffer(store, flush_interval=60)
+        service = reddit_server.RedditService(buffer)
+        context = MagicMock()
+        post = service.CreatePost(reddit_pb2.CreatePostRequest(title="t", text="t", image_url="i"), context).post
+
+        versions = [buffer.get_post(post.post_id).version]
+        for _ in range(2):
+            service.VotePost(reddit_pb2.VotePostRequest(post_id=post.post_id, upvote=True), context)
+            versions.append(buffer.get_post(post.post_id).version)
+        self.assertEqual(versions, sorted(set(versions)))
+        # Folding the votes into the store neither moves the version back nor forward
+        buffer.flush()
+        self.assertEqual(buffer.get_post(post.post_id).version, versions[-1])
+        buffer.close()
+
+    def test_flushes_leave_votes_and_reads_running(self):
+        store = InMemoryStore()
+        applied, release = threading.Event(), threading.Event()
+        vote_posts = store.vote_posts
+
+        def slow_vote_posts(votes):
+            # The store holds the batch at once, but the flush lets go of it only later
+            updates = vote_posts(votes)
+            applied.set()
+            release.wait()
+            return updates
+        store.vote_posts = slow_vote_posts
+        self.addCleanup(release.set)
+        buffer = VoteBuffer(store, flush_interval=60)
+        service = reddit_server.RedditService(buffer)
+        context = MagicMock()
+        posts = [service.CreatePost(reddit_pb2.CreatePostRequest(title="t", text="t", image_url="i"), context).post
+                 for _ in range(2)]
+        comments = [service.CreateComment(reddit_pb2.CreateCommentRequest(text="c", author="a", parent_post_id=post.post_id),
+                                          context).comment for post in posts]
+
+        buffer.vote_post(posts[0].post_id, 2, 0)
+        flusher = threading.Thread(target=buffer.flush, daemon=True)
+        flusher.start()
+        applied.wait()
+        # Every vote counts once, whether it is being applied or still pending
+        self.assertEqual(buffer.vote_post(posts[0].post_id, 1, 0).score, 3)
+        self.assertEqual(buffer.get_post(posts[0].post_id).score, 3)
+        release.set()
+        flusher.join()
+        self.assertEqual((store.get_post(posts[0].post_id).score, buffer.get_post(posts[0].post_id).score), (2, 3))
+
+        # Ranked reads only settle the votes of the items they rank
+        buffer.vote_comment(comments[1].comment_id, 1, 0)
+        buffer.top_comments(posts[0].post_id, 10)
+        self.assertEqual(store.get_comment(comments[1].comment_id).score, 0)
+        self.assertEqual(buffer.top_comments(posts[1].post_id, 10)[0].score, 1)
+        buffer.close()
+
+class TestResponseCache(unittest.TestCase):
+    def test_lru_ttl_and_invalidation(self):
+        cache = ResponseCache(max_entries=2)
+        for key in ["a", "b"]:
+            cache.put(key, key.encode(), "thread_1", cache.ticket())
+        self.assertEqual(cache.get("a"), b"a")
+        cache.put("c", b"c", "thread_2", cache.ticket())
+        self.assertIsNone(cache.get("b"))  # Least recently used
+
+        ticket = cache.ticket()
+        cache.invalidate("thread_1")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("c"), b"c")
+        # A response computed before its thread was invalidated is not cached
+        cache.put("a", b"stale", "thread_1", ticket)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats(), {"hits": 2, "misses": 3, "evictions": 1, "invalidations": 1, "entries": 1})
+
+        expiring = ResponseCache(ttl=0.01)
+        expiring.put("a", b"a", "thread_1", expiring.ticket())
+        time.sleep(0.02)
+        self.assertIsNone(expiring.get("a"))
+
+    def test_service_serves_cached_responses_until_the_thread_changes(self):
+        service = reddit_server.RedditService(InMemoryStore(), cache=ResponseCache())
+        context = MagicMock()
+        root, other = [service.CreateComment(reddit_pb2.CreateCommentRequest(text="c", author="a", parent_post_id="post"),
+                                             context).comment for _ in range(2)]
+        reply = service.CreateComment(reddit_pb2.CreateCommentRequest(text="r", author="a", parent_comment_id=root.comment_id),
+                                      context).comment
+
+        def top_ids():
+            response = service.GetTopCommentsUnderPost(reddit_pb2.GetTopCommentsUnderPostRequest(post_id="post", count=5), context)
+            return [c.comment_id for c in reddit_pb2.GetTopCommentsUnderPostResponse.FromString(response).comments]
+
+        def branch():
+            response = service.ExpandCommentBranch(reddit_pb2.ExpandCommentBranchRequest(comment_id=root.comment_id, count=5), context)
+            return reddit_pb2.ExpandCommentBranchResponse.FromString(response).comment_nodes
+
+        self.assertEqual(top_ids(), top_ids())
+        self.assertEqual(branch()[0].comment.score, 0)
+        self.assertEqual(service.cache.hits, 1)
+
+        service.VoteComment(reddit_pb2.VoteCommentRequest(comment_id=other.comment_id, upvote=True), context)
+        self.assertEqual(top_ids(), [other.comment_id, root.comment_id])
+        # A vote deep in the thread invalidates the branch expansions of that thread too
+        service.VoteComment(reddit_pb2.VoteCommentRequest(comment_id=reply.comment_id, upvote=True), context)
+        self.assertEqual(branch()[0].comment.score, 1)
+
+class TestEntityEncoder(unittest.TestCase):
+    def test_encoded_responses_match_messages(self):
+        store = InMemoryStore(encoder=EntityEncoder(max_entries=3))
+        service = reddit_server.RedditService(store)
+        context = MagicMock()
+        post = service.CreatePost(reddit_pb2.CreatePostRequest(title="t", text="t", image_url="i", subreddit_id="s",
+                                                               tags=["a", "b"]), context).post
+        root = service.CreateComment(reddit_pb2.CreateCommentRequest(text="c", author="a", parent_post_id=post.post_id),
+                                     context).comment
+        parents = [root]
+        for depth in range(3):
+            parents = [service.CreateComment(reddit_pb2.CreateCommentRequest(text=f"{depth}", author="a",
+                                                                             parent_comment_id=parent.comment_id),
+                                             context).comment for parent in parents for _ in range(2)]
+
+        for upvote in [True, False, False]:
+            # Only the votes and has_replies change after the first encoding
+            response = service.GetPost(reddit_pb2.GetPostRequest(post_id=post.post_id), context)
+            self.assertEqual(reddit_pb2.GetPostResponse.FromString(response).post, store.get_post(post.post_id))
+            response = service.GetTopCommentsUnderPost(
+                reddit_pb2.GetTopCommentsUnderPostRequest(post_id=post.post_id, count=5), context)
+            self.assertEqual(list(reddit_pb2.GetTopCommentsUnderPostResponse.FromString(response).comments),
+                             store.top_comments(post.post_id, 5))
+            for max_depth in range(4):
+                request = reddit_pb2.ExpandCommentBranchRequest(comment_id=root.comment_id, count=2, max_depth=max_depth)
+                self.assertEqual(reddit_pb2.ExpandCommentBranchResponse.FromString(service.ExpandCommentBranch(request, context)),
+                                 service._expand_comment_branch(request))
+            service.VotePost(reddit_pb2.VotePostRequest(post_id=post.post_id, upvote=upvote), context)
+            service.VoteComment(reddit_pb2.VoteCommentRequest(comment_id=parents[-1].comment_id, upvote=upvote), context)
+            service.CreateComment(reddit_pb2.CreateCommentRequest(text="r", author="a",
+                                                                  parent_comment_id=parents[-1].comment_id), context)
+        self.assertLessEqual(len(store.encoder), 6)  # Bounded per kind of entity
+        self.assertGreater(store.encoder.hits, 0)
+
+class TestMetrics(unittest.TestCase):
+    def test_interceptor_records_rpcs(self):
+        service = reddit_server.RedditService(InMemoryStore())
+        metrics = Metrics()
+        add_service_gauges(metrics, service)
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=2), interceptors=[MetricsInterceptor(metrics)])
+        add_servicer_to_server(service, server)
+        port = server.add_insecure_port("localhost:0")
+        server.start()
+        try:
+            with RedditClient(port=port, shared=False) as client:
+                post_id = client.create_post(title="t", text="t", image_url="i", subreddit_id="s").post.post_id
+                client.get_post(post_id)
+                with self.assertRaises(grpc.RpcError):
+                    client.get_post("missing")
+                self.assertEqual(len(list(client.stream_subreddit_feed("s"))), 1)
+        finally:
+            server.stop(None)
+
+        stats = metrics.method("GetPost")
+        self.assertEqual(sum(stats.buckets), 2)
+        self.assertEqual(stats.codes, {"OK": 1, "NOT_FOUND": 1})
+        self.assertEqual(stats.in_flight, 0)
+        self.assertEqual(metrics.method("StreamSubredditFeed").responses, 1)
+        text = metrics.render()
+        self.assertIn('reddit_rpc_duration_seconds_count{method="GetPost"} 2', text)
+        self.assertIn('reddit_rpc_completed_total{method="GetPost",code="NOT_FOUND"} 1', text)
+        self.assertIn('reddit_store_items{kind="posts"} 1', text)
+
+class TestAdmission(unittest.TestCase):
+    def context(self, client_id=None):
+        context = MagicMock()
+        context.invocation_metadata.return_value = [("x-client-id", client_id)] if client_id else []
+        context.peer.return_value = "ipv4:127.0.0.1:5000"
+        return context
+
+    def test_rate_and_concurrency_limits(self):
+        admission = Admission(rate=1, burst=2, method_limits={"ExpandCommentBranch": 1})
+        self.assertIsNone(admission.admit("GetPost", self.context("a")))
+        self.assertIsNone(admission.admit("GetPost", self.context("a")))
+        wait, _ = admission.admit("GetPost", self.context("a"))
+        self.assertGreater(wait, 0.5)
+        self.assertIsNone(admission.admit("GetPost", self.context("b")))  # Every client has its own bucket
+
+        self.assertIsNone(admission.admit("ExpandCommentBranch", self.context()))
+        self.assertIsNotNone(admission.admit("ExpandCommentBranch", self.context("c")))
+        admission.release("ExpandCommentBranch")
+        self.assertIsNone(admission.admit("ExpandCommentBranch", self.context("c")))
+
+    def test_rejected_calls_carry_a_retry_hint(self):
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=2),
+                             interceptors=[AdmissionInterceptor(Admission(rate=0.5, burst=1))])
+        add_servicer_to_server(reddit_server.RedditService(InMemoryStore()), server)
+        port = server.add_insecure_port("localhost:0")
+        server.start()
+        try:
+            with RedditClient(port=port, shared=False) as client:
+                post_id = client.create_post(title="t", text="t", image_url="i").post.post_id
+                with self.assertRaises(grpc.RpcError) as raised:
+                    client.get_post(post_id)
+        finally:
+            server.stop(None)
+        self.assertEqual(raised.exception.code(), grpc.StatusCode.RESOURCE_EXHAUSTED)
+        pushback = dict(raised.exception.trailing_metadata())["grpc-retry-pushback-ms"]
+        self.assertTrue(1000 < int(pushback) <= 2000)
+        # Admission only protects the worker pool together with a bound on the calls gRPC queues for it
+        self.assertEqual(reddit_server.concurrent_rpc_limit(8, Admission(rate=1), None), 32)
+        self.assertEqual(reddit_server.concurrent_rpc_limit(8, None, None), None)
+
+class TestProfiling(unittest.TestCase):
+    def test_slow_requests_are_logged_with_their_stacks(self):
+        store = InMemoryStore()
+        get_post = store.get_post
+
+        def slow_get_post(post_id):
+            end = time.perf_counter() + (0.2 if post_id == "slow" else 0)
+            while time.perf_counter() < end:
+                pass
+            return get_post(post_id)
+        store.get_post = slow_get_post
+
+        with tempfile.TemporaryDirectory() as directory:
+            switch_interval = sys.getswitchinterval()
+            sampler = StackSampler(interval=0.005, output_dir=directory)
+            self.assertEqual(sys.getswitchinterval(), switch_interval)  # Only lowered on request
+            log_path = os.path.join(directory, "slow.log")
+            server = grpc.server(futures.ThreadPoolExecutor(max_workers=2), interceptors=[
+                SlowRequestInterceptor(sampler, 0.1, slow_request_logger(log_path))])
+            add_servicer_to_server(reddit_server.RedditService(store), server)
+            port = server.add_insecure_port("localhost:0")
+            server.start()
+            try:
+                with RedditClient(port=port, shared=False) as client:
+                    for post_id in ["fast", "slow"]:
+                        with self.assertRaises(grpc.RpcError):
+                            client.get_post(post_id)
+            finally:
+                server.stop(None)
+                sampler.stop()
+
+            with open(log_path) as log:
+                records = [json.loads(line) for line in log]
+            self.assertEqual([(r["method"], r["code"], r["request"]) for r in records], [("GetPost", "NOT_FOUND", 'post_id: "slow"')])
+            self.assertTrue(any("slow_get_post" in stack for stack, _ in records[0]["stacks"]))
+            profiles = [name for name in os.listdir(directory) if name.endswith(".folded")]
+            self.assertEqual(len(profiles), 1)
+            with open(os.path.join(directory, profiles[0])) as profile:
+                self.assertIn("GetPost (reddit_server.py", profile.read())
+
+class TestBroker(unittest.TestCase):
+    def test_slow_subscriber_is_dropped(self):
+        broker = Broker(max_queue=2)
+        slow, fast = broker.subscribe("topic"), broker.subscribe("topic")
+        for event in range(2):
+            broker.publish("topic", event)
+        self.assertEqual(next(fast), 0)
+        broker.publish("topic", 2)
+
+        # The slow subscriber loses its queue and its stream ends; the fast one keeps going
+        self.assertTrue(slow.dropped)
+        self.assertEqual(list(slow), [])
+        fast.close()
+        self.assertEqual(list(fast), [1, 2])
+        self.assertFalse(broker.has_subscribers("topic"))
+
+    def test_ordered_events(self):
+        broker = Broker()
+        subscription = broker.subscribe("topic", order=lambda event: event if event[0] else None)
+        for event in [("a", 2), ("a", 1), ("b", 1), (None, 0), ("a", 2), ("a", 3), (None, 0)]:
+            broker.publish("topic", event)
+        subscription.close()
+        # Events at or below the last queued version of their key are dropped; unordered ones never are
+        self.assertEqual(list(subscription), [("a", 2), ("b", 1), (None, 0), ("a", 3), (None, 0)])
+
+    def test_async_subscriber(self):
+        broker = Broker()
+        subscription = broker.subscribe("topic")
+
+        async def consume():
+            received = []
+            async for event in subscription:
+                received.append(event)
+            return received
+
+        async def run():
+            consumer = asyncio.ensure_future(consume())
+            await asyncio.sleep(0)
+            # Publishers may run on other threads than the event loop
+            publisher = threading.Thread(target=lambda: [broker.publish("topic", event) for event in range(3)])
+            publisher.start()
+            publisher.join()
+            await asyncio.sleep(0.01)
+            subscription.close()
+            return await consumer
+
+        self.assertEqual(asyncio.run(run()), [0, 1, 2])
+
+class TestSharding(unittest.TestCase):
+    def test_new_ids_follow_their_affinity_key(self):
+        service = reddit_server.RedditService(new_id=ShardIds(4))
+        context = MagicMock()
+        post = service.CreatePost(reddit_pb2.CreatePostRequest(title="t", text="t", image_url="i", subreddit_id="s"), context).post
+        comment = service.CreateComment(reddit_pb2.CreateCommentRequest(text="c", author="a", parent_post_id=post.post_id),
+                                        context).comment
+        reply = service.CreateComment(reddit_pb2.CreateCommentRequest(text="r", author="a", parent_comment_id=comment.comment_id),
+                                      context).comment
+
+        # The whole thread lives on the subreddit's shard
+        shard = shard_of("s", 4)
+        self.assertEqual({shard_of(entity_id, 4) for entity_id in [post.post_id, comment.comment_id, reply.comment_id]},
+                         {shard})
+
+    def test_router_forwards_to_the_owning_worker(self):
+        services = [reddit_server.RedditService(new_id=ShardIds(2)) for _ in range(2)]
+        servers = [grpc.server(futures.ThreadPoolExecutor(max_workers=2)) for _ in range(2)]
+        ports = [server.add_insecure_port("localhost:0") for server in servers]
+        routers = [ShardRouter(service, shard, [f"localhost:{port}" for port in ports], max_forwards=1)
+                   for shard, service in enumerate(services)]
+        for server, router in zip(servers, routers):
+            add_servicer_to_server(router, server)
+            server.start()
+        subreddits = {shard_of(name, 2): name for name in ("a", "b", "c", "d", "e")}
+        try:
+            with RedditClient(port=ports[0], shared=False) as client:
+                remote = client.create_post(title="t", text="t", image_url="i", subreddit_id=subreddits[1]).post
+                local = client.create_post(title="t", text="t", image_url="i", subreddit_id=subreddits[0]).post
+                # Each post is stored by its subreddit's worker only
+                self.assertIsNotNone(services[1].store.get_post(remote.post_id))
+                self.assertIsNone(services[0].store.get_post(remote.post_id))
+                self.assertIsNotNone(services[0].store.get_post(local.post_id))
+                self.assertEqual(client.get_post(remote.post_id).post.post_id, remote.post_id)
+                results = client.batch_get_posts([remote.post_id, local.post_id]).results
+                self.assertEqual([result.post.post_id for result in results], [remote.post_id, local.post_id])
+
+                # A worker whose forwarding budget is spent turns away calls for other shards
+                routers[0]._forward_slots.acquire()
+                with self.assertRaises(grpc.RpcError) as raised:
+                    client.get_post(remote.post_id)
+                self.assertEqual(raised.exception.code(), grpc.StatusCode.RESOURCE_EXHAUSTED)
+                self.assertEqual(client.get_post(local.post_id).post.post_id, local.post_id)
+                routers[0]._forward_slots.release()
+        finally:
+            for server in servers:
+                server.stop(None)
+
+        # Calls without a deadline are forwarded with a bounded one
+        context = MagicMock()
+        context.time_remaining.return_value = 1e9
+        self.assertEqual(remaining_timeout(context), FORWARD_TIMEOUT)
+        context.time_remaining.return_value = 2.5
+        self.assertEqual(remaining_timeout(context), 2.5)
+
 # Helper functions to mock responses
 def mock_response_for_get_post(post_id):
     # Return a mock response for getting a post